@@ -2,9 +2,10 @@
 from django.contrib import admin
 from .models import (
     Usuario, Rol, LicenciaTemporal, PartidaArancelaria,
-    Busqueda, HistoriaActividad, Manual, InterfazSistema
+    Busqueda, Manual, InterfazSistema
 )
 from .models import PartidaReferencia
+from .models import SearchStatistic
 from .models import SearchStatisticTotal
 from .models import SearchStatisticProductTotal
 from .models import SolicitudSoporte
@@ -13,11 +14,13 @@ from django.utils import timezone
 from datetime import timedelta
 from django.db.models import Q
 from django.contrib import messages
-from django.core.mail import send_mail
 from django.conf import settings
 from django.contrib.admin.helpers import ACTION_CHECKBOX_NAME
 from django.shortcuts import render, redirect
 from .models import NotificationLog
+from .models import CorreoSaliente
+from .correo import encolar, nuevo_correo
+from .bitacora import registrar_actividad
 
 @admin.register(Usuario)
 class UsuarioAdmin(admin.ModelAdmin):
@@ -33,8 +36,7 @@ class UsuarioAdmin(admin.ModelAdmin):
 
             subject = request.POST.get('subject', '').strip()
             message_body = request.POST.get('message', '').strip()
-            from_email = getattr(settings, 'DEFAULT_FROM_EMAIL', '') or ''
-            sent = 0
+            correos = []
             from django.urls import reverse
 
             try:
@@ -62,30 +64,15 @@ class UsuarioAdmin(admin.ModelAdmin):
                         body_plain = body + plain_footer
                         body_html = body.replace('\n', '<br>') + html_footer
 
-                        err_msg = None
-                        try:
-
-                            sent_count = send_mail(subject, body_plain, from_email, [user.email], fail_silently=False, html_message=body_html)
-                            success = bool(sent_count)
-                        except Exception as e:
-                            sent_count = 0
-                            success = False
-                            err_msg = str(e)
-                        NotificationLog.objects.create(
-                            destinatario=user,
-                            destinatario_email=user.email,
-                            asunto=subject,
-                            cuerpo=body_plain,
-                            enviado_por=request.user if request.user.is_authenticated else None,
-                            success=success,
-                            error_message=err_msg
-                        )
-                        if success:
-                            sent += 1
+                        # el worker de correos (manage.py enviar_correos) registra el resultado en NotificationLog
+                        correos.append(nuevo_correo(subject, body_plain, user.email, cuerpo_html=body_html, usuario=user,
+                                                    enviado_por=request.user if request.user.is_authenticated else None,
+                                                    registrar=True))
                     except Exception:
 
                         continue
-            self.message_user(request, f"Notificación enviada a {sent} usuario(s).", level=messages.SUCCESS)
+            CorreoSaliente.objects.bulk_create(correos)
+            self.message_user(request, f"Notificación encolada para {len(correos)} usuario(s).", level=messages.SUCCESS)
             return None
 
 
@@ -104,11 +91,7 @@ class UsuarioAdmin(admin.ModelAdmin):
         updated = queryset.update(is_active=True)
 
         for user in queryset:
-            try:
-                HistoriaActividad.objects.create(usuario=request.user if request.user.is_authenticated else None,
-                                                 accion=f"admin: activar usuario {user.username} (id={user.pk})")
-            except Exception:
-                pass
+            registrar_actividad(request.user, f"admin: activar usuario {user.username} (id={user.pk})")
         self.message_user(request, f"{updated} usuario(s) activados.", level=messages.SUCCESS)
 
     activar_usuarios.short_description = 'Activar usuarios seleccionados'
@@ -116,11 +99,7 @@ class UsuarioAdmin(admin.ModelAdmin):
     def desactivar_usuarios(self, request, queryset):
         updated = queryset.update(is_active=False)
         for user in queryset:
-            try:
-                HistoriaActividad.objects.create(usuario=request.user if request.user.is_authenticated else None,
-                                                 accion=f"admin: desactivar usuario {user.username} (id={user.pk})")
-            except Exception:
-                pass
+            registrar_actividad(request.user, f"admin: desactivar usuario {user.username} (id={user.pk})")
         self.message_user(request, f"{updated} usuario(s) desactivados.", level=messages.WARNING)
 
     desactivar_usuarios.short_description = 'Desactivar usuarios seleccionados'
@@ -130,22 +109,13 @@ class UsuarioAdmin(admin.ModelAdmin):
 
         is_create = not bool(obj.pk and change)
         super().save_model(request, obj, form, change)
-        try:
-            if change:
-                HistoriaActividad.objects.create(usuario=request.user if request.user.is_authenticated else None,
-                                                 accion=f"admin: editar usuario {obj.username} (id={obj.pk})")
-            else:
-                HistoriaActividad.objects.create(usuario=request.user if request.user.is_authenticated else None,
-                                                 accion=f"admin: crear usuario {obj.username} (id={obj.pk})")
-        except Exception:
-            pass
+        if change:
+            registrar_actividad(request.user, f"admin: editar usuario {obj.username} (id={obj.pk})")
+        else:
+            registrar_actividad(request.user, f"admin: crear usuario {obj.username} (id={obj.pk})")
 
     def delete_model(self, request, obj):
-        try:
-            HistoriaActividad.objects.create(usuario=request.user if request.user.is_authenticated else None,
-                                             accion=f"admin: eliminar usuario {obj.username} (id={obj.pk})")
-        except Exception:
-            pass
+        registrar_actividad(request.user, f"admin: eliminar usuario {obj.username} (id={obj.pk})")
         super().delete_model(request, obj)
 
     def get_urls(self):
@@ -178,7 +148,6 @@ class UsuarioAdmin(admin.ModelAdmin):
         if request.method == 'POST':
             subject = request.POST.get('subject', '').strip()
             message_body = request.POST.get('message', '').strip()
-            from_email = getattr(settings, 'DEFAULT_FROM_EMAIL', '') or ''
             if usuario.email:
                 try:
 
@@ -194,28 +163,11 @@ class UsuarioAdmin(admin.ModelAdmin):
                     html_footer = f"<br><br>Para contactar soporte usa el formulario en 'Soporte' o pulsa <a href=\"{support_link}\">Toca aquí</a>."
                     body_plain = body + plain_footer
                     body_html = body.replace('\n', '<br>') + html_footer
-                    err_msg = None
-                    try:
-                        sent_count = send_mail(subject, body_plain, from_email, [usuario.email], fail_silently=False, html_message=body_html)
-                        success = bool(sent_count)
-                    except Exception as e:
-                        success = False
-                        err_msg = str(e)
-                    NotificationLog.objects.create(
-                        destinatario=usuario,
-                        destinatario_email=usuario.email,
-                        asunto=subject,
-                        cuerpo=body_plain,
-                        enviado_por=request.user if request.user.is_authenticated else None,
-                        success=success,
-                        error_message=err_msg
-                    )
-                    if success:
-                        self.message_user(request, f'Correo enviado a {usuario.email}', level=messages.SUCCESS)
-                    else:
-                        self.message_user(request, f'Error al enviar correo a {usuario.email}', level=messages.ERROR)
+                    encolar(subject, body_plain, usuario.email, cuerpo_html=body_html, usuario=usuario,
+                            enviado_por=request.user if request.user.is_authenticated else None, registrar=True)
+                    self.message_user(request, f'Correo a {usuario.email} encolado para envío', level=messages.SUCCESS)
                 except Exception:
-                    self.message_user(request, f'Error al enviar correo a {usuario.email}', level=messages.ERROR)
+                    self.message_user(request, f'Error al encolar el correo a {usuario.email}', level=messages.ERROR)
             else:
                 self.message_user(request, 'El usuario no tiene email registrado.', level=messages.WARNING)
 
@@ -244,47 +196,36 @@ class PartidaAdmin(admin.ModelAdmin):
     
     def save_model(self, request, obj, form, change):
         super().save_model(request, obj, form, change)
-        try:
-            if change:
-                HistoriaActividad.objects.create(usuario=request.user if request.user.is_authenticated else None,
-                                                 accion=f"admin: editar partida {obj.codigo} (id={obj.pk})")
-            else:
-                HistoriaActividad.objects.create(usuario=request.user if request.user.is_authenticated else None,
-                                                 accion=f"admin: crear partida {obj.codigo} (id={obj.pk})")
-        except Exception:
-            pass
+        if change:
+            registrar_actividad(request.user, f"admin: editar partida {obj.codigo} (id={obj.pk})")
+        else:
+            registrar_actividad(request.user, f"admin: crear partida {obj.codigo} (id={obj.pk})")
 
     def delete_model(self, request, obj):
         codigo = obj.codigo
         pk = obj.pk
         super().delete_model(request, obj)
-        try:
-            HistoriaActividad.objects.create(usuario=request.user if request.user.is_authenticated else None,
-                                             accion=f"admin: eliminar partida {codigo} (id={pk})")
-        except Exception:
-            pass
+        registrar_actividad(request.user, f"admin: eliminar partida {codigo} (id={pk})")
 
 @admin.register(Busqueda)
 class BusquedaAdmin(admin.ModelAdmin):
-    list_display = ('usuario', 'termino_buscado', 'tipo_busqueda', 'fecha')
+    list_display = ('usuario', 'termino_buscado', 'tipo_busqueda', 'total_resultados', 'fecha')
     list_filter = ('tipo_busqueda', 'fecha')
     search_fields = ('usuario__username', 'termino_buscado')
     actions = ['generar_ranking_ultimo_mes']
 
     def generar_ranking_ultimo_mes(self, request, queryset):
-        """Genera estadísticas agregadas para el último mes y las guarda en SearchStatistic."""
-        fin = timezone.now().date()
-        inicio = fin - timedelta(days=30)
-
-        from .models import SearchStatisticDaily
-        daily_qs = SearchStatisticDaily.objects.filter(fecha__range=(inicio, fin))
-        cap_counts = {}
-        for d in daily_qs:
-            cap = d.capitulo or 'Sin capítulo'
-            cap_counts[cap] = cap_counts.get(cap, 0) + d.count
-
-
-        messages.success(request, f"Ranking calculado para {inicio} — {fin}. {len(cap_counts)} capítulos encontrados.")
+        """Acumula los días cerrados pendientes en SearchStatistic y muestra el ranking mensual ya calculado."""
+        from .agregados import acumular_dias_cerrados, ranking_periodo
+        acumular_dias_cerrados()
+
+        filas = list(ranking_periodo('mes'))
+        if not filas:
+            messages.info(request, "Todavía no hay búsquedas acumuladas para el mes actual.")
+            return
+        top = ', '.join(f"{f.capitulo} ({f.count})" for f in filas[:5])
+        messages.success(request, f"Ranking {filas[0].periodo_inicio} — {filas[0].periodo_fin}: "
+                                  f"{len(filas)} capítulos. Más buscados: {top}.")
     generar_ranking_ultimo_mes.short_description = 'Generar ranking (último mes)'
 
 
@@ -301,6 +242,15 @@ class PartidaReferenciaAdmin(admin.ModelAdmin):
     search_fields = ('partida__codigo', 'titulo', 'numero_resolucion')
     list_filter = ('creado_en',)
 
+@admin.register(SearchStatistic)
+class SearchStatisticAdmin(admin.ModelAdmin):
+    """Rankings semanales y mensuales precalculados (comando acumular_estadisticas)."""
+    list_display = ('periodo', 'periodo_inicio', 'periodo_fin', 'capitulo', 'count')
+    list_filter = ('periodo', 'periodo_inicio')
+    search_fields = ('capitulo',)
+    ordering = ('-periodo_inicio', '-count')
+    readonly_fields = ('periodo', 'periodo_inicio', 'periodo_fin', 'capitulo', 'count', 'generado_en')
+
 @admin.register(SearchStatisticTotal)
 class SearchStatisticTotalAdmin(admin.ModelAdmin):
     """Mostrar ranking acumulado de búsquedas en el admin."""
@@ -323,33 +273,40 @@ class SearchStatisticProductTotalAdmin(admin.ModelAdmin):
     change_list_template = 'admin/partidas/searchstatisticproducttotal/change_list.html'
 
     def changelist_view(self, request, extra_context=None):
-        """Proveer top_products y top_chapters al template personalizado del changelist."""
-        qs = SearchStatisticProductTotal.objects.order_by('-total')[:50]
+        """Proveer top_products y top_chapters al template personalizado del changelist.
+        Salen del resumen Space-Saving (frecuentes.py), no de ordenar la tabla de totales.
+        """
+        from .frecuentes import CAPITULOS, PRODUCTOS, get_rastreador
+        rastreador = get_rastreador()
+        top_codigos, error_maximo = rastreador.top(PRODUCTOS, 50)
+        info = {
+            codigo: (descripcion, capitulo)
+            for codigo, descripcion, capitulo in SearchStatisticProductTotal.objects.filter(
+                codigo__in=[codigo for codigo, _, _ in top_codigos]
+            ).values_list('codigo', 'descripcion', 'capitulo')
+        }
         top = []
-        for idx, p in enumerate(qs, start=1):
+        for idx, (codigo, total, _) in enumerate(top_codigos, start=1):
+            descripcion, capitulo = info.get(codigo, ('', ''))
             top.append({
                 'rank': idx,
-                'codigo': p.codigo,
-                'descripcion': p.descripcion or '',
-                'capitulo': p.capitulo or '',
-                'total': f"{p.total:,}"
+                'codigo': codigo,
+                'descripcion': descripcion or '',
+                'capitulo': capitulo or '',
+                'total': f"{total:,}"
             })
 
-        from django.db.models import Sum
-        chap_qs = (
-            SearchStatisticProductTotal.objects.values('capitulo')
-            .annotate(total_sum=Sum('total'))
-            .order_by('-total_sum')[:50]
-        )
+        top_capitulos, _ = rastreador.top(CAPITULOS, 50)
         top_chapters = []
-        for idx, c in enumerate(chap_qs, start=1):
+        for idx, (capitulo, total, _) in enumerate(top_capitulos, start=1):
             top_chapters.append({
                 'rank': idx,
-                'capitulo': c['capitulo'] or 'Sin capítulo',
-                'total': f"{c['total_sum']:,}"
+                'capitulo': capitulo or 'Sin capítulo',
+                'total': f"{total:,}"
             })
 
-        extra = {'top_products': top, 'top_chapters': top_chapters, 'title': 'Ranking de productos buscados'}
+        extra = {'top_products': top, 'top_chapters': top_chapters, 'error_maximo': error_maximo,
+                 'title': 'Ranking de productos buscados'}
 
         entidad = request.GET.get('entidad_emite', '').strip()
         capitulos_param = request.GET.get('capitulos', '').strip()
@@ -463,39 +420,35 @@ class NotificationLogAdmin(admin.ModelAdmin):
     actions = ['reintentar_envio']
 
     def reintentar_envio(self, request, queryset):
-        """Reintenta enviar los registros seleccionados. Actualiza success y fecha_hora."""
-        from django.utils import timezone
-        from django.core.mail import send_mail
-        from django.conf import settings as djsettings
-        attempted = 0
-        succeeded = 0
-        for log in queryset:
-
-            to_addr = log.destinatario_email
-            asunto = log.asunto or ''
-            cuerpo = log.cuerpo or ''
-            from_email = getattr(djsettings, 'DEFAULT_FROM_EMAIL', '') or ''
-            err_msg = None
-            try:
-                sent_count = send_mail(asunto, cuerpo, from_email, [to_addr], fail_silently=False)
-                success = bool(sent_count)
-            except Exception as e:
-                success = False
-                err_msg = str(e)
-
-            log.success = success
-            log.enviado_por = request.user if request.user.is_authenticated else None
-            log.fecha_hora = timezone.now()
-            log.error_message = err_msg
-            log.save()
-            attempted += 1
-            if success:
-                succeeded += 1
-
-        self.message_user(request, f"Reintento: {attempted} registros procesados; {succeeded} re-envíos exitosos.", level=messages.INFO)
+        """Encola de nuevo los registros seleccionados; el worker de correos actualiza success y fecha_hora."""
+        enviado_por = request.user if request.user.is_authenticated else None
+        logs = list(queryset.exclude(destinatario_email__isnull=True).exclude(destinatario_email=''))
+        CorreoSaliente.objects.bulk_create([
+            nuevo_correo(log.asunto, log.cuerpo, log.destinatario_email, usuario_id=log.destinatario_id,
+                         enviado_por=enviado_por, notificacion=log)
+            for log in logs
+        ])
+        queryset.filter(pk__in=[log.pk for log in logs]).update(enviado_por=enviado_por)
+        self.message_user(request, f"Reintento: {len(logs)} registros encolados para re-envío.", level=messages.INFO)
     reintentar_envio.short_description = 'Reintentar envío de notificaciones seleccionadas'
 
 
+@admin.register(CorreoSaliente)
+class CorreoSalienteAdmin(admin.ModelAdmin):
+    list_display = ('creado_en', 'destinatario', 'asunto', 'estado', 'intentos', 'proximo_intento', 'enviado_en')
+    list_filter = ('estado', 'creado_en')
+    search_fields = ('destinatario', 'asunto')
+    readonly_fields = ('intentos', 'error_message', 'creado_en', 'enviado_en')
+    ordering = ('-creado_en',)
+    actions = ['reintentar_ahora']
+
+    def reintentar_ahora(self, request, queryset):
+        """Vuelve a dejar pendientes los correos seleccionados, listos para el próximo lote del worker."""
+        updated = queryset.exclude(estado='sent').update(estado='pending', intentos=0, proximo_intento=timezone.now())
+        self.message_user(request, f"{updated} correo(s) pendientes de envío.", level=messages.INFO)
+    reintentar_ahora.short_description = 'Reintentar ahora los correos seleccionados'
+
+
 
 try:
     from django.contrib.sites.models import Site
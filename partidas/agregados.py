@@ -0,0 +1,97 @@
+"""Rankings de capítulos por semana y por mes a partir de `SearchStatisticDaily`.
+
+Cada ejecución de `acumular_dias_cerrados()` suma a las filas semanales y
+mensuales de `SearchStatistic` solo los días cerrados (anteriores a hoy) que
+aún no se acumularon; el último día acumulado queda en `MarcaAgregacion`. Así
+los rankings se leen de filas ya calculadas en lugar de recorrer los datos
+diarios, y el costo de cada ejecución depende de los días nuevos, no del
+historial completo.
+"""
+import calendar
+from collections import Counter
+from datetime import timedelta
+
+from django.db import transaction
+from django.db.models import Min
+from django.utils import timezone
+
+from .estadisticas import incremento
+from .models import MarcaAgregacion, SearchStatistic, SearchStatisticDaily
+
+
+MARCA = 'search_statistic'
+
+PERIODOS = ('semana', 'mes')
+
+
+def inicio_periodo(fecha, periodo):
+    if periodo == 'semana':
+        return fecha - timedelta(days=fecha.weekday())
+    return fecha.replace(day=1)
+
+
+def fin_periodo(inicio, periodo):
+    if periodo == 'semana':
+        return inicio + timedelta(days=6)
+    return inicio.replace(day=calendar.monthrange(inicio.year, inicio.month)[1])
+
+
+def acumular_dias_cerrados(hasta=None):
+    """Suma a `SearchStatistic` los días posteriores a la marca y hasta `hasta` (por defecto, ayer).
+    Devuelve (desde, hasta) de los días acumulados, o None si no había días nuevos.
+    `hasta` tiene que ser un día cerrado: la marca no se puede mover más allá de ayer.
+    """
+    ayer = timezone.localdate() - timedelta(days=1)
+    hasta = hasta or ayer
+    if hasta > ayer:
+        raise ValueError(f'Solo se pueden acumular días cerrados (hasta {ayer})')
+    MarcaAgregacion.objects.get_or_create(nombre=MARCA)
+    with transaction.atomic():
+        # bloquea la marca: dos ejecuciones simultáneas no pueden acumular los mismos días
+        marca = MarcaAgregacion.objects.select_for_update().get(nombre=MARCA)
+        if marca.hasta:
+            desde = marca.hasta + timedelta(days=1)
+        else:
+            desde = SearchStatisticDaily.objects.aggregate(m=Min('fecha'))['m']
+        if desde is None or desde > hasta:
+            return None
+
+        sumas = Counter()
+        for capitulo, fecha, count in SearchStatisticDaily.objects.filter(
+            fecha__range=(desde, hasta)
+        ).values_list('capitulo', 'fecha', 'count').iterator():
+            for periodo in PERIODOS:
+                sumas[(periodo, inicio_periodo(fecha, periodo), capitulo or 'Sin capítulo')] += count
+
+        grupos = {}
+        for (periodo, inicio, capitulo), n in sumas.items():
+            if n:
+                grupos.setdefault((periodo, inicio), {})[capitulo] = n
+        for (periodo, inicio), cantidades in grupos.items():
+            SearchStatistic.objects.bulk_create(
+                [SearchStatistic(periodo=periodo, periodo_inicio=inicio, periodo_fin=fin_periodo(inicio, periodo),
+                                 capitulo=c, count=0) for c in cantidades],
+                ignore_conflicts=True,
+            )
+            SearchStatistic.objects.filter(periodo=periodo, periodo_inicio=inicio, capitulo__in=list(cantidades)).update(
+                count=incremento('count', 'capitulo', cantidades))
+
+        marca.hasta = hasta
+        marca.save()
+    return desde, hasta
+
+
+def reiniciar():
+    """Borra los rankings por periodo y la marca; la próxima ejecución vuelve a acumular todo el historial."""
+    with transaction.atomic():
+        SearchStatistic.objects.filter(periodo__in=PERIODOS).delete()
+        MarcaAgregacion.objects.filter(nombre=MARCA).delete()
+
+
+def ranking_periodo(periodo, fecha=None, limite=None):
+    """Filas de `SearchStatistic` del periodo que contiene `fecha` (por defecto, ayer), de mayor a menor."""
+    fecha = fecha or (timezone.localdate() - timedelta(days=1))
+    qs = SearchStatistic.objects.filter(
+        periodo=periodo, periodo_inicio=inicio_periodo(fecha, periodo)
+    ).order_by('-count', 'capitulo')
+    return qs[:limite] if limite else qs
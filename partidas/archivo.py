@@ -0,0 +1,154 @@
+"""Retención de las tablas de registro: archivado en JSONL comprimido, borrado por lotes y compactación.
+
+Las filas más antiguas que la retención de cada tabla (`RETENCION_REGISTROS`,
+en días) se exportan a `ARCHIVO_REGISTROS_DIR/<tabla>/<año>/<tabla>-<fecha>.jsonl.gz`
+(un archivo por día, según la fecha del registro) y se borran de a `lote`
+filas, cada lote en su propia transacción corta, para no bloquear las
+escrituras de la aplicación. Cada lote se agrega como un miembro gzip nuevo al
+archivo del día y se sincroniza a disco antes de borrar las filas; si el
+proceso se corta entre ambos pasos, la próxima ejecución vuelve a archivar esas
+filas (quedan repetidas en el archivo con el mismo `id`). `restaurar()` vuelve
+a insertar un archivo en la base de datos.
+"""
+import base64
+import gzip
+import json
+import os
+from datetime import timedelta
+
+from django.apps import apps
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import connection, models, transaction
+from django.utils import timezone
+
+
+# tabla -> (modelo, campo de fecha)
+TABLAS = {
+    'busqueda': ('partidas.Busqueda', 'fecha'),
+    'clicklog': ('partidas.ClickLog', 'fecha_hora'),
+    'chatmessage': ('partidas.ChatMessage', 'created_at'),
+    'historiaactividad': ('partidas.HistoriaActividad', 'fecha_hora'),
+    'notificationlog': ('partidas.NotificationLog', 'fecha_hora'),
+}
+
+RETENCION_POR_DEFECTO = 365
+
+
+class _Codificador(DjangoJSONEncoder):
+    # los campos binarios (p. ej. `Busqueda.ids_top`) se archivan en base64
+    def default(self, o):
+        if isinstance(o, (bytes, bytearray, memoryview)):
+            return base64.b64encode(bytes(o)).decode('ascii')
+        return super().default(o)
+
+
+def get_retencion(tabla):
+    return getattr(settings, 'RETENCION_REGISTROS', {}).get(tabla, RETENCION_POR_DEFECTO)
+
+
+def get_destino():
+    return str(getattr(settings, 'ARCHIVO_REGISTROS_DIR', os.path.join(settings.BASE_DIR, 'var', 'archivo')))
+
+
+def _modelo(tabla):
+    return apps.get_model(TABLAS[tabla][0])
+
+
+def ruta_archivo(destino, tabla, fecha):
+    return os.path.join(destino, tabla, f'{fecha:%Y}', f'{tabla}-{fecha.isoformat()}.jsonl.gz')
+
+
+def _escribir(ruta, filas):
+    os.makedirs(os.path.dirname(ruta), exist_ok=True)
+    with open(ruta, 'ab') as crudo:
+        with gzip.GzipFile(fileobj=crudo, mode='ab') as gz:
+            for fila in filas:
+                gz.write(json.dumps(fila, cls=_Codificador, ensure_ascii=False).encode('utf-8') + b'\n')
+        crudo.flush()
+        os.fsync(crudo.fileno())
+
+
+def archivar(tabla, dias=None, destino=None, lote=500, simular=False):
+    """Archiva y borra las filas de `tabla` anteriores a `dias` días.
+    Devuelve (filas archivadas, rutas de los archivos escritos); con `simular` solo cuenta las filas.
+    """
+    modelo = _modelo(tabla)
+    campo = TABLAS[tabla][1]
+    corte = timezone.now() - timedelta(days=get_retencion(tabla) if dias is None else dias)
+    destino = destino or get_destino()
+    viejas = modelo.objects.filter(**{f'{campo}__lt': corte})
+    if simular:
+        return viejas.count(), []
+
+    total, rutas, ultimo = 0, set(), 0
+    while True:
+        filas = list(viejas.filter(pk__gt=ultimo).order_by('pk').values()[:lote])
+        if not filas:
+            break
+        por_dia = {}
+        for fila in filas:
+            por_dia.setdefault(timezone.localdate(fila[campo]), []).append(fila)
+        for fecha, del_dia in sorted(por_dia.items()):
+            ruta = ruta_archivo(destino, tabla, fecha)
+            _escribir(ruta, del_dia)
+            rutas.add(ruta)
+        ids = [fila['id'] for fila in filas]
+        with transaction.atomic():
+            modelo.objects.filter(pk__in=ids).delete()
+        total += len(ids)
+        ultimo = ids[-1]
+    return total, sorted(rutas)
+
+
+def compactar(tablas):
+    """Devuelve al sistema el espacio de las filas borradas (VACUUM). Debe ejecutarse fuera de una transacción.
+    En SQLite reescribe el archivo completo con un bloqueo exclusivo; por eso el comando solo lo hace con `--compactar`.
+    """
+    with connection.cursor() as cursor:
+        if connection.vendor == 'sqlite':
+            cursor.execute('VACUUM')
+        elif connection.vendor == 'postgresql':
+            for tabla in tablas:
+                cursor.execute(f'VACUUM (ANALYZE) {connection.ops.quote_name(_modelo(tabla)._meta.db_table)}')
+
+
+def tabla_de_archivo(ruta):
+    nombre = os.path.basename(ruta)
+    tabla = nombre.rsplit('-', 3)[0]
+    if tabla not in TABLAS:
+        raise ValueError(f'No se reconoce la tabla del archivo {nombre}')
+    return tabla
+
+
+def restaurar(ruta, lote=500):
+    """Inserta en la base de datos las filas de un archivo de `archivar()` (las que ya existen se omiten).
+    Las referencias a filas que ya no existen quedan en NULL, o la fila se omite si la columna no lo admite.
+    Devuelve cuántas filas se restauraron (contando las que ya existían).
+    """
+    modelo = _modelo(tabla_de_archivo(ruta))
+    with gzip.open(ruta, 'rt', encoding='utf-8') as f:
+        filas = [json.loads(linea) for linea in f if linea.strip()]
+
+    binarios = [campo.attname for campo in modelo._meta.concrete_fields if isinstance(campo, models.BinaryField)]
+    for fila in filas:
+        for nombre in binarios:
+            if isinstance(fila.get(nombre), str):
+                fila[nombre] = base64.b64decode(fila[nombre])
+
+    claves = [campo for campo in modelo._meta.concrete_fields if campo.is_relation]
+    for campo in claves:
+        ids = {fila.get(campo.attname) for fila in filas} - {None}
+        existentes = set(campo.related_model.objects.filter(pk__in=ids).values_list('pk', flat=True)) if ids else set()
+        validas = []
+        for fila in filas:
+            if fila.get(campo.attname) is not None and fila[campo.attname] not in existentes:
+                if not campo.null:
+                    continue
+                fila[campo.attname] = None
+            validas.append(fila)
+        filas = validas
+
+    for i in range(0, len(filas), lote):
+        modelo.objects.bulk_create([modelo(**fila) for fila in filas[i:i + lote]], ignore_conflicts=True)
+    return len(filas)
@@ -0,0 +1,13 @@
+from django.contrib.auth import get_user_model
+from django.contrib.auth.backends import ModelBackend
+
+
+class UsuarioBackend(ModelBackend):
+    """ModelBackend que carga el usuario de la sesión junto con su rol (una consulta por petición)."""
+
+    def get_user(self, user_id):
+        try:
+            usuario = get_user_model()._default_manager.select_related('rol').get(pk=user_id)
+        except get_user_model().DoesNotExist:
+            return None
+        return usuario if self.user_can_authenticate(usuario) else None
@@ -0,0 +1,354 @@
+"""Registro diferido de búsquedas (`Busqueda`), mensajes del chat (`ChatMessage`) y actividad (`HistoriaActividad`).
+
+Las vistas no insertan estas filas: `Bitacora.registrar()` agrega el registro
+a una lista en memoria y a un archivo de spool del proceso (una línea JSON por
+registro) y cada `BITACORA_FLUSH_INTERVAL` segundos `vaciar()` los inserta con
+un `bulk_create` por modelo en una transacción. La petición no espera a la base
+de datos ni compite por las tablas de registro. Con `BITACORA_BACKGROUND_FLUSH`
+el vaciado corre en un hilo propio y un buffer lleno (`BITACORA_BUFFER_MAX`)
+solo lo despierta; sin ese hilo, el buffer lleno se vacía en el hilo que registra.
+
+El spool es lo que evita perder registros si el proceso termina antes de
+guardarlos: cada proceso escribe en su propio archivo dentro de
+`BITACORA_SPOOL_DIR` y lo mantiene bloqueado (`flock`); el archivo se borra
+cuando su contenido ya está en la base de datos. Los archivos que nadie tiene
+bloqueados (de un proceso que terminó o de un lote que falló) se vuelven a
+aplicar en el siguiente vaciado de cualquier proceso. La entrega es "al menos
+una vez": si el proceso cae entre el commit y el borrado del archivo, esos
+registros se insertan dos veces.
+
+Si la base de datos rechaza el lote por un registro inválido, los registros se
+insertan de a uno y los rechazados se apartan en `BITACORA_SPOOL_DIR/cuarentena/`
+para revisarlos a mano; un error de la base de datos (conexión caída, tabla
+bloqueada) deja el spool como está para el siguiente vaciado.
+"""
+import atexit
+import base64
+import glob
+import json
+import logging
+import os
+import threading
+import time
+import uuid
+
+from django.conf import settings
+from django.core.exceptions import FieldDoesNotExist, ValidationError
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import DataError, IntegrityError, close_old_connections, models, transaction
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+
+
+logger = logging.getLogger(__name__)
+
+BUSQUEDA = 'busqueda'
+CHAT = 'chat'
+ACTIVIDAD = 'actividad'
+
+# tipo de registro -> campo con la fecha; se fija al registrar, no al insertar
+CAMPOS_FECHA = {BUSQUEDA: 'fecha', CHAT: 'created_at', ACTIVIDAD: 'fecha_hora'}
+
+# sin flock no se sabe si otro proceso sigue usando un spool: solo se recuperan los que llevan una hora sin cambios
+ANTIGUEDAD_SIN_BLOQUEO = 3600
+
+# errores de un registro en particular (no de la base de datos): el registro se aparta en vez de reintentarse
+ERRORES_DE_DATOS = (IntegrityError, DataError, ValidationError, TypeError, ValueError)
+
+
+class _Codificador(DjangoJSONEncoder):
+    # los campos binarios (p. ej. `Busqueda.ids_top`) van al spool en base64
+    def default(self, o):
+        if isinstance(o, (bytes, bytearray, memoryview)):
+            return base64.b64encode(bytes(o)).decode('ascii')
+        return super().default(o)
+
+
+def _fechas(registros):
+    """tipo -> fecha más antigua de una lista de registros leídos de un spool."""
+    fechas = {}
+    for registro in registros:
+        campo = CAMPOS_FECHA.get(registro.get('tipo'))
+        fecha = campo and registro.get('campos', {}).get(campo)
+        if isinstance(fecha, str):
+            try:
+                fecha = parse_datetime(fecha)
+            except ValueError:
+                continue
+        if fecha is not None:
+            _agregar_fechas(fechas, {registro['tipo']: fecha})
+    return fechas
+
+
+def _agregar_fechas(fechas, otras):
+    for tipo, fecha in otras.items():
+        if tipo not in fechas or fecha < fechas[tipo]:
+            fechas[tipo] = fecha
+
+
+def _modelos():
+    from .models import Busqueda, ChatMessage, HistoriaActividad
+    return {BUSQUEDA: Busqueda, CHAT: ChatMessage, ACTIVIDAD: HistoriaActividad}
+
+
+def _bloquear(archivo):
+    """Bloqueo exclusivo sin espera; True si se obtuvo (o si la plataforma no tiene flock)."""
+    if fcntl is None:
+        return True
+    try:
+        fcntl.flock(archivo.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+        return True
+    except OSError:
+        return False
+
+
+def _eliminar(archivo):
+    # con flock se borra antes de cerrar, para que ningún otro proceso lo tome entre medio
+    if fcntl is not None:
+        os.remove(archivo.name)
+        archivo.close()
+    else:
+        archivo.close()
+        os.remove(archivo.name)
+
+
+class Bitacora:
+    """Buffer con spool en disco de los registros de búsquedas, chat y actividad."""
+
+    def __init__(self):
+        self.pendientes = []
+        self.lock = threading.Lock()
+        self.lock_vaciado = threading.Lock()
+        self.ultimo_vaciado = time.monotonic()
+        self._spool = None
+        self._pid = None
+        self._hilo = None
+        self._despertar = threading.Event()
+        # tipo -> fecha más antigua de `pendientes` y de los spools que no se pudieron aplicar en el último
+        # vaciado; `recuperado` indica si este proceso ya revisó los spools abandonados
+        self._desde = {}
+        self._sin_aplicar = {}
+        self.recuperado = False
+
+    @property
+    def directorio(self):
+        return str(getattr(settings, 'BITACORA_SPOOL_DIR', os.path.join(settings.BASE_DIR, 'var', 'bitacora')))
+
+    @property
+    def intervalo(self):
+        return getattr(settings, 'BITACORA_FLUSH_INTERVAL', 2)
+
+    @property
+    def maximo(self):
+        return getattr(settings, 'BITACORA_BUFFER_MAX', 500)
+
+    def __len__(self):
+        return len(self.pendientes)
+
+    def _archivo(self):
+        # spool propio del proceso (se abre uno nuevo tras un fork o al cambiar el directorio)
+        if self._spool is None or self._pid != os.getpid() or os.path.dirname(self._spool.name) != self.directorio:
+            os.makedirs(self.directorio, exist_ok=True)
+            ruta = os.path.join(self.directorio, f'{os.getpid()}-{uuid.uuid4().hex}.jsonl')
+            self._spool = open(ruta, 'a', encoding='utf-8')
+            _bloquear(self._spool)
+            self._pid = os.getpid()
+        return self._spool
+
+    def registrar(self, tipo, **campos):
+        """Encola un registro; `campos` son los del modelo (FK como `usuario_id`)."""
+        fecha = campos.setdefault(CAMPOS_FECHA[tipo], timezone.now())
+        registro = {'tipo': tipo, 'campos': campos}
+        with self.lock:
+            self.pendientes.append(registro)
+            if tipo not in self._desde or fecha < self._desde[tipo]:
+                self._desde[tipo] = fecha
+            try:
+                spool = self._archivo()
+                spool.write(json.dumps(registro, cls=_Codificador) + '\n')
+                spool.flush()
+                if getattr(settings, 'BITACORA_FSYNC', False):
+                    os.fsync(spool.fileno())
+            except OSError:
+                logger.exception('No se pudo escribir el spool de la bitácora en %s', self.directorio)
+            lleno = len(self.pendientes) >= self.maximo
+        if getattr(settings, 'BITACORA_BACKGROUND_FLUSH', False):
+            # con el hilo de vaciado, un buffer lleno lo despierta en lugar de escribir en el hilo de la petición
+            self._iniciar_hilo()
+            if lleno:
+                self._despertar.set()
+        elif lleno:
+            self.vaciar()
+
+    def vaciar(self):
+        """Guarda los registros pendientes y los spools abandonados. Devuelve cuántos registros propios se guardaron."""
+        with self.lock_vaciado:
+            self._recuperar()
+            with self.lock:
+                registros, self.pendientes = self.pendientes, []
+                desde, self._desde = self._desde, {}
+                spool = self._spool if self._pid == os.getpid() else None
+                self._spool = None
+                self.ultimo_vaciado = time.monotonic()
+            try:
+                self._aplicar(registros)
+            except Exception:
+                logger.exception('No se pudieron guardar %d registros de la bitácora', len(registros))
+                # el spool queda en disco sin bloquear y se reintenta en el próximo vaciado
+                if spool is not None:
+                    spool.close()
+                with self.lock:
+                    _agregar_fechas(self._sin_aplicar, desde)
+                return 0
+            if spool is not None:
+                _eliminar(spool)
+            return len(registros)
+
+    def vaciar_si_corresponde(self):
+        if time.monotonic() - self.ultimo_vaciado >= self.intervalo:
+            self.vaciar()
+
+    def _recuperar(self):
+        propio = self._spool.name if self._spool is not None else None
+        sin_aplicar = {}
+        for ruta in sorted(glob.glob(os.path.join(self.directorio, '*.jsonl'))):
+            if ruta == propio:
+                continue
+            if fcntl is None and time.time() - os.path.getmtime(ruta) < ANTIGUEDAD_SIN_BLOQUEO:
+                continue
+            try:
+                archivo = open(ruta, 'r', encoding='utf-8')
+            except FileNotFoundError:
+                continue
+            # st_nlink == 0: otro proceso lo aplicó y lo borró mientras se esperaba el bloqueo
+            if not _bloquear(archivo) or os.fstat(archivo.fileno()).st_nlink == 0:
+                archivo.close()
+                continue
+            registros = []
+            for linea in archivo:
+                try:
+                    registros.append(json.loads(linea))
+                except ValueError:
+                    # última línea cortada por una caída del proceso
+                    logger.warning('Línea inválida en el spool %s', ruta)
+            try:
+                self._aplicar(registros)
+            except Exception:
+                logger.exception('No se pudo recuperar el spool %s', ruta)
+                archivo.close()
+                _agregar_fechas(sin_aplicar, _fechas(registros))
+                continue
+            _eliminar(archivo)
+        with self.lock:
+            self._sin_aplicar = sin_aplicar
+            self.recuperado = True
+
+    def pendiente_desde(self, tipo):
+        """Fecha más antigua de los registros `tipo` que aún no están en la base de datos, o None si no hay.
+
+        Sale de memoria: los pendientes del proceso y los spools que el último vaciado no pudo aplicar (los
+        spools de otros procesos activos se guardan en segundos). La primera vez revisa los spools abandonados.
+        """
+        if not self.recuperado:
+            with self.lock_vaciado:
+                if not self.recuperado:
+                    self._recuperar()
+        with self.lock:
+            fechas = [d[tipo] for d in (self._desde, self._sin_aplicar) if tipo in d]
+        return min(fechas) if fechas else None
+
+    def _aplicar(self, registros):
+        if not registros:
+            return
+        from .models import ChatMessage, Usuario
+        modelos = _modelos()
+        usuarios = {r['campos'].get('usuario_id') for r in registros} - {None}
+        existentes = set(Usuario.objects.filter(pk__in=usuarios).values_list('pk', flat=True)) if usuarios else set()
+        por_modelo, invalidos = {}, []
+        for registro in registros:
+            modelo = modelos.get(registro.get('tipo'))
+            if modelo is None:
+                continue
+            try:
+                campos = dict(registro['campos'])
+                if campos.get('usuario_id') not in existentes:
+                    # usuario borrado o anónimo: el chat lo admite (SET_NULL), búsquedas y actividad no
+                    if modelo is not ChatMessage:
+                        continue
+                    campos['usuario_id'] = None
+                campo_fecha = CAMPOS_FECHA[registro['tipo']]
+                if isinstance(campos.get(campo_fecha), str):
+                    campos[campo_fecha] = parse_datetime(campos[campo_fecha])
+                for nombre, valor in campos.items():
+                    if isinstance(valor, str) and isinstance(modelo._meta.get_field(nombre), models.BinaryField):
+                        campos[nombre] = base64.b64decode(valor)
+                modelo(**campos)
+            except ERRORES_DE_DATOS + (KeyError, FieldDoesNotExist):
+                invalidos.append(registro)
+                continue
+            por_modelo.setdefault(modelo, []).append((registro, campos))
+        try:
+            with transaction.atomic():
+                for modelo, filas in por_modelo.items():
+                    modelo.objects.bulk_create([modelo(**campos) for _, campos in filas], batch_size=500)
+        except ERRORES_DE_DATOS:
+            # un registro inválido no traba a los demás: se insertan de a uno y los rechazados van a cuarentena
+            for modelo, filas in por_modelo.items():
+                for registro, campos in filas:
+                    try:
+                        with transaction.atomic():
+                            modelo.objects.bulk_create([modelo(**campos)])
+                    except ERRORES_DE_DATOS:
+                        invalidos.append(registro)
+        if invalidos:
+            self._cuarentena(invalidos)
+
+    def _cuarentena(self, registros):
+        """Aparta en `BITACORA_SPOOL_DIR/cuarentena/` los registros que la base de datos rechazó."""
+        directorio = os.path.join(self.directorio, 'cuarentena')
+        ruta = os.path.join(directorio, f'{os.getpid()}-{uuid.uuid4().hex}.jsonl')
+        logger.error('%d registros inválidos de la bitácora apartados en %s', len(registros), ruta)
+        try:
+            os.makedirs(directorio, exist_ok=True)
+            with open(ruta, 'w', encoding='utf-8') as archivo:
+                archivo.writelines(json.dumps(registro, cls=_Codificador) + '\n' for registro in registros)
+        except OSError:
+            # los demás registros ya están guardados: no se reintenta el lote por esto
+            logger.exception('No se pudo escribir la cuarentena de la bitácora en %s', directorio)
+
+    def _iniciar_hilo(self):
+        if self._hilo is not None and self._hilo.is_alive():
+            return
+        with self.lock:
+            if self._hilo is None or not self._hilo.is_alive():
+                self._hilo = threading.Thread(target=self._bucle, name='bitacora', daemon=True)
+                self._hilo.start()
+
+    def _bucle(self):
+        while True:
+            self._despertar.wait(self.intervalo)
+            self._despertar.clear()
+            try:
+                self.vaciar()
+            finally:
+                close_old_connections()
+
+
+_bitacora = Bitacora()
+atexit.register(_bitacora.vaciar)
+
+
+def get_bitacora():
+    """Bitácora del proceso."""
+    return _bitacora
+
+
+def registrar_actividad(usuario, accion):
+    """Agrega una fila a `HistoriaActividad` (diferida); se ignora si no hay usuario autenticado."""
+    if usuario is not None and getattr(usuario, 'is_authenticated', False):
+        _bitacora.registrar(ACTIVIDAD, usuario_id=usuario.pk, accion=accion)
@@ -0,0 +1,122 @@
+"""Cache de resultados de búsqueda por proceso (LRU con TTL).
+
+Las mismas consultas ("carne", "0101", "leche") se repiten muchas veces al
+día. `buscar_partidas` y `api_autocomplete` guardan aquí los ids que
+resuelven una consulta, indexados por el término normalizado y los filtros,
+como `array` de enteros (8 bytes por id) en lugar de sets o querysets.
+
+La memoria está acotada por el total de ids guardados
+(`SEARCH_RESULT_CACHE_MAX_IDS`); al superarlo se descartan las entradas usadas
+hace más tiempo. Cada entrada expira a los `SEARCH_RESULT_CACHE_TTL` segundos
+y todo el cache se vacía cuando cambia la generación del catálogo.
+"""
+import threading
+import time
+from array import array
+from collections import OrderedDict
+
+from django.conf import settings
+
+from .catalogo import get_generacion
+from .search_index import normalizar_codigo, tokenizar
+
+
+def clave_termino(termino):
+    """Forma normalizada del término: dos términos con la misma clave dan los mismos resultados."""
+    return (' '.join(tokenizar(termino)), normalizar_codigo(termino))
+
+
+def ids_compactos(ids):
+    return array('q', ids)
+
+
+def _peso(valor):
+    if isinstance(valor, tuple):
+        return sum(len(v) for v in valor)
+    return len(valor)
+
+
+class CacheResultados:
+    """LRU de resultados con TTL, límite de ids y contadores de aciertos/fallos."""
+
+    def __init__(self, max_ids=None, ttl=None):
+        self._max_ids = max_ids
+        self._ttl = ttl
+        self.entradas = OrderedDict()
+        self.ids_guardados = 0
+        self.aciertos = 0
+        self.fallos = 0
+        self.generacion = None
+        self.lock = threading.Lock()
+
+    @property
+    def max_ids(self):
+        return self._max_ids if self._max_ids is not None else getattr(settings, 'SEARCH_RESULT_CACHE_MAX_IDS', 2_000_000)
+
+    @property
+    def ttl(self):
+        return self._ttl if self._ttl is not None else getattr(settings, 'SEARCH_RESULT_CACHE_TTL', 600)
+
+    def _vaciar(self):
+        self.entradas.clear()
+        self.ids_guardados = 0
+
+    def _quitar(self, clave):
+        _, _, peso = self.entradas.pop(clave)
+        self.ids_guardados -= peso
+
+    def obtener(self, clave, calcular):
+        """Devuelve el valor cacheado para `clave` o lo calcula con `calcular()` y lo guarda.
+        `calcular` debe devolver un `array` de ids o una tupla de arrays.
+        """
+        generacion = get_generacion()
+        ahora = time.monotonic()
+        with self.lock:
+            if generacion != self.generacion:
+                self._vaciar()
+                self.generacion = generacion
+            entrada = self.entradas.get(clave)
+            if entrada is not None and entrada[0] > ahora:
+                self.entradas.move_to_end(clave)
+                self.aciertos += 1
+                return entrada[1]
+            if entrada is not None:
+                self._quitar(clave)
+            self.fallos += 1
+
+        valor = calcular()
+        peso = _peso(valor)
+        with self.lock:
+            # si el catálogo cambió mientras se calculaba, no guardar un resultado que puede estar obsoleto
+            if generacion != self.generacion or peso > self.max_ids:
+                return valor
+            if clave in self.entradas:
+                self._quitar(clave)
+            self.entradas[clave] = (ahora + self.ttl, valor, peso)
+            self.ids_guardados += peso
+            while self.ids_guardados > self.max_ids:
+                self._quitar(next(iter(self.entradas)))
+        return valor
+
+    def limpiar(self):
+        with self.lock:
+            self._vaciar()
+
+    def estadisticas(self):
+        with self.lock:
+            consultas = self.aciertos + self.fallos
+            return {
+                'entradas': len(self.entradas),
+                'ids': self.ids_guardados,
+                'aciertos': self.aciertos,
+                'fallos': self.fallos,
+                'tasa_aciertos': (self.aciertos / consultas) if consultas else 0.0,
+            }
+
+
+_cache = CacheResultados()
+
+
+def get_cache_resultados():
+    """Cache de resultados del proceso."""
+    return _cache
@@ -0,0 +1,84 @@
+"""Número de generación del catálogo de partidas.
+
+Cada escritura sobre `PartidaArancelaria` (vistas, admin, importación, borrados
+de sincronización) incrementa la generación global y la de los capítulos
+afectados, en la misma transacción que la escritura. Los caches de búsqueda,
+facetas, exportaciones o páginas incluyen la generación en su clave y quedan
+obsoletos exactamente cuando cambian los datos.
+
+Leer la generación cuesta una consulta al cache de Django; solo se va a la base
+de datos cuando la entrada no está o expiró (`CATALOG_GENERATION_TTL`).
+"""
+import hashlib
+import threading
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import F
+from django.utils import timezone
+
+
+GLOBAL = ''
+
+_local = threading.local()
+
+
+def _cache_key(capitulo):
+    # los nombres de capítulo tienen espacios y acentos, no válidos en claves de memcached
+    return 'partidas:generacion:' + hashlib.md5(capitulo.encode('utf-8')).hexdigest()
+
+
+def get_generacion(capitulo=GLOBAL):
+    """Generación actual del catálogo completo o, si se indica, de un capítulo."""
+    capitulo = str(capitulo or GLOBAL)
+    key = _cache_key(capitulo)
+    generacion = cache.get(key)
+    if generacion is None:
+        from .models import GeneracionCatalogo
+        generacion = GeneracionCatalogo.objects.filter(capitulo=capitulo).values_list('generacion', flat=True).first() or 0
+        cache.set(key, generacion, getattr(settings, 'CATALOG_GENERATION_TTL', 5))
+    return generacion
+
+
+def incrementar_generacion(capitulos=()):
+    """Incrementa la generación global y la de `capitulos` con un UPDATE atómico."""
+    from .models import GeneracionCatalogo
+    claves = {GLOBAL} | {str(c) for c in capitulos if c}
+    with transaction.atomic():
+        existentes = set(GeneracionCatalogo.objects.filter(capitulo__in=claves).values_list('capitulo', flat=True))
+        if len(existentes) < len(claves):
+            GeneracionCatalogo.objects.bulk_create(
+                [GeneracionCatalogo(capitulo=c) for c in claves - existentes], ignore_conflicts=True)
+        GeneracionCatalogo.objects.filter(capitulo__in=claves).update(
+            generacion=F('generacion') + 1, actualizado_en=timezone.now())
+    keys = [_cache_key(c) for c in claves]
+    cache.delete_many(keys)
+    # otro proceso pudo volver a cachear el valor anterior antes del commit
+    transaction.on_commit(lambda: cache.delete_many(keys))
+
+
+def registrar_cambio(*capitulos):
+    """Anota un cambio en el catálogo. Dentro de `lote_catalogo()` se acumula hasta el final del lote."""
+    pendientes = getattr(_local, 'pendientes', None)
+    if pendientes is None:
+        incrementar_generacion(capitulos)
+    else:
+        pendientes.add(GLOBAL)
+        pendientes.update(str(c) for c in capitulos if c)
+
+
+@contextmanager
+def lote_catalogo():
+    """Agrupa las escrituras de un bloque (p. ej. una importación) en un único incremento."""
+    if getattr(_local, 'pendientes', None) is not None:
+        yield
+        return
+    _local.pendientes = pendientes = set()
+    try:
+        yield
+    finally:
+        _local.pendientes = None
+        if pendientes:
+            incrementar_generacion(pendientes)
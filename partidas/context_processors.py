@@ -14,17 +14,17 @@ def license_info(request):
     }
     try:
         if request.user.is_authenticated:
-            from .models import LicenciaTemporal
-            licencia = LicenciaTemporal.objects.filter(usuario=request.user, estado=True).order_by('-fecha_fin').first()
-            if licencia:
+            from .principal import get_principal
+            fecha_fin = get_principal(request).fecha_fin_activa
+            if fecha_fin:
                 hoy = date.today()
 
-                raw_days = (licencia.fecha_fin - hoy).days
+                raw_days = (fecha_fin - hoy).days
 
                 dias_inclusivos = raw_days + 1
 
                 ctx['licencia_dias_restantes'] = dias_inclusivos
-                ctx['licencia_fecha_fin'] = licencia.fecha_fin.isoformat()
+                ctx['licencia_fecha_fin'] = fecha_fin.isoformat()
 
 
 
@@ -0,0 +1,168 @@
+"""Bandeja de salida de correos (`CorreoSaliente`) y su envío en lote.
+
+Las vistas y el admin solo encolan con `encolar()`; `manage.py enviar_correos` toma los correos
+pendientes de a lotes y los envía por una sola conexión SMTP. Un envío fallido se reintenta con espera
+exponencial (`CORREO_REINTENTO_BASE` segundos, el doble en cada intento, hasta `CORREO_REINTENTO_MAX`) y
+tras `CORREO_MAX_INTENTOS` queda en error. El resultado se guarda en `NotificationLog` (correos con
+`registrar` o `notificacion`) y en `SolicitudSoporte.estado`.
+"""
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.mail import EmailMultiAlternatives, get_connection
+from django.db import connection, transaction
+from django.utils import timezone
+
+from .models import CorreoSaliente, NotificationLog, SolicitudSoporte
+
+
+# timeout de cada operación SMTP si no hay EMAIL_TIMEOUT (sin timeout la reserva de un lote no tendría cota)
+TIMEOUT_POR_DEFECTO = 30
+
+
+def _ajuste(nombre, defecto):
+    return getattr(settings, nombre, defecto)
+
+
+def nuevo_correo(asunto, cuerpo, destinatario, remitente=None, **campos):
+    """CorreoSaliente sin guardar, para encolar varios con bulk_create."""
+    remitente = remitente or getattr(settings, 'DEFAULT_FROM_EMAIL', '') or ''
+    return CorreoSaliente(asunto=asunto or '', cuerpo=cuerpo or '', destinatario=destinatario,
+                          remitente=remitente, **campos)
+
+
+def encolar(asunto, cuerpo, destinatario, remitente=None, **campos):
+    correo = nuevo_correo(asunto, cuerpo, destinatario, remitente, **campos)
+    correo.save()
+    return correo
+
+
+def espera_reintento(intentos):
+    """Segundos hasta el próximo intento tras `intentos` envíos fallidos."""
+    base = _ajuste('CORREO_REINTENTO_BASE', 60)
+    return min(base * 2 ** (intentos - 1), _ajuste('CORREO_REINTENTO_MAX', 3600))
+
+
+def _timeout():
+    return getattr(settings, 'EMAIL_TIMEOUT', None) or TIMEOUT_POR_DEFECTO
+
+
+def duracion_reserva(cantidad):
+    """Segundos que un worker retiene `cantidad` correos: lo que tarda el envío si la conexión y cada
+    mensaje agotan el timeout SMTP, más el margen `CORREO_RESERVA`."""
+    return (cantidad + 1) * _timeout() + _ajuste('CORREO_RESERVA', 300)
+
+
+def _tomar(lote):
+    """Reserva hasta `lote` correos pendientes corriendo su `proximo_intento` al fin de la reserva, para que
+    otro worker no los tome; si este proceso cae, vuelven a estar disponibles al vencer la reserva.
+    Devuelve (correos, fin de la reserva)."""
+    ahora = timezone.now()
+    with transaction.atomic():
+        pendientes = CorreoSaliente.objects.filter(estado='pending', proximo_intento__lte=ahora).order_by('proximo_intento', 'pk')
+        if connection.features.has_select_for_update_skip_locked:
+            pendientes = pendientes.select_for_update(skip_locked=True)
+        ids = list(pendientes.values_list('pk', flat=True)[:lote])
+        reserva = ahora + timedelta(seconds=duracion_reserva(len(ids)))
+        CorreoSaliente.objects.filter(pk__in=ids).update(proximo_intento=reserva)
+    correos = CorreoSaliente.objects.filter(pk__in=ids).select_related('usuario', 'notificacion', 'solicitud').order_by('pk')
+    return list(correos), reserva
+
+
+def _mensaje(correo):
+    mensaje = EmailMultiAlternatives(correo.asunto, correo.cuerpo, correo.remitente, [correo.destinatario])
+    if correo.cuerpo_html:
+        mensaje.attach_alternative(correo.cuerpo_html, 'text/html')
+    return mensaje
+
+
+def _enviar(correos):
+    """Envía los correos por una sola conexión; devuelve {pk: mensaje de error o None}."""
+    errores = {}
+    try:
+        conexion = get_connection(fail_silently=False, timeout=_timeout())
+        conexion.open()
+    except Exception as exc:
+        return {correo.pk: str(exc) or exc.__class__.__name__ for correo in correos}
+    try:
+        for correo in correos:
+            try:
+                enviados = conexion.send_messages([_mensaje(correo)])
+                errores[correo.pk] = None if enviados else 'El servidor no aceptó el mensaje'
+            except Exception as exc:
+                errores[correo.pk] = str(exc) or exc.__class__.__name__
+    finally:
+        try:
+            conexion.close()
+        except Exception:
+            pass
+    return errores
+
+
+def procesar_lote(lote=None):
+    """Envía un lote de correos pendientes y guarda los resultados. Devuelve (enviados, fallidos).
+
+    Solo se guardan los correos que siguen reservados por este worker (`proximo_intento` igual al fin de su
+    reserva): si el envío superó la reserva y otro worker los tomó, el resultado de ese otro worker prevalece.
+    """
+    correos, reserva = _tomar(lote or _ajuste('CORREO_LOTE', 50))
+    if not correos:
+        return 0, 0
+    errores = _enviar(correos)
+
+    ahora = timezone.now()
+    max_intentos = _ajuste('CORREO_MAX_INTENTOS', 5)
+    for correo in correos:
+        error = errores[correo.pk]
+        correo.intentos += 1
+        correo.error_message = error
+        if error is None:
+            correo.estado, correo.enviado_en = 'sent', ahora
+        elif correo.intentos >= max_intentos:
+            correo.estado = 'error'
+        else:
+            correo.proximo_intento = ahora + timedelta(seconds=espera_reintento(correo.intentos))
+
+    nuevos_logs, logs, solicitudes = [], [], []
+    with transaction.atomic():
+        propios = [
+            correo for correo in correos
+            if CorreoSaliente.objects.filter(pk=correo.pk, estado='pending', proximo_intento=reserva).update(
+                estado=correo.estado, intentos=correo.intentos, proximo_intento=correo.proximo_intento,
+                error_message=correo.error_message, enviado_en=correo.enviado_en)
+        ]
+        for correo in propios:
+            error = errores[correo.pk]
+            final = correo.estado != 'pending'
+            if correo.solicitud and (final or error):
+                solicitud = correo.solicitud
+                if final:
+                    solicitud.estado = correo.estado
+                solicitud.error_message = error or ''
+                solicitudes.append(solicitud)
+            if not final:
+                continue
+            if correo.notificacion:
+                log = correo.notificacion
+                log.success, log.error_message, log.fecha_hora = error is None, error, ahora
+                logs.append(log)
+            elif correo.registrar:
+                nuevos_logs.append(NotificationLog(destinatario=correo.usuario, destinatario_email=correo.destinatario,
+                                                   asunto=correo.asunto, cuerpo=correo.cuerpo,
+                                                   enviado_por_id=correo.enviado_por_id,
+                                                   success=error is None, error_message=error))
+        NotificationLog.objects.bulk_update(logs, ['success', 'error_message', 'fecha_hora'])
+        SolicitudSoporte.objects.bulk_update(solicitudes, ['estado', 'error_message'])
+        NotificationLog.objects.bulk_create(nuevos_logs)
+    fallidos = sum(1 for error in errores.values() if error)
+    return len(correos) - fallidos, fallidos
+
+
+def procesar_pendientes(lote=None):
+    """Envía lotes hasta que no queden correos listos para enviar. Devuelve (enviados, fallidos)."""
+    enviados = fallidos = 0
+    while True:
+        ok, error = procesar_lote(lote)
+        if not ok and not error:
+            return enviados, fallidos
+        enviados, fallidos = enviados + ok, fallidos + error
@@ -1,6 +1,8 @@
 from django.core.exceptions import PermissionDenied
 from django.shortcuts import redirect
 
+from .principal import get_principal
+
 def rol_requerido(nombre_rol):
     def decorator(view_func):
         def _wrapped_view(request, *args, **kwargs):
@@ -9,10 +11,7 @@ def rol_requerido(nombre_rol):
                 from django.urls import reverse
                 return redirect(reverse('login'))
 
-            if request.user.is_superuser: 
-                return view_func(request, *args, **kwargs)
-
-            if request.user.rol and request.user.rol.nombre == nombre_rol:
+            if get_principal(request).tiene_rol(nombre_rol):
                 return view_func(request, *args, **kwargs)
 
             raise PermissionDenied
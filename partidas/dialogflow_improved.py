@@ -410,8 +410,8 @@ def generate_chat_response(mensaje: str, request=None) -> tuple:
         else:
             try:
                 from datetime import date
-                from .models import LicenciaTemporal
-                licencia = LicenciaTemporal.objects.filter(usuario=request.user, estado=True).order_by('-fecha_fin').first()
+                from .principal import get_principal
+                licencia = get_principal(request).licencia_activa
                 if licencia:
                     hoy = date.today()
                     dias_restantes = (licencia.fecha_fin - hoy).days
@@ -0,0 +1,269 @@
+"""Contadores de estadísticas de búsqueda.
+
+Una búsqueda suma 1 a cada capítulo con coincidencias (cuenta diaria y total) y
+al primer producto encontrado de cada capítulo. En lugar de leer, sumar y
+guardar cada fila (lo que pierde incrementos cuando dos procesos escriben a la
+vez), las filas que faltan se crean con un INSERT que ignora conflictos y los
+contadores se incrementan con `UPDATE ... SET count = count + n` (`F()`), que
+la base de datos aplica de forma atómica. El costo es fijo: seis consultas por
+lote, sin importar cuántos capítulos o productos se toquen.
+
+Las búsquedas no escriben directamente: `AgregadorEstadisticas` guarda en
+memoria los ids coincidentes de cada búsqueda y cada `SEARCH_STATS_FLUSH_INTERVAL`
+segundos los resuelve a capítulos y productos y aplica todo en una transacción.
+"""
+import atexit
+import logging
+import threading
+import time
+from collections import Counter, deque
+
+from django.conf import settings
+from django.db import close_old_connections, transaction
+from django.db.models import Case, F, IntegerField, Value, When
+from django.utils import timezone
+
+from .frecuentes import get_rastreador
+from .hll import HyperLogLog, unir
+from .models import PartidaArancelaria, SearchStatisticDaily, SearchStatisticProductTotal, SearchStatisticTotal
+
+
+logger = logging.getLogger(__name__)
+
+SIN_CAPITULO = 'Sin capítulo'
+
+
+def productos_por_capitulo(filas):
+    """Primer producto de cada capítulo a partir de tuplas (id, codigo, descripcion, capitulo).
+    Devuelve {capitulo: (codigo, descripcion)}.
+    """
+    productos = {}
+    for pk, codigo, descripcion, capitulo in filas:
+        capitulo = capitulo or SIN_CAPITULO
+        if capitulo not in productos:
+            productos[capitulo] = (codigo or f"{pk}", descripcion)
+    return productos
+
+
+def incremento(campo, clave, cantidades):
+    """`F(campo) + n`, con n distinto por fila (CASE) si las cantidades no son todas iguales."""
+    valores = set(cantidades.values())
+    if len(valores) == 1:
+        return F(campo) + valores.pop()
+    return F(campo) + Case(
+        *[When(**{clave: k}, then=Value(n)) for k, n in cantidades.items()],
+        default=Value(0), output_field=IntegerField(),
+    )
+
+
+def _agregar_usuarios(fecha, usuarios_por_capitulo):
+    """Suma usuarios a los sketches HyperLogLog de las filas diarias (bloqueadas hasta el commit)."""
+    filas = list(SearchStatisticDaily.objects.select_for_update().filter(
+        fecha=fecha, capitulo__in=list(usuarios_por_capitulo)
+    ).only('id', 'capitulo', 'usuarios_hll'))
+    for fila in filas:
+        hll = HyperLogLog.desde_bytes(fila.usuarios_hll)
+        for usuario_id in usuarios_por_capitulo[fila.capitulo]:
+            hll.agregar(usuario_id)
+        fila.usuarios_hll = hll.a_bytes()
+    SearchStatisticDaily.objects.bulk_update(filas, ['usuarios_hll'])
+
+
+def incrementar_contadores(capitulos_por_dia, productos, usuarios=None):
+    """Aplica incrementos en lote.
+    `capitulos_por_dia`: Counter {(capitulo, fecha): n}.
+    `productos`: {codigo: (descripcion, capitulo, n)}; descripción y capítulo se actualizan con el último valor.
+    `usuarios`: {(capitulo, fecha): ids de usuario} para los conteos de usuarios distintos.
+    """
+    with transaction.atomic():
+        dias = {}
+        for (capitulo, fecha), n in capitulos_por_dia.items():
+            dias.setdefault(fecha, Counter())[capitulo] += n
+        usuarios_por_dia = {}
+        for (capitulo, fecha), ids in (usuarios or {}).items():
+            if ids:
+                usuarios_por_dia.setdefault(fecha, {})[capitulo] = ids
+        for fecha, cantidades in dias.items():
+            SearchStatisticDaily.objects.bulk_create(
+                [SearchStatisticDaily(capitulo=c, fecha=fecha, count=0) for c in cantidades], ignore_conflicts=True)
+            SearchStatisticDaily.objects.filter(capitulo__in=list(cantidades), fecha=fecha).update(
+                count=incremento('count', 'capitulo', cantidades))
+            if fecha in usuarios_por_dia:
+                _agregar_usuarios(fecha, usuarios_por_dia[fecha])
+
+        totales = Counter()
+        for (capitulo, _), n in capitulos_por_dia.items():
+            totales[capitulo] += n
+        if totales:
+            SearchStatisticTotal.objects.bulk_create(
+                [SearchStatisticTotal(capitulo=c, total=0) for c in totales], ignore_conflicts=True)
+            SearchStatisticTotal.objects.filter(capitulo__in=list(totales)).update(
+                total=incremento('total', 'capitulo', totales), actualizado_en=timezone.now())
+
+        if productos:
+            SearchStatisticProductTotal.objects.bulk_create(
+                [SearchStatisticProductTotal(codigo=codigo, descripcion=descripcion, capitulo=capitulo, total=0)
+                 for codigo, (descripcion, capitulo, _) in productos.items()],
+                update_conflicts=True, unique_fields=['codigo'], update_fields=['descripcion', 'capitulo'],
+            )
+            SearchStatisticProductTotal.objects.filter(codigo__in=list(productos)).update(
+                total=incremento('total', 'codigo', {codigo: n for codigo, (_, _, n) in productos.items()}),
+                actualizado_en=timezone.now(),
+            )
+
+
+def _acumular(por_capitulo, fecha, capitulos_por_dia, productos, usuario_id=None, usuarios=None):
+    for capitulo, (codigo, descripcion) in por_capitulo.items():
+        capitulos_por_dia[(capitulo, fecha)] += 1
+        if usuario_id is not None:
+            usuarios.setdefault((capitulo, fecha), set()).add(usuario_id)
+        n = productos[codigo][2] if codigo in productos else 0
+        productos[codigo] = (descripcion, capitulo, n + 1)
+
+
+def registrar_busqueda(filas, fecha=None, usuario_id=None):
+    """Suma una búsqueda a las estadísticas. `filas`: tuplas (id, codigo, descripcion, capitulo) coincidentes."""
+    fecha = fecha or timezone.localdate()
+    por_capitulo = productos_por_capitulo(filas)
+    if not por_capitulo:
+        return
+    capitulos_por_dia, productos, usuarios = Counter(), {}, {}
+    _acumular(por_capitulo, fecha, capitulos_por_dia, productos, usuario_id, usuarios)
+    incrementar_contadores(capitulos_por_dia, productos, usuarios)
+
+
+def usuarios_distintos(desde, hasta, capitulos=None):
+    """Usuarios distintos estimados entre `desde` y `hasta` (inclusive), uniendo los sketches diarios.
+    Devuelve ({capitulo: (usuarios, busquedas)}, usuarios distintos en todos los capítulos).
+    """
+    qs = SearchStatisticDaily.objects.filter(fecha__range=(desde, hasta))
+    if capitulos:
+        qs = qs.filter(capitulo__in=capitulos)
+    sketches, busquedas = {}, Counter()
+    for capitulo, count, datos in qs.values_list('capitulo', 'count', 'usuarios_hll').iterator():
+        capitulo = capitulo or SIN_CAPITULO
+        busquedas[capitulo] += count
+        if datos:
+            sketches.setdefault(capitulo, []).append(datos)
+    por_capitulo = {}
+    total = None
+    for capitulo, n in busquedas.items():
+        hll = unir(sketches.get(capitulo, ()))
+        por_capitulo[capitulo] = (hll.estimar(), n)
+        total = hll if total is None else total.combinar(hll)
+    return por_capitulo, (total or HyperLogLog()).estimar()
+
+
+class AgregadorEstadisticas:
+    """Buffer en memoria de búsquedas pendientes de contabilizar (escritura diferida).
+
+    `registrar()` solo agrega (ids, fecha, usuario) a una cola; `vaciar()` consulta en una
+    sola pasada los capítulos de todos los ids pendientes y aplica los contadores
+    con `incrementar_contadores`. La cola tiene como máximo `SEARCH_STATS_BUFFER_MAX`
+    búsquedas: al llenarse se vacía en el hilo que registra. Se vacía también al
+    terminar el proceso (atexit) y, según `SEARCH_STATS_BACKGROUND_FLUSH`, desde un
+    hilo propio o al final de las peticiones cada `SEARCH_STATS_FLUSH_INTERVAL` segundos.
+    """
+
+    def __init__(self):
+        self.pendientes = deque()
+        self.lock = threading.Lock()
+        self.lock_vaciado = threading.Lock()
+        self.ultimo_vaciado = time.monotonic()
+        self._hilo = None
+
+    @property
+    def intervalo(self):
+        return getattr(settings, 'SEARCH_STATS_FLUSH_INTERVAL', 5)
+
+    @property
+    def maximo(self):
+        return getattr(settings, 'SEARCH_STATS_BUFFER_MAX', 1000)
+
+    def registrar(self, ids, fecha=None, usuario_id=None):
+        """Encola una búsqueda; `ids` son los ids de las partidas coincidentes."""
+        if not ids:
+            return
+        with self.lock:
+            self.pendientes.append((ids, fecha or timezone.localdate(), usuario_id))
+            lleno = len(self.pendientes) >= self.maximo
+        if lleno:
+            self.vaciar()
+        elif getattr(settings, 'SEARCH_STATS_BACKGROUND_FLUSH', False):
+            self._iniciar_hilo()
+
+    def __len__(self):
+        return len(self.pendientes)
+
+    def vaciar(self):
+        """Aplica las búsquedas pendientes en una transacción. Devuelve cuántas se aplicaron."""
+        with self.lock_vaciado:
+            with self.lock:
+                eventos = list(self.pendientes)
+                self.pendientes.clear()
+                self.ultimo_vaciado = time.monotonic()
+            if not eventos:
+                return 0
+            try:
+                self._aplicar(eventos)
+            except Exception:
+                logger.exception('No se pudieron guardar %d búsquedas en las estadísticas', len(eventos))
+                with self.lock:
+                    # se reintentan en el próximo vaciado sin superar el máximo (se descartan las más antiguas)
+                    espacio = max(self.maximo - len(self.pendientes), 0)
+                    conservar = eventos[-espacio:] if espacio else []
+                    self.pendientes.extendleft(reversed(conservar))
+                return 0
+            return len(eventos)
+
+    def vaciar_si_corresponde(self):
+        if self.pendientes and time.monotonic() - self.ultimo_vaciado >= self.intervalo:
+            self.vaciar()
+
+    def _aplicar(self, eventos):
+        todos = set()
+        for ids, _, _ in eventos:
+            todos.update(ids)
+        filas = {}
+        todos = sorted(todos)
+        for i in range(0, len(todos), 2000):
+            for pk, codigo, descripcion, capitulo in PartidaArancelaria.objects.filter(
+                id__in=todos[i:i + 2000]
+            ).values_list('id', 'codigo', 'descripcion', 'capitulo'):
+                filas[pk] = (pk, codigo, descripcion, capitulo)
+
+        capitulos_por_dia, productos, usuarios = Counter(), {}, {}
+        for ids, fecha, usuario_id in eventos:
+            coincidentes = (filas[pk] for pk in sorted(ids) if pk in filas)
+            _acumular(productos_por_capitulo(coincidentes), fecha, capitulos_por_dia, productos, usuario_id, usuarios)
+        if capitulos_por_dia:
+            incrementar_contadores(capitulos_por_dia, productos, usuarios)
+            capitulos = Counter()
+            for (capitulo, _), n in capitulos_por_dia.items():
+                capitulos[capitulo] += n
+            get_rastreador().registrar({codigo: n for codigo, (_, _, n) in productos.items()}, capitulos)
+
+    def _iniciar_hilo(self):
+        if self._hilo is not None and self._hilo.is_alive():
+            return
+        with self.lock:
+            if self._hilo is None or not self._hilo.is_alive():
+                self._hilo = threading.Thread(target=self._bucle, name='estadisticas-busqueda', daemon=True)
+                self._hilo.start()
+
+    def _bucle(self):
+        while True:
+            time.sleep(self.intervalo)
+            try:
+                self.vaciar()
+            finally:
+                close_old_connections()
+
+
+_agregador = AgregadorEstadisticas()
+atexit.register(_agregador.vaciar)
+
+
+def get_agregador():
+    """Agregador de estadísticas del proceso."""
+    return _agregador
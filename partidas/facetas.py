@@ -0,0 +1,80 @@
+"""Catálogos de valores para los filtros (desplegables) del buscador.
+
+Calcularlos requiere un `distinct()` por campo sobre toda la tabla de
+partidas (uno de ellos sobre `disp_legal`, un TextField grande), así que se
+guardan en el cache de Django con la generación del catálogo en la clave y
+solo se recalculan cuando cambia el catálogo.
+"""
+import re
+
+from django.conf import settings
+from django.core.cache import cache
+
+from .catalogo import get_generacion
+
+CACHE_KEY = 'partidas:facetas:{}'
+
+
+def clean_capitulo_label(c):
+    if not c:
+        return None
+    s = str(c).strip()
+    if not s:
+        return None
+
+    s_clean = re.sub(r'^(capitulo|capículo|capítulo)\s*\d+\s*[:\-\)]?\s*', '', s, flags=re.IGNORECASE)
+    s_clean = re.sub(r'^\d+\s*[:\.\-\)]\s*', '', s_clean)
+    s_clean = s_clean.strip()
+    return s_clean or None
+
+
+def _valores_distintos(campo):
+    from .models import PartidaArancelaria
+    vistos = set()
+    valores = []
+    for v in PartidaArancelaria.objects.values_list(campo, flat=True).distinct():
+        if v and v not in vistos:
+            vistos.add(v)
+            valores.append(v)
+    return valores
+
+
+def calcular_facetas():
+    """Devuelve los catálogos de filtros consultando la base de datos.
+    `capitulos` es una lista de tuplas (valor original, etiqueta limpia, número de capítulo).
+    """
+    capitulos_disponibles = []
+    seen = set()
+    for c in _valores_distintos('capitulo'):
+        orig = str(c).strip()
+        if not orig or orig.lower() in ('sin datos', 'n/a'):
+            continue
+        if orig in seen:
+            continue
+        seen.add(orig)
+        label = clean_capitulo_label(orig)
+
+        num_match = re.search(r"(\d+)", orig)
+        numero = int(num_match.group(1)) if num_match else None
+
+        if not label:
+            label = orig
+        capitulos_disponibles.append((orig, label, numero))
+
+    return {
+        'capitulos': capitulos_disponibles,
+        'gravamenes': _valores_distintos('gravamen'),
+        'tipos_doc': _valores_distintos('tipo_documento'),
+        'entidades': _valores_distintos('entidad_emite'),
+        'disp_legales': _valores_distintos('disp_legal'),
+    }
+
+
+def get_facetas():
+    """Catálogos de filtros desde el cache; se recalculan si no están o cambió la generación del catálogo."""
+    key = CACHE_KEY.format(get_generacion())
+    facetas = cache.get(key)
+    if facetas is None:
+        facetas = calcular_facetas()
+        cache.set(key, facetas, getattr(settings, 'SEARCH_FACETS_TTL', 3600))
+    return facetas
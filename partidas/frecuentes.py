@@ -0,0 +1,183 @@
+"""Ranking aproximado de productos y capítulos más buscados (algoritmo Space-Saving).
+
+`SpaceSaving` mantiene como máximo `k` contadores. Cuando llega una clave nueva
+y no hay lugar, reemplaza a la de menor conteo y hereda ese conteo como error.
+Todo elemento con frecuencia real mayor que N/k (N = total de búsquedas
+contadas) está garantizado en el resumen, y ningún conteo se pasa de su valor
+real por más de N/k. `k` sale de `SEARCH_TOPK_ERROR` (error relativo): con
+0.001 se guardan 1000 contadores.
+
+Cada proceso acumula lo que registra el agregador de estadísticas y cada
+`SEARCH_TOPK_PERSIST_INTERVAL` segundos lo combina con el resumen guardado en
+`ResumenFrecuentes` (los resúmenes de distintos procesos se pueden sumar). La
+migración 0035 siembra ese resumen una vez con los totales exactos. El admin
+lo lee sin escribir: una fila, sin ordenar la tabla de totales.
+"""
+import heapq
+import json
+import math
+import threading
+import time
+
+from django.conf import settings
+from django.db import transaction
+
+
+def capacidad():
+    error = getattr(settings, 'SEARCH_TOPK_ERROR', 0.001)
+    return max(int(math.ceil(1 / error)), 1)
+
+
+class SpaceSaving:
+    """Resumen de las claves más frecuentes con a lo sumo `k` contadores."""
+
+    def __init__(self, k):
+        self.k = k
+        self.conteos = {}
+        self.errores = {}
+        self.total = 0
+        self._heap = []
+        self._orden = None
+
+    def __len__(self):
+        return len(self.conteos)
+
+    def _minimo(self):
+        # heap perezoso: se descartan entradas con conteos desactualizados
+        while self._heap:
+            conteo, clave = self._heap[0]
+            if self.conteos.get(clave) == conteo:
+                return clave
+            heapq.heappop(self._heap)
+        self._heap = [(c, k) for k, c in self.conteos.items()]
+        heapq.heapify(self._heap)
+        return self._heap[0][1] if self._heap else None
+
+    def agregar(self, clave, n=1):
+        self.total += n
+        self._orden = None
+        if clave in self.conteos:
+            self.conteos[clave] += n
+        elif len(self.conteos) < self.k:
+            self.conteos[clave] = n
+            self.errores[clave] = 0
+        else:
+            menor = self._minimo()
+            minimo = self.conteos.pop(menor)
+            del self.errores[menor]
+            self.conteos[clave] = minimo + n
+            self.errores[clave] = minimo
+        heapq.heappush(self._heap, (self.conteos[clave], clave))
+        if len(self._heap) > 4 * self.k:
+            self._heap = [(c, k) for k, c in self.conteos.items()]
+            heapq.heapify(self._heap)
+
+    def combinar(self, otro):
+        """Suma otro resumen (p. ej. el de otro proceso) y conserva los `k` mayores."""
+        conteos = dict(self.conteos)
+        errores = dict(self.errores)
+        minimo_propio = min(self.conteos.values()) if len(self.conteos) >= self.k else 0
+        minimo_otro = min(otro.conteos.values()) if len(otro.conteos) >= otro.k else 0
+        for clave in set(conteos) | set(otro.conteos):
+            conteos[clave] = self.conteos.get(clave, minimo_propio) + otro.conteos.get(clave, minimo_otro)
+            errores[clave] = self.errores.get(clave, minimo_propio) + otro.errores.get(clave, minimo_otro)
+        mayores = heapq.nlargest(self.k, conteos.items(), key=lambda item: (item[1], item[0]))
+        self.conteos = dict(mayores)
+        self.errores = {clave: errores[clave] for clave in self.conteos}
+        self.total += otro.total
+        self._heap = [(c, k) for k, c in self.conteos.items()]
+        heapq.heapify(self._heap)
+        self._orden = None
+
+    def top(self, n):
+        """Lista de (clave, conteo estimado, error) de mayor a menor; se recalcula solo si hubo cambios."""
+        if self._orden is None:
+            self._orden = sorted(self.conteos.items(), key=lambda item: (-item[1], item[0]))
+        return [(clave, conteo, self.errores[clave]) for clave, conteo in self._orden[:n]]
+
+    @property
+    def error_maximo(self):
+        """Cota del error de cualquier conteo: N/k."""
+        return self.total // self.k if self.k else 0
+
+    def a_json(self):
+        return json.dumps({
+            'k': self.k, 'total': self.total,
+            'items': [[clave, conteo, self.errores[clave]] for clave, conteo in self.conteos.items()],
+        }, separators=(',', ':'))
+
+    @classmethod
+    def desde_json(cls, texto, k=None):
+        data = json.loads(texto) if texto else {}
+        resumen = cls(k or data.get('k') or capacidad())
+        for clave, conteo, error in data.get('items', []):
+            resumen.conteos[clave] = conteo
+            resumen.errores[clave] = error
+        resumen.total = data.get('total', 0)
+        resumen._heap = [(c, k) for k, c in resumen.conteos.items()]
+        heapq.heapify(resumen._heap)
+        return resumen
+
+
+PRODUCTOS = 'productos'
+CAPITULOS = 'capitulos'
+
+
+class RastreadorFrecuentes:
+    """Resúmenes locales del proceso, guardados periódicamente en `ResumenFrecuentes`."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.locales = {}
+        self.ultimo_guardado = time.monotonic()
+
+    def registrar(self, productos, capitulos):
+        """`productos` y `capitulos`: {clave: cantidad} de un lote de búsquedas."""
+        k = capacidad()
+        with self.lock:
+            for nombre, conteos in ((PRODUCTOS, productos), (CAPITULOS, capitulos)):
+                resumen = self.locales.setdefault(nombre, SpaceSaving(k))
+                for clave, n in conteos.items():
+                    resumen.agregar(clave, n)
+        if time.monotonic() - self.ultimo_guardado >= getattr(settings, 'SEARCH_TOPK_PERSIST_INTERVAL', 60):
+            self.guardar()
+
+    def guardar(self):
+        """Combina los resúmenes locales con los guardados en la base de datos y vacía los locales."""
+        from .models import ResumenFrecuentes
+        with self.lock:
+            locales, self.locales = self.locales, {}
+            self.ultimo_guardado = time.monotonic()
+        k = capacidad()
+        for nombre in (PRODUCTOS, CAPITULOS):
+            local = locales.get(nombre)
+            if local is None:
+                continue
+            with transaction.atomic():
+                # la migración 0035 siembra la fila con los totales exactos; los lotes locales ya están en
+                # esos totales, así que si falta la fila se empieza de cero en vez de volver a sembrarla
+                fila, _ = ResumenFrecuentes.objects.select_for_update().get_or_create(nombre=nombre)
+                resumen = SpaceSaving.desde_json(fila.datos, k)
+                resumen.combinar(local)
+                fila.datos = resumen.a_json()
+                fila.save()
+
+    def top(self, nombre, n=50):
+        """(filas (clave, conteo, error), cota de error) del resumen guardado más lo pendiente del proceso.
+        Solo lee: lo pendiente se combina en memoria y se guarda en el próximo `guardar()`."""
+        from .models import ResumenFrecuentes
+        datos = ResumenFrecuentes.objects.filter(nombre=nombre).values_list('datos', flat=True).first()
+        resumen = SpaceSaving.desde_json(datos, capacidad())
+        with self.lock:
+            local = self.locales.get(nombre)
+            if local is not None:
+                resumen.combinar(local)
+        return resumen.top(n), resumen.error_maximo
+
+
+_rastreador = RastreadorFrecuentes()
+
+
+def get_rastreador():
+    """Rastreador de productos y capítulos más buscados del proceso."""
+    return _rastreador
@@ -0,0 +1,102 @@
+"""HyperLogLog: conteo aproximado de elementos distintos en espacio fijo.
+
+Se usa para "cuántos usuarios distintos buscaron en el capítulo X" sin
+`COUNT(DISTINCT usuario)` sobre `Busqueda`. Cada (capítulo, día) guarda un
+sketch de 2^p registros de un byte; los sketches de varios días o capítulos se
+combinan tomando el máximo de cada registro, así que un mes se calcula uniendo
+los sketches diarios. Si `SEARCH_HLL_PRECISION` cambia, los sketches guardados
+con otra precisión se reducen a la menor antes de combinarlos. El error típico es 1.04 / sqrt(2^p) (p=10: ~3%).
+
+Los registros se guardan comprimidos con zlib: con pocos usuarios la mayoría
+son cero y el sketch ocupa unas decenas de bytes.
+"""
+import hashlib
+import math
+import zlib
+
+from django.conf import settings
+
+
+def get_precision():
+    return getattr(settings, 'SEARCH_HLL_PRECISION', 10)
+
+
+def _hash64(valor):
+    return int.from_bytes(hashlib.blake2b(str(valor).encode('utf-8'), digest_size=8).digest(), 'big')
+
+
+class HyperLogLog:
+    """Sketch con precisión `p` (2^p registros)."""
+
+    def __init__(self, p=None, registros=None):
+        self.p = p or get_precision()
+        self.m = 1 << self.p
+        self.registros = bytearray(registros) if registros is not None else bytearray(self.m)
+
+    def agregar(self, valor):
+        h = _hash64(valor)
+        indice = h >> (64 - self.p)
+        resto = h & ((1 << (64 - self.p)) - 1)
+        rango = (64 - self.p) - resto.bit_length() + 1
+        if rango > self.registros[indice]:
+            self.registros[indice] = rango
+
+    def reducir(self, p):
+        """Sketch equivalente con precisión `p` menor: los bits de índice que sobran pasan a formar parte del
+        resto del hash y cada grupo de 2^(self.p - p) registros queda en el máximo de sus rangos recalculados."""
+        if p == self.p:
+            return self
+        if p > self.p:
+            raise ValueError('Un sketch HyperLogLog no se puede llevar a una precisión mayor')
+        sobran = self.p - p
+        mascara = (1 << sobran) - 1
+        registros = bytearray(1 << p)
+        for indice, rango in enumerate(self.registros):
+            if not rango:
+                continue
+            bajos = indice & mascara
+            rango = sobran - bajos.bit_length() + 1 if bajos else rango + sobran
+            if rango > registros[indice >> sobran]:
+                registros[indice >> sobran] = rango
+        return HyperLogLog(p, registros)
+
+    def combinar(self, otro):
+        """Une otro sketch en este (unión de conjuntos); con distinta precisión queda en la menor."""
+        if otro.p < self.p:
+            reducido = self.reducir(otro.p)
+            self.p, self.m, self.registros = reducido.p, reducido.m, reducido.registros
+        otro = otro.reducir(self.p)
+        self.registros = bytearray(map(max, self.registros, otro.registros))
+        return self
+
+    def estimar(self):
+        m = self.m
+        alfa = 0.7213 / (1 + 1.079 / m)
+        estimacion = alfa * m * m / sum(2.0 ** -r for r in self.registros)
+        ceros = self.registros.count(0)
+        if estimacion <= 2.5 * m and ceros:
+            # pocos elementos: conteo lineal sobre los registros vacíos
+            estimacion = m * math.log(m / ceros)
+        return int(round(estimacion))
+
+    def a_bytes(self):
+        return zlib.compress(bytes([self.p]) + bytes(self.registros))
+
+    @classmethod
+    def desde_bytes(cls, datos, p=None):
+        """Sketch guardado con `a_bytes()`; vacío si `datos` es None."""
+        if not datos:
+            return cls(p)
+        crudo = zlib.decompress(bytes(datos))
+        return cls(crudo[0], crudo[1:])
+
+
+def unir(sketches, p=None):
+    """Combina una secuencia de sketches serializados en uno solo."""
+    total = None
+    for datos in sketches:
+        if not datos:
+            continue
+        hll = HyperLogLog.desde_bytes(datos)
+        total = hll if total is None else total.combinar(hll)
+    return total or HyperLogLog(p)
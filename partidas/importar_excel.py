@@ -3,6 +3,7 @@ import re
 import unicodedata
 import tempfile
 import os
+from .catalogo import lote_catalogo
 from .models import PartidaArancelaria, ImportLog
 
 
@@ -577,6 +578,7 @@ def process_import(source, usuario=None, update_existing=False, sync_catalog=Fal
     errors = []
     rows_by_chapter = {} 
     codes_in_file = set()
+@lote_catalogo()
 def process_import(source, usuario=None, update_existing=False, sync_catalog=False, nombre_archivo=None):
     """Procesa importación con sincronización POR CAPÍTULO (múltiples capítulos).
     Detecta capítulos automáticamente por prefijo de código (01, 02, 03, 04, etc).
@@ -0,0 +1,75 @@
+"""Revisión nocturna de licencias (manage.py revisar_licencias).
+
+Marca como inactivas las licencias vencidas, sincroniza `Usuario.estado_licencia` y encola los avisos de
+vencimiento próximo; todo con actualizaciones en bloque sobre el índice (estado, fecha_fin). Las
+peticiones ya no envían correos: solo muestran el aviso.
+"""
+from datetime import date, timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Exists, F, OuterRef
+
+from .correo import nuevo_correo
+from .models import CorreoSaliente, LicenciaTemporal, Usuario
+
+
+def get_dias_aviso():
+    """Días (contando el de vencimiento) antes de que venza una licencia en que se avisa al usuario."""
+    return getattr(settings, 'LICENCIA_AVISO_DIAS', 3)
+
+
+def vencer_licencias(hoy=None):
+    """Desactiva las licencias vencidas y sincroniza `Usuario.estado_licencia`.
+    Devuelve (licencias desactivadas, usuarios activados, usuarios desactivados).
+    """
+    hoy = hoy or date.today()
+    vencidas = LicenciaTemporal.objects.filter(estado=True, fecha_fin__lt=hoy)
+    vigentes = LicenciaTemporal.objects.filter(usuario=OuterRef('pk'), estado=True, fecha_fin__gte=hoy)
+    with transaction.atomic():
+        # update() no emite las señales de LicenciaTemporal: se invalida a mano el veredicto de las sesiones
+        Usuario.objects.filter(Exists(vencidas.filter(usuario=OuterRef('pk')))).update(
+            licencia_version=F('licencia_version') + 1)
+        total = vencidas.update(estado=False)
+        activados = Usuario.objects.filter(Exists(vigentes), estado_licencia=False).update(estado_licencia=True)
+        desactivados = Usuario.objects.filter(~Exists(vigentes), estado_licencia=True).update(estado_licencia=False)
+    return total, activados, desactivados
+
+
+def _correo(licencia, hoy):
+    usuario = licencia.usuario
+    dias = (licencia.fecha_fin - hoy).days + 1
+    asunto = 'Aviso: licencia SISARM próxima a vencer'
+    cuerpo = (f"Hola {usuario.username},\n\nTu licencia de SISARM vence el {licencia.fecha_fin} "
+              f"(faltan {dias} día{'' if dias == 1 else 's'}). Por favor renueva para evitar interrupciones.\n\n"
+              f"Saludos,\nEquipo SISARM")
+    return nuevo_correo(asunto, cuerpo, usuario.email, usuario=usuario, registrar=True)
+
+
+def avisar_vencimientos(hoy=None, dias=None, lote=200):
+    """Encola el aviso de vencimiento de las licencias activas que vencen en los próximos `dias` días y aún
+    no lo recibieron, y marca `notified_pre_expiry` con un bulk_update por lote. El envío, los reintentos y
+    el registro en NotificationLog quedan a cargo de la bandeja de salida (partidas/correo.py).
+    Devuelve cuántos avisos se encolaron.
+    """
+    hoy = hoy or date.today()
+    dias = get_dias_aviso() if dias is None else dias
+    por_vencer = (LicenciaTemporal.objects
+                  .filter(estado=True, notified_pre_expiry=False, fecha_fin__gte=hoy,
+                          fecha_fin__lt=hoy + timedelta(days=dias))
+                  .exclude(usuario__email='')
+                  .select_related('usuario'))
+
+    total, ultimo = 0, 0
+    while True:
+        licencias = list(por_vencer.filter(pk__gt=ultimo).order_by('pk')[:lote])
+        if not licencias:
+            break
+        ultimo = licencias[-1].pk
+        for licencia in licencias:
+            licencia.notified_pre_expiry = True
+        with transaction.atomic():
+            CorreoSaliente.objects.bulk_create([_correo(licencia, hoy) for licencia in licencias])
+            LicenciaTemporal.objects.bulk_update(licencias, ['notified_pre_expiry'])
+        total += len(licencias)
+    return total
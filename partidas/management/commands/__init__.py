@@ -0,0 +1 @@
+# Comandos de gestión de la app partidas
@@ -0,0 +1,38 @@
+from datetime import datetime, timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from partidas.agregados import acumular_dias_cerrados, reiniciar
+
+
+class Command(BaseCommand):
+    help = ('Acumula los días cerrados de SearchStatisticDaily en los rankings semanales y mensuales '
+            '(SearchStatistic). Es incremental: solo procesa los días posteriores a la última ejecución. '
+            'Pensado para ejecutarse a diario desde cron o el planificador del hosting.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--hasta', help='Último día a acumular (YYYY-MM-DD). Por defecto, ayer.')
+        parser.add_argument('--reconstruir', action='store_true',
+                            help='Borra los rankings por periodo y vuelve a acumular todo el historial.')
+
+    def handle(self, *args, **options):
+        hasta = None
+        if options['hasta']:
+            try:
+                hasta = datetime.strptime(options['hasta'], '%Y-%m-%d').date()
+            except ValueError:
+                raise CommandError('--hasta debe tener el formato YYYY-MM-DD')
+            # el día en curso sigue recibiendo búsquedas: si se acumulara, la marca lo dejaría incompleto
+            if hasta >= timezone.localdate():
+                raise CommandError(f'--hasta debe ser un día cerrado (a lo sumo {timezone.localdate() - timedelta(days=1)})')
+
+        if options['reconstruir']:
+            reiniciar()
+            self.stdout.write('Rankings por periodo borrados.')
+
+        rango = acumular_dias_cerrados(hasta)
+        if rango is None:
+            self.stdout.write('No hay días nuevos para acumular.')
+        else:
+            self.stdout.write(self.style.SUCCESS(f'Acumulados los días {rango[0]} — {rango[1]}.'))
@@ -0,0 +1,57 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from partidas.archivo import TABLAS, archivar, compactar, get_destino, get_retencion, restaurar
+
+
+class Command(BaseCommand):
+    help = ('Archiva en JSONL comprimido (un archivo por día) y borra las filas de las tablas de registro '
+            '(búsquedas, clicks, chat, actividad y notificaciones) más antiguas que su retención '
+            '(RETENCION_REGISTROS). Pensado para ejecutarse a diario o semanalmente; con --compactar, además '
+            'devuelve el espacio libre al sistema.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--tabla', action='append', choices=sorted(TABLAS),
+                            help='Tabla a procesar (se puede repetir). Por defecto, todas.')
+        parser.add_argument('--dias', type=int, help='Retención en días para las tablas elegidas (reemplaza la configurada).')
+        parser.add_argument('--destino', help='Directorio de los archivos. Por defecto, ARCHIVO_REGISTROS_DIR.')
+        parser.add_argument('--lote', type=int, default=500, help='Filas por lote de borrado (default 500).')
+        parser.add_argument('--simular', action='store_true', help='Solo informa cuántas filas se archivarían.')
+        parser.add_argument('--compactar', action='store_true',
+                            help='Ejecuta VACUUM al terminar. En SQLite reescribe toda la base con un bloqueo exclusivo: '
+                                 'usar en una ventana de mantenimiento.')
+        parser.add_argument('--restaurar', nargs='+', metavar='ARCHIVO',
+                            help='Vuelve a insertar en la base de datos los archivos indicados y termina.')
+
+    def handle(self, *args, **options):
+        if options['restaurar']:
+            for ruta in options['restaurar']:
+                try:
+                    n = restaurar(ruta, options['lote'])
+                except (OSError, ValueError) as e:
+                    raise CommandError(f'No se pudo restaurar {ruta}: {e}')
+                self.stdout.write(f'{ruta}: {n} filas restauradas.')
+            return
+
+        if options['dias'] is not None and options['dias'] < 1:
+            raise CommandError('--dias debe ser al menos 1')
+        if options['lote'] < 1:
+            raise CommandError('--lote debe ser al menos 1')
+        tablas = options['tabla'] or sorted(TABLAS)
+        destino = options['destino'] or get_destino()
+
+        borradas = []
+        for tabla in tablas:
+            dias = options['dias'] if options['dias'] is not None else get_retencion(tabla)
+            n, rutas = archivar(tabla, dias, destino, options['lote'], simular=options['simular'])
+            if options['simular']:
+                self.stdout.write(f'{tabla}: {n} filas de más de {dias} días.')
+                continue
+            self.stdout.write(f'{tabla}: {n} filas archivadas en {len(rutas)} archivos.')
+            if n:
+                borradas.append(tabla)
+
+        if borradas and options['compactar']:
+            compactar(borradas)
+            self.stdout.write('Base de datos compactada.')
+        if not options['simular']:
+            self.stdout.write(self.style.SUCCESS(f'Archivos en {destino}.'))
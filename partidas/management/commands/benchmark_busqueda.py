@@ -0,0 +1,94 @@
+import random
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.db.models import Q
+
+from partidas.models import PartidaArancelaria
+from partidas.search_backends import (
+    FTS_TABLE, ColumnasNormalizadasBackend, IndiceMemoriaBackend, PostgresFTSBackend, SQLiteFTS5Backend,
+)
+from partidas.search_index import get_indice, invalidar_indice
+
+
+PALABRAS = [
+    'caballos', 'asnos', 'carne', 'bovina', 'porcina', 'leche', 'queso', 'café', 'té', 'azúcar',
+    'trigo', 'maíz', 'arroz', 'harina', 'aceite', 'computadoras', 'teléfonos', 'motores', 'tejidos',
+    'algodón', 'lana', 'vidrio', 'hierro', 'acero', 'cobre', 'madera', 'papel', 'calzado', 'juguetes',
+    'fresca', 'refrigerada', 'congelada', 'los', 'demás', 'para', 'uso', 'industrial', 'partes',
+]
+
+
+class Command(BaseCommand):
+    help = ('Compara la búsqueda con LIKE (icontains) contra los backends de búsqueda disponibles '
+            'sobre un catálogo sintético. Los datos se insertan en una transacción que se revierte.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--filas', type=int, default=100000, help='Partidas sintéticas a insertar (default 100000)')
+        parser.add_argument('--repeticiones', type=int, default=5)
+        parser.add_argument('--terminos', nargs='*', default=['carne', 'carne bovina', 'cafe', '0101', '8471.30', 'computadoras'])
+
+    def handle(self, *args, **options):
+        filas = options['filas']
+        repeticiones = options['repeticiones']
+        terminos = options['terminos']
+
+        with transaction.atomic():
+            t0 = time.perf_counter()
+            self._insertar_catalogo(filas)
+            self.stdout.write(f"Insertadas {filas} partidas en {time.perf_counter() - t0:.1f}s "
+                              f"(total catálogo: {PartidaArancelaria.objects.count()})")
+
+            metodos = [('like', self._buscar_like), ('normalizadas', ColumnasNormalizadasBackend().buscar)]
+
+            invalidar_indice()
+            t0 = time.perf_counter()
+            get_indice()
+            self.stdout.write(f"Construcción del índice en memoria: {(time.perf_counter() - t0) * 1000:.0f} ms")
+            metodos.append(('memoria', IndiceMemoriaBackend().buscar))
+
+            if connection.vendor == 'sqlite' and FTS_TABLE in connection.introspection.table_names():
+                metodos.append(('sqlite_fts5', SQLiteFTS5Backend().buscar))
+            if connection.vendor == 'postgresql':
+                metodos.append(('postgres_fts', PostgresFTSBackend().buscar))
+
+            self.stdout.write('')
+            self.stdout.write(f"{'término':<16}" + ''.join(f"{nombre:>14}" for nombre, _ in metodos) + f"{'resultados':>12}")
+            for termino in terminos:
+                columnas = []
+                hits = None
+                for nombre, buscar in metodos:
+                    tiempos = []
+                    for _ in range(repeticiones):
+                        t0 = time.perf_counter()
+                        ids = buscar(termino)
+                        tiempos.append(time.perf_counter() - t0)
+                    if nombre != 'like':
+                        hits = len(ids)
+                    columnas.append(f"{min(tiempos) * 1000:>11.2f} ms")
+                self.stdout.write(f"{termino:<16}" + ''.join(columnas) + f"{hits if hits is not None else '-':>12}")
+
+            transaction.set_rollback(True)
+        invalidar_indice()
+
+    def _buscar_like(self, termino):
+        return set(PartidaArancelaria.objects.filter(
+            Q(codigo__icontains=termino) | Q(descripcion__icontains=termino)
+        ).values_list('id', flat=True))
+
+    def _insertar_catalogo(self, filas):
+        rnd = random.Random(42)
+        lote = []
+        for i in range(filas):
+            capitulo = (i % 97) + 1
+            codigo = f"{capitulo:02d}{rnd.randint(1, 99):02d}.{rnd.randint(0, 99):02d}.{i % 100:02d}.{rnd.randint(0, 99):02d}"
+            descripcion = ' '.join(rnd.choice(PALABRAS) for _ in range(rnd.randint(3, 10))).capitalize()
+            partida = PartidaArancelaria(capitulo=f"Capitulo {capitulo}", codigo=codigo, descripcion=descripcion)
+            partida.normalizar()
+            lote.append(partida)
+            if len(lote) >= 2000:
+                PartidaArancelaria.objects.bulk_create(lote)
+                lote = []
+        if lote:
+            PartidaArancelaria.objects.bulk_create(lote)
@@ -0,0 +1,26 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from partidas.correo import procesar_pendientes
+
+
+class Command(BaseCommand):
+    help = ('Envía los correos encolados (CorreoSaliente) en lotes sobre una sola conexión SMTP, con reintentos '
+            'y espera exponencial. Sin --continuo procesa lo pendiente y termina (para cron); con --continuo '
+            'queda como worker.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--lote', type=int, default=None, help='Correos por conexión (CORREO_LOTE).')
+        parser.add_argument('--continuo', action='store_true', help='Sigue revisando la bandeja de salida.')
+        parser.add_argument('--intervalo', type=float, default=5, help='Segundos entre revisiones con --continuo.')
+
+    def handle(self, *args, **options):
+        while True:
+            enviados, fallidos = procesar_pendientes(options['lote'])
+            if enviados or fallidos or not options['continuo']:
+                estilo = self.style.WARNING if fallidos else self.style.SUCCESS
+                self.stdout.write(estilo(f'{enviados} correos enviados, {fallidos} fallidos.'))
+            if not options['continuo']:
+                return
+            time.sleep(options['intervalo'])
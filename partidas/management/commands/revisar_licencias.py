@@ -0,0 +1,29 @@
+from datetime import datetime
+
+from django.core.management.base import BaseCommand, CommandError
+
+from partidas.licencias import avisar_vencimientos, vencer_licencias
+
+
+class Command(BaseCommand):
+    help = ('Desactiva las licencias vencidas, actualiza Usuario.estado_licencia y encola los avisos de '
+            'vencimiento próximo (LICENCIA_AVISO_DIAS). Pensado para ejecutarse cada noche desde cron o el '
+            'planificador del hosting.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--fecha', help='Día de referencia (YYYY-MM-DD). Por defecto, hoy.')
+        parser.add_argument('--sin-avisos', action='store_true', help='No encola los avisos de vencimiento.')
+
+    def handle(self, *args, **options):
+        hoy = None
+        if options['fecha']:
+            try:
+                hoy = datetime.strptime(options['fecha'], '%Y-%m-%d').date()
+            except ValueError:
+                raise CommandError('--fecha debe tener el formato YYYY-MM-DD')
+
+        total, activados, desactivados = vencer_licencias(hoy)
+        self.stdout.write(f'{total} licencias vencidas; usuarios activados: {activados}, desactivados: {desactivados}.')
+        if not options['sin_avisos']:
+            encolados = avisar_vencimientos(hoy)
+            self.stdout.write(self.style.SUCCESS(f'Avisos de vencimiento encolados: {encolados}.'))
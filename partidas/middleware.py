@@ -1,11 +1,13 @@
 from django.shortcuts import redirect
-from datetime import date
+
+from .principal import Principal
 
 class VerificarLicenciaMiddleware:
     def __init__(self, get_response):
         self.get_response = get_response
 
     def __call__(self, request):
+        request.principal = Principal(request)
 
         path = (request.path or '').lower()
         whitelist_prefixes = (
@@ -26,8 +28,7 @@ class VerificarLicenciaMiddleware:
             if request.user.is_superuser:
                 return self.get_response(request)
 
-            licencia = request.user.licenciatemporal_set.order_by('-fecha_fin').first()
-            if not licencia or licencia.fecha_fin < date.today() or not licencia.estado:
+            if not request.principal.vigente:
                 return redirect('licencia_expirada')
 
         return self.get_response(request)
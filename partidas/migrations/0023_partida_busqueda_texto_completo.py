@@ -0,0 +1,82 @@
+from django.db import migrations
+
+# SQL copiado en la migración (no se importa de partidas.search_backends) para que no cambie con el código.
+# El código se indexa sin puntos, espacios, guiones ni barras.
+SQLITE_INSTALAR = [
+    "CREATE VIRTUAL TABLE IF NOT EXISTS partidas_partida_fts USING fts5("
+    "codigo, descripcion, tokenize = 'unicode61 remove_diacritics 2')",
+    "CREATE TRIGGER IF NOT EXISTS partidas_partida_fts_ai AFTER INSERT ON partidas_partidaarancelaria BEGIN "
+    "INSERT INTO partidas_partida_fts(rowid, codigo, descripcion) VALUES (new.id, "
+    "replace(replace(replace(replace(lower(new.codigo), '.', ''), ' ', ''), '-', ''), '/', ''), new.descripcion); END",
+    "CREATE TRIGGER IF NOT EXISTS partidas_partida_fts_ad AFTER DELETE ON partidas_partidaarancelaria BEGIN "
+    "DELETE FROM partidas_partida_fts WHERE rowid = old.id; END",
+    "CREATE TRIGGER IF NOT EXISTS partidas_partida_fts_au AFTER UPDATE OF codigo, descripcion ON partidas_partidaarancelaria BEGIN "
+    "DELETE FROM partidas_partida_fts WHERE rowid = old.id; "
+    "INSERT INTO partidas_partida_fts(rowid, codigo, descripcion) VALUES (new.id, "
+    "replace(replace(replace(replace(lower(new.codigo), '.', ''), ' ', ''), '-', ''), '/', ''), new.descripcion); END",
+    "DELETE FROM partidas_partida_fts",
+    "INSERT INTO partidas_partida_fts(rowid, codigo, descripcion) "
+    "SELECT p.id, replace(replace(replace(replace(lower(p.codigo), '.', ''), ' ', ''), '-', ''), '/', ''), p.descripcion "
+    "FROM partidas_partidaarancelaria p",
+]
+
+SQLITE_ELIMINAR = [
+    "DROP TRIGGER IF EXISTS partidas_partida_fts_ai",
+    "DROP TRIGGER IF EXISTS partidas_partida_fts_ad",
+    "DROP TRIGGER IF EXISTS partidas_partida_fts_au",
+    "DROP TABLE IF EXISTS partidas_partida_fts",
+]
+
+POSTGRES_INSTALAR = [
+    "CREATE EXTENSION IF NOT EXISTS unaccent",
+    "ALTER TABLE partidas_partidaarancelaria ADD COLUMN IF NOT EXISTS search_vector tsvector",
+    """
+    CREATE OR REPLACE FUNCTION partidas_partida_search_vector() RETURNS trigger AS $$
+    BEGIN
+        NEW.search_vector :=
+            setweight(to_tsvector('simple', regexp_replace(lower(coalesce(NEW.codigo, '')), '[^0-9a-z]', '', 'g')), 'A') ||
+            setweight(to_tsvector('simple', unaccent(coalesce(NEW.descripcion, ''))), 'B');
+        RETURN NEW;
+    END
+    $$ LANGUAGE plpgsql
+    """,
+    "DROP TRIGGER IF EXISTS partidas_partida_search_vector_trg ON partidas_partidaarancelaria",
+    "CREATE TRIGGER partidas_partida_search_vector_trg BEFORE INSERT OR UPDATE OF codigo, descripcion "
+    "ON partidas_partidaarancelaria FOR EACH ROW EXECUTE FUNCTION partidas_partida_search_vector()",
+    "UPDATE partidas_partidaarancelaria SET codigo = codigo",
+    "CREATE INDEX IF NOT EXISTS partidas_partida_search_vector_gin ON partidas_partidaarancelaria USING GIN (search_vector)",
+]
+
+POSTGRES_ELIMINAR = [
+    "DROP INDEX IF EXISTS partidas_partida_search_vector_gin",
+    "DROP TRIGGER IF EXISTS partidas_partida_search_vector_trg ON partidas_partidaarancelaria",
+    "DROP FUNCTION IF EXISTS partidas_partida_search_vector()",
+    "ALTER TABLE partidas_partidaarancelaria DROP COLUMN IF EXISTS search_vector",
+]
+
+
+def _ejecutar(schema_editor, sqlite, postgres):
+    vendor = schema_editor.connection.vendor
+    for sql in sqlite if vendor == 'sqlite' else postgres if vendor == 'postgresql' else []:
+        schema_editor.execute(sql)
+
+
+def instalar(apps, schema_editor):
+    _ejecutar(schema_editor, SQLITE_INSTALAR, POSTGRES_INSTALAR)
+
+
+def eliminar(apps, schema_editor):
+    _ejecutar(schema_editor, SQLITE_ELIMINAR, POSTGRES_ELIMINAR)
+
+
+class Migration(migrations.Migration):
+    """Tabla FTS5 (SQLite) o columna tsvector + GIN (PostgreSQL) para la búsqueda de partidas,
+    mantenidas por triggers en la base de datos."""
+
+    dependencies = [
+        ('partidas', '0022_alter_importlog_importadas_and_more'),
+    ]
+
+    operations = [
+        migrations.RunPython(instalar, eliminar),
+    ]
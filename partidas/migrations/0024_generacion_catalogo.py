@@ -0,0 +1,22 @@
+# Generated by Django 5.2.4 on 2026-10-18 09:02
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('partidas', '0023_partida_busqueda_texto_completo'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='GeneracionCatalogo',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('capitulo', models.CharField(max_length=200, unique=True)),
+                ('generacion', models.PositiveBigIntegerField(default=0)),
+                ('actualizado_en', models.DateTimeField(auto_now=True)),
+            ],
+        ),
+    ]
@@ -0,0 +1,86 @@
+import re
+import unicodedata
+
+from django.db import migrations, models
+
+
+# copias de partidas.search_index al momento de la migración (no se importan para que no cambien con el código)
+def normalizar_texto(s):
+    s = str(s or '')
+    s = ''.join(c for c in unicodedata.normalize('NFKD', s) if not unicodedata.combining(c))
+    s = re.sub(r'[^0-9a-z]+', ' ', s.lower())
+    return ' '.join(s.split())
+
+
+def solo_digitos(s):
+    return re.sub(r'\D', '', str(s or ''))
+
+
+# triggers de FTS5 de la migración 0023
+SQLITE_TRIGGERS_FTS = [
+    "CREATE TRIGGER IF NOT EXISTS partidas_partida_fts_ai AFTER INSERT ON partidas_partidaarancelaria BEGIN "
+    "INSERT INTO partidas_partida_fts(rowid, codigo, descripcion) VALUES (new.id, "
+    "replace(replace(replace(replace(lower(new.codigo), '.', ''), ' ', ''), '-', ''), '/', ''), new.descripcion); END",
+    "CREATE TRIGGER IF NOT EXISTS partidas_partida_fts_ad AFTER DELETE ON partidas_partidaarancelaria BEGIN "
+    "DELETE FROM partidas_partida_fts WHERE rowid = old.id; END",
+    "CREATE TRIGGER IF NOT EXISTS partidas_partida_fts_au AFTER UPDATE OF codigo, descripcion ON partidas_partidaarancelaria BEGIN "
+    "DELETE FROM partidas_partida_fts WHERE rowid = old.id; "
+    "INSERT INTO partidas_partida_fts(rowid, codigo, descripcion) VALUES (new.id, "
+    "replace(replace(replace(replace(lower(new.codigo), '.', ''), ' ', ''), '-', ''), '/', ''), new.descripcion); END",
+]
+
+
+def completar_columnas(apps, schema_editor):
+    PartidaArancelaria = apps.get_model('partidas', 'PartidaArancelaria')
+    lote = []
+    for p in PartidaArancelaria.objects.only('id', 'codigo', 'descripcion').iterator(chunk_size=2000):
+        p.descripcion_norm = normalizar_texto(p.descripcion)
+        p.codigo_norm = solo_digitos(p.codigo)[:50]
+        lote.append(p)
+        if len(lote) >= 2000:
+            PartidaArancelaria.objects.bulk_update(lote, ['descripcion_norm', 'codigo_norm'])
+            lote = []
+    if lote:
+        PartidaArancelaria.objects.bulk_update(lote, ['descripcion_norm', 'codigo_norm'])
+
+
+def crear_indices_busqueda(apps, schema_editor):
+    # SQLite reconstruye la tabla al agregar columnas y se pierden los triggers de FTS5
+    if schema_editor.connection.vendor == 'sqlite':
+        for sql in SQLITE_TRIGGERS_FTS:
+            schema_editor.execute(sql)
+    if schema_editor.connection.vendor == 'postgresql':
+        schema_editor.execute("CREATE EXTENSION IF NOT EXISTS pg_trgm")
+        schema_editor.execute(
+            "CREATE INDEX IF NOT EXISTS partidas_partida_descripcion_norm_trgm "
+            "ON partidas_partidaarancelaria USING GIN (descripcion_norm gin_trgm_ops)"
+        )
+
+
+def eliminar_indices_busqueda(apps, schema_editor):
+    if schema_editor.connection.vendor == 'postgresql':
+        schema_editor.execute("DROP INDEX IF EXISTS partidas_partida_descripcion_norm_trgm")
+
+
+class Migration(migrations.Migration):
+    """Columnas normalizadas (sin acentos ni mayúsculas; código solo con dígitos) para comparar
+    la consulta normalizada con índices: B-tree en `codigo_norm` y trigramas en `descripcion_norm` (PostgreSQL)."""
+
+    dependencies = [
+        ('partidas', '0024_generacion_catalogo'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='partidaarancelaria',
+            name='codigo_norm',
+            field=models.CharField(blank=True, db_index=True, default='', editable=False, max_length=50),
+        ),
+        migrations.AddField(
+            model_name='partidaarancelaria',
+            name='descripcion_norm',
+            field=models.TextField(blank=True, default='', editable=False),
+        ),
+        migrations.RunPython(completar_columnas, migrations.RunPython.noop),
+        migrations.RunPython(crear_indices_busqueda, eliminar_indices_busqueda),
+    ]
@@ -0,0 +1,35 @@
+# Generated by Django 5.2.4 on 2026-10-18 09:15
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('partidas', '0025_partida_columnas_normalizadas'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='MarcaAgregacion',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('nombre', models.CharField(max_length=100, unique=True)),
+                ('hasta', models.DateField(blank=True, null=True)),
+                ('actualizado_en', models.DateTimeField(auto_now=True)),
+            ],
+        ),
+        migrations.AlterModelOptions(
+            name='searchstatistic',
+            options={'verbose_name': 'Ranking de capítulos por periodo', 'verbose_name_plural': 'Ranking de capítulos por periodo'},
+        ),
+        migrations.AddField(
+            model_name='searchstatistic',
+            name='periodo',
+            field=models.CharField(choices=[('semana', 'Semanal'), ('mes', 'Mensual')], default='mes', max_length=10),
+        ),
+        migrations.AlterUniqueTogether(
+            name='searchstatistic',
+            unique_together={('periodo', 'periodo_inicio', 'capitulo')},
+        ),
+    ]
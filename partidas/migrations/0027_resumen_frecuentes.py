@@ -0,0 +1,22 @@
+# Generated by Django 5.2.4 on 2026-10-18 09:16
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('partidas', '0026_agregados_por_periodo'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ResumenFrecuentes',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('nombre', models.CharField(max_length=50, unique=True)),
+                ('datos', models.TextField(blank=True, default='')),
+                ('actualizado_en', models.DateTimeField(auto_now=True)),
+            ],
+        ),
+    ]
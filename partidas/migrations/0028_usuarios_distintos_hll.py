@@ -0,0 +1,18 @@
+# Generated by Django 5.2.4 on 2026-10-18 09:18
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('partidas', '0027_resumen_frecuentes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='searchstatisticdaily',
+            name='usuarios_hll',
+            field=models.BinaryField(blank=True, null=True),
+        ),
+    ]
@@ -0,0 +1,29 @@
+# Generated by Django 5.2.4 on 2026-10-18 09:24
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('partidas', '0028_usuarios_distintos_hll'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='busqueda',
+            name='fecha',
+            field=models.DateTimeField(default=django.utils.timezone.now, editable=False),
+        ),
+        migrations.AlterField(
+            model_name='chatmessage',
+            name='created_at',
+            field=models.DateTimeField(default=django.utils.timezone.now, editable=False),
+        ),
+        migrations.AlterField(
+            model_name='historiaactividad',
+            name='fecha_hora',
+            field=models.DateTimeField(default=django.utils.timezone.now, editable=False),
+        ),
+    ]
@@ -0,0 +1,39 @@
+# Generated by Django 5.2.4 on 2026-10-18 09:30
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('partidas', '0029_registros_fecha_evento'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='busqueda',
+            name='fecha',
+            field=models.DateTimeField(db_index=True, default=django.utils.timezone.now, editable=False),
+        ),
+        migrations.AlterField(
+            model_name='chatmessage',
+            name='created_at',
+            field=models.DateTimeField(db_index=True, default=django.utils.timezone.now, editable=False),
+        ),
+        migrations.AlterField(
+            model_name='clicklog',
+            name='fecha_hora',
+            field=models.DateTimeField(auto_now_add=True, db_index=True),
+        ),
+        migrations.AlterField(
+            model_name='historiaactividad',
+            name='fecha_hora',
+            field=models.DateTimeField(db_index=True, default=django.utils.timezone.now, editable=False),
+        ),
+        migrations.AlterField(
+            model_name='notificationlog',
+            name='fecha_hora',
+            field=models.DateTimeField(auto_now_add=True, db_index=True),
+        ),
+    ]
@@ -0,0 +1,28 @@
+# Generated by Django 5.2.4 on 2026-10-18 09:32
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('partidas', '0030_indices_fecha_registros'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='busqueda',
+            name='generacion_catalogo',
+            field=models.PositiveBigIntegerField(blank=True, editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name='busqueda',
+            name='ids_top',
+            field=models.BinaryField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='busqueda',
+            name='total_resultados',
+            field=models.PositiveIntegerField(blank=True, editable=False, null=True),
+        ),
+    ]
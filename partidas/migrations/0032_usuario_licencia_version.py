@@ -0,0 +1,18 @@
+# Generated by Django 5.2.4 on 2026-10-18 09:35
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('partidas', '0031_instantanea_busqueda'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='usuario',
+            name='licencia_version',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 5.2.4 on 2026-10-18 09:42
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('partidas', '0032_usuario_licencia_version'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='licenciatemporal',
+            index=models.Index(fields=['estado', 'fecha_fin'], name='partidas_li_estado_2d9a27_idx'),
+        ),
+    ]
@@ -0,0 +1,43 @@
+# Generated by Django 5.2.4 on 2026-10-18 09:44
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('partidas', '0033_indice_licencia_estado_fecha_fin'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CorreoSaliente',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('destinatario', models.CharField(max_length=254)),
+                ('remitente', models.CharField(blank=True, max_length=254)),
+                ('asunto', models.CharField(blank=True, max_length=255)),
+                ('cuerpo', models.TextField(blank=True)),
+                ('cuerpo_html', models.TextField(blank=True, null=True)),
+                ('registrar', models.BooleanField(default=False)),
+                ('estado', models.CharField(choices=[('pending', 'Pendiente'), ('sent', 'Enviado'), ('error', 'Error')], default='pending', max_length=20)),
+                ('intentos', models.PositiveSmallIntegerField(default=0)),
+                ('proximo_intento', models.DateTimeField(default=django.utils.timezone.now)),
+                ('error_message', models.TextField(blank=True, null=True)),
+                ('creado_en', models.DateTimeField(auto_now_add=True)),
+                ('enviado_en', models.DateTimeField(blank=True, null=True)),
+                ('enviado_por', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='correos_encolados', to=settings.AUTH_USER_MODEL)),
+                ('notificacion', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, to='partidas.notificationlog')),
+                ('solicitud', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, to='partidas.solicitudsoporte')),
+                ('usuario', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'verbose_name': 'Correo saliente',
+                'verbose_name_plural': 'Correos salientes',
+                'indexes': [models.Index(fields=['estado', 'proximo_intento'], name='partidas_co_estado_e0e6db_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,34 @@
+import json
+import math
+
+from django.conf import settings
+from django.db import migrations
+from django.db.models import Sum
+
+
+def sembrar(apps, schema_editor):
+    """Arma una sola vez los resúmenes Space-Saving a partir de los totales exactos (reemplaza los que
+    existan: el primer guardado anterior volvía a sumar lo pendiente de los procesos)."""
+    ResumenFrecuentes = apps.get_model('partidas', 'ResumenFrecuentes')
+    tablas = {
+        'productos': (apps.get_model('partidas', 'SearchStatisticProductTotal'), 'codigo'),
+        'capitulos': (apps.get_model('partidas', 'SearchStatisticTotal'), 'capitulo'),
+    }
+    k = max(int(math.ceil(1 / getattr(settings, 'SEARCH_TOPK_ERROR', 0.001))), 1)
+    for nombre, (modelo, campo) in tablas.items():
+        filas = modelo.objects.filter(total__gt=0).order_by('-total').values_list(campo, 'total')[:k]
+        total = modelo.objects.aggregate(suma=Sum('total'))['suma'] or 0
+        datos = json.dumps({'k': k, 'total': total, 'items': [[clave, n, 0] for clave, n in filas]},
+                           separators=(',', ':'))
+        ResumenFrecuentes.objects.update_or_create(nombre=nombre, defaults={'datos': datos})
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('partidas', '0034_correo_saliente'),
+    ]
+
+    operations = [
+        migrations.RunPython(sembrar, migrations.RunPython.noop),
+    ]
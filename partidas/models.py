@@ -1,6 +1,11 @@
+import struct
+
 from django.db import models
+from django.utils import timezone
 from django.contrib.auth.models import AbstractUser
 
+from .search_index import normalizar_texto, solo_digitos
+
 
 
 capitulo = models.CharField(max_length=100, blank=True, null=True)
@@ -17,6 +22,8 @@ class Usuario(AbstractUser):
     rol = models.ForeignKey(Rol, on_delete=models.SET_NULL, null=True)
     estado_licencia = models.BooleanField(default=True)
     fecha_registro = models.DateTimeField(auto_now_add=True)
+    # se incrementa con cada cambio en sus licencias; invalida el veredicto guardado en la sesión
+    licencia_version = models.PositiveIntegerField(default=0, editable=False)
 
 class LicenciaTemporal(models.Model):
     usuario = models.ForeignKey(Usuario, on_delete=models.CASCADE)
@@ -26,6 +33,10 @@ class LicenciaTemporal(models.Model):
 
     notified_pre_expiry = models.BooleanField(default=False)
 
+    class Meta:
+        # revisión nocturna: licencias activas vencidas o por vencer
+        indexes = [models.Index(fields=['estado', 'fecha_fin'])]
+
 class PartidaArancelaria(models.Model):
     capitulo = models.CharField(max_length=200, default="Sin datos")
     partida = models.CharField(max_length=10, default="Sin datos")
@@ -48,21 +59,65 @@ class PartidaArancelaria(models.Model):
 
     updated_at = models.DateTimeField(auto_now=True, null=True, blank=True)
 
+    # copias normalizadas para búsqueda: sin acentos ni mayúsculas, y código solo con dígitos
+    descripcion_norm = models.TextField(default='', blank=True, editable=False)
+    codigo_norm = models.CharField(max_length=50, default='', blank=True, editable=False, db_index=True)
+
     def __str__(self):
         return f"{self.codigo} - {self.descripcion}"
 
+    def normalizar(self):
+        """Recalcula `descripcion_norm` y `codigo_norm`; usar antes de `bulk_create`/`bulk_update`."""
+        self.descripcion_norm = normalizar_texto(self.descripcion)
+        self.codigo_norm = solo_digitos(self.codigo)[:50]
+
+    def save(self, *args, **kwargs):
+        self.normalizar()
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None:
+            kwargs['update_fields'] = set(update_fields) | {'descripcion_norm', 'codigo_norm'}
+        super().save(*args, **kwargs)
+
+class GeneracionCatalogo(models.Model):
+    """Generación del catálogo de partidas: fila con capitulo='' (global) y una por capítulo."""
+    capitulo = models.CharField(max_length=200, unique=True)
+    generacion = models.PositiveBigIntegerField(default=0)
+    actualizado_en = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"{self.capitulo or 'catálogo'} — {self.generacion}"
+
 class Busqueda(models.Model):
     usuario = models.ForeignKey(Usuario, on_delete=models.CASCADE)
     termino_buscado = models.CharField(max_length=100)
     tipo_busqueda = models.CharField(max_length=50)
-    fecha = models.DateTimeField(auto_now_add=True)
+    # fecha de la búsqueda, no de la inserción (se guardan en lote desde bitacora.py)
+    fecha = models.DateTimeField(default=timezone.now, editable=False, db_index=True)
 
     resultados = models.TextField(blank=True, default='')
+    # instantánea de la búsqueda: total de resultados, ids de las primeras partidas del ranking
+    # (enteros de 8 bytes empaquetados) y generación del catálogo; el historial no repite la búsqueda
+    total_resultados = models.PositiveIntegerField(null=True, blank=True, editable=False)
+    ids_top = models.BinaryField(null=True, blank=True, editable=False)
+    generacion_catalogo = models.PositiveBigIntegerField(null=True, blank=True, editable=False)
+
+    @staticmethod
+    def empaquetar_ids(ids):
+        ids = list(ids)
+        return struct.pack(f'<{len(ids)}q', *ids)
+
+    @property
+    def ids_resultados(self):
+        """Ids de las primeras partidas encontradas, en el orden del ranking (None si no hay instantánea)."""
+        if self.ids_top is None:
+            return None
+        datos = bytes(self.ids_top)
+        return list(struct.unpack(f'<{len(datos) // 8}q', datos))
 
 class HistoriaActividad(models.Model):
     usuario = models.ForeignKey(Usuario, on_delete=models.CASCADE)
     accion = models.TextField()
-    fecha_hora = models.DateTimeField(auto_now_add=True)
+    fecha_hora = models.DateTimeField(default=timezone.now, editable=False, db_index=True)
 
 class SolicitudSoporte(models.Model):
     """Registro de solicitudes enviadas por usuarios al equipo de soporte."""
@@ -100,26 +155,54 @@ class InterfazSistema(models.Model):
 
 
 class SearchStatistic(models.Model):
-    """Estadísticas agregadas por capítulo para un periodo dado."""
+    """Estadísticas agregadas por capítulo para un periodo dado (semana o mes)."""
+    PERIODO_CHOICES = (
+        ('semana', 'Semanal'),
+        ('mes', 'Mensual'),
+    )
     capitulo = models.CharField(max_length=100)
     count = models.PositiveIntegerField(default=0)
+    periodo = models.CharField(max_length=10, choices=PERIODO_CHOICES, default='mes')
     periodo_inicio = models.DateField(null=True, blank=True)
     periodo_fin = models.DateField(null=True, blank=True)
     generado_en = models.DateTimeField(auto_now_add=True)
 
     class Meta:
-        verbose_name = 'Ranking de productos buscados'
-        verbose_name_plural = 'Ranking de productos buscados'
+        unique_together = ('periodo', 'periodo_inicio', 'capitulo')
+        verbose_name = 'Ranking de capítulos por periodo'
+        verbose_name_plural = 'Ranking de capítulos por periodo'
 
     def __str__(self):
         return f"{self.capitulo} — {self.count}"
 
 
+class MarcaAgregacion(models.Model):
+    """Último día ya acumulado por un proceso de agregación incremental (p. ej. los rankings por periodo)."""
+    nombre = models.CharField(max_length=100, unique=True)
+    hasta = models.DateField(null=True, blank=True)
+    actualizado_en = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"{self.nombre} hasta {self.hasta or '—'}"
+
+
+class ResumenFrecuentes(models.Model):
+    """Resumen Space-Saving serializado (JSON) de los productos o capítulos más buscados."""
+    nombre = models.CharField(max_length=50, unique=True)
+    datos = models.TextField(blank=True, default='')
+    actualizado_en = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return self.nombre
+
+
 class SearchStatisticDaily(models.Model):
     """Contador diario por capítulo para registrar búsquedas en tiempo real."""
     capitulo = models.CharField(max_length=100)
     fecha = models.DateField()
     count = models.PositiveIntegerField(default=0)
+    # sketch HyperLogLog (hll.py) de los usuarios que buscaron en el capítulo ese día
+    usuarios_hll = models.BinaryField(null=True, blank=True, editable=False)
 
     class Meta:
         unique_together = ('capitulo', 'fecha')
@@ -178,7 +261,7 @@ class ClickLog(models.Model):
     partida = models.ForeignKey(PartidaArancelaria, on_delete=models.SET_NULL, null=True, blank=True)
     accion = models.CharField(max_length=100, default='click')
     extra = models.TextField(blank=True, null=True)
-    fecha_hora = models.DateTimeField(auto_now_add=True)
+    fecha_hora = models.DateTimeField(auto_now_add=True, db_index=True)
 
     def __str__(self):
         user = self.usuario.username if self.usuario else 'Anónimo'
@@ -208,7 +291,7 @@ class ChatMessage(models.Model):
     mensaje = models.TextField()
     respuesta = models.TextField(blank=True, null=True)
     publico = models.BooleanField(default=False)
-    created_at = models.DateTimeField(auto_now_add=True)
+    created_at = models.DateTimeField(default=timezone.now, editable=False, db_index=True)
 
     def __str__(self):
         user = self.usuario.username if self.usuario else 'Anónimo'
@@ -224,7 +307,7 @@ class NotificationLog(models.Model):
     enviado_por = models.ForeignKey(Usuario, related_name='notificaciones_enviadas', on_delete=models.SET_NULL, null=True, blank=True)
     success = models.BooleanField(default=False)
     error_message = models.TextField(blank=True, null=True)
-    fecha_hora = models.DateTimeField(auto_now_add=True)
+    fecha_hora = models.DateTimeField(auto_now_add=True, db_index=True)
 
     def __str__(self):
         to_addr = self.destinatario_email or (self.destinatario.username if self.destinatario else 'N/A')
@@ -232,6 +315,42 @@ class NotificationLog(models.Model):
         return f"{self.fecha_hora} | {to_addr} | {status}"
 
 
+
+class CorreoSaliente(models.Model):
+    """Correo pendiente de envío (bandeja de salida); lo envía `manage.py enviar_correos` (partidas/correo.py)."""
+    ESTADO_CHOICES = (
+        ('pending', 'Pendiente'),
+        ('sent', 'Enviado'),
+        ('error', 'Error'),
+    )
+
+    destinatario = models.CharField(max_length=254)
+    remitente = models.CharField(max_length=254, blank=True)
+    asunto = models.CharField(max_length=255, blank=True)
+    cuerpo = models.TextField(blank=True)
+    cuerpo_html = models.TextField(blank=True, null=True)
+    # a quién se notifica y quién lo pidió; con `registrar` el resultado se guarda en NotificationLog
+    usuario = models.ForeignKey(Usuario, on_delete=models.SET_NULL, null=True, blank=True)
+    enviado_por = models.ForeignKey(Usuario, related_name='correos_encolados', on_delete=models.SET_NULL, null=True, blank=True)
+    registrar = models.BooleanField(default=False)
+    # registro a actualizar con el resultado (reintentos del admin y solicitudes de soporte)
+    notificacion = models.ForeignKey(NotificationLog, on_delete=models.SET_NULL, null=True, blank=True)
+    solicitud = models.ForeignKey(SolicitudSoporte, on_delete=models.SET_NULL, null=True, blank=True)
+    estado = models.CharField(max_length=20, choices=ESTADO_CHOICES, default='pending')
+    intentos = models.PositiveSmallIntegerField(default=0)
+    proximo_intento = models.DateTimeField(default=timezone.now)
+    error_message = models.TextField(blank=True, null=True)
+    creado_en = models.DateTimeField(auto_now_add=True)
+    enviado_en = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        indexes = [models.Index(fields=['estado', 'proximo_intento'])]
+        verbose_name = 'Correo saliente'
+        verbose_name_plural = 'Correos salientes'
+
+    def __str__(self):
+        return f"{self.creado_en} | {self.destinatario} | {self.asunto} ({self.estado})"
+
 class ImportLog(models.Model):
     """Registro de importaciones realizadas (por ejemplo desde Excel)."""
     usuario = models.ForeignKey(Usuario, on_delete=models.SET_NULL, null=True, blank=True)
@@ -0,0 +1,125 @@
+"""Paginación por cursor (keyset) para listados de partidas.
+
+En lugar de OFFSET, cada página se pide "después de" o "antes de" la clave de
+orden del último/primer elemento visible. La clave tiene que ser única y
+estable (por ejemplo `(codigo, id)` o `(-puntuación, id)`), así el costo de
+una página no depende de cuántas filas hay antes y no se repiten ni saltan
+filas entre páginas.
+
+Los cursores viajan en la URL como `?despues=<token>` / `?antes=<token>`.
+"""
+import base64
+import bisect
+import json
+
+from django.conf import settings
+from django.db.models import Q
+
+
+def tamano_pagina(request):
+    """Tamaño de página pedido en `?por_pagina=`, acotado a `SEARCH_PAGE_SIZE_MAX`."""
+    por_defecto = getattr(settings, 'SEARCH_PAGE_SIZE', 25)
+    maximo = getattr(settings, 'SEARCH_PAGE_SIZE_MAX', 100)
+    try:
+        n = int(request.GET.get('por_pagina') or por_defecto)
+    except (TypeError, ValueError):
+        n = por_defecto
+    return max(1, min(n, maximo))
+
+
+def codificar_cursor(valores):
+    data = json.dumps(list(valores), separators=(',', ':')).encode('utf-8')
+    return base64.urlsafe_b64encode(data).decode('ascii').rstrip('=')
+
+
+def decodificar_cursor(token):
+    """Devuelve la lista de valores del cursor o None si el token no es válido."""
+    if not token:
+        return None
+    try:
+        data = base64.urlsafe_b64decode(token + '=' * (-len(token) % 4))
+        valores = json.loads(data.decode('utf-8'))
+    except Exception:
+        return None
+    return valores if isinstance(valores, list) else None
+
+
+def leer_cursor(request):
+    """Devuelve (direccion, valores) con direccion 'despues' o 'antes', o (None, None)."""
+    for direccion in ('despues', 'antes'):
+        valores = decodificar_cursor(request.GET.get(direccion))
+        if valores is not None:
+            return direccion, valores
+    return None, None
+
+
+def url_con_cursor(request, direccion, cursor):
+    """Query string con los mismos parámetros de la petición y el cursor indicado."""
+    if not cursor:
+        return None
+    params = request.GET.copy()
+    params.pop('despues', None)
+    params.pop('antes', None)
+    params[direccion] = cursor
+    return '?' + params.urlencode()
+
+
+def _q_comparacion(campos, valores, op):
+    """(c0, c1, ...) > (v0, v1, ...) expresado con Q: c0 > v0 OR (c0 = v0 AND c1 > v1) ..."""
+    condicion = Q()
+    iguales = {}
+    for campo, valor in zip(campos, valores):
+        condicion |= Q(**iguales, **{f'{campo}__{op}': valor})
+        iguales[campo] = valor
+    return condicion
+
+
+def _resultado(items, clave, direccion, hay_mas):
+    if direccion == 'antes':
+        items.reverse()
+        hay_anterior, hay_siguiente = hay_mas, True
+    else:
+        hay_anterior, hay_siguiente = direccion == 'despues', hay_mas
+    siguiente = codificar_cursor(clave(items[-1])) if items and hay_siguiente else None
+    anterior = codificar_cursor(clave(items[0])) if items and hay_anterior else None
+    return items, siguiente, anterior
+
+
+def paginar_queryset(qs, campos, direccion, valores, tamano):
+    """Página de `qs` ordenado ascendentemente por `campos` (el último debe ser único, p. ej. 'id').
+    Devuelve (objetos, cursor_siguiente, cursor_anterior).
+    """
+    if valores is not None and len(valores) != len(campos):
+        direccion = None
+    if direccion == 'despues':
+        qs = qs.filter(_q_comparacion(campos, valores, 'gt')).order_by(*campos)
+    elif direccion == 'antes':
+        qs = qs.filter(_q_comparacion(campos, valores, 'lt')).order_by(*[f'-{c}' for c in campos])
+    else:
+        qs = qs.order_by(*campos)
+    items = list(qs[:tamano + 1])
+    hay_mas = len(items) > tamano
+    return _resultado(items[:tamano], lambda obj: [getattr(obj, c) for c in campos], direccion, hay_mas)
+
+
+def paginar_ordenados(n, clave, direccion, valores, tamano):
+    """Igual que `paginar_queryset` pero sobre una secuencia en memoria de `n` elementos ya ordenada por
+    `clave(posición)` (tupla única): la página se ubica con búsqueda binaria, O(log n + tamaño).
+    Devuelve (posiciones, cursor_siguiente, cursor_anterior).
+    """
+    limite = tuple(valores) if valores is not None else None
+    try:
+        if direccion == 'despues':
+            inicio = bisect.bisect_right(range(n), limite, key=clave)
+            posiciones = list(range(inicio, min(inicio + tamano + 1, n)))
+        elif direccion == 'antes':
+            fin = bisect.bisect_left(range(n), limite, key=clave)
+            posiciones = list(range(fin - 1, max(fin - tamano - 2, -1), -1))
+        else:
+            posiciones = list(range(min(tamano + 1, n)))
+    except TypeError:
+        # cursor manipulado o de otro listado: volver a la primera página
+        direccion = None
+        posiciones = list(range(min(tamano + 1, n)))
+    hay_mas = len(posiciones) > tamano
+    return _resultado(posiciones[:tamano], lambda i: list(clave(i)), direccion, hay_mas)
@@ -0,0 +1,81 @@
+"""Principal de la petición: el usuario (con su rol) y su licencia, cargados una sola vez por petición.
+
+`VerificarLicenciaMiddleware` lo deja en `request.principal`; el decorador `rol_requerido`, el context
+processor `license_info` y las vistas lo reutilizan con `get_principal(request)` en vez de volver a
+consultar. El rol llega con el usuario (`UsuarioBackend` lo carga con select_related) y las licencias se
+consultan a lo sumo una vez, solo si el veredicto guardado en la sesión no alcanza.
+"""
+from datetime import date
+from functools import cached_property
+
+
+# clave de sesión con el último veredicto de licencia del usuario
+SESION_LICENCIA = '_licencia_veredicto'
+
+
+class Principal:
+    def __init__(self, request):
+        self.request = request
+        self.usuario = request.user
+
+    def tiene_rol(self, nombre_rol):
+        usuario = self.usuario
+        return usuario.is_superuser or (usuario.rol is not None and usuario.rol.nombre == nombre_rol)
+
+    @cached_property
+    def licencias(self):
+        """Licencias del usuario, de la más reciente a la más antigua (una sola consulta)."""
+        if not self.usuario.is_authenticated:
+            return []
+        return list(self.usuario.licenciatemporal_set.order_by('-fecha_fin'))
+
+    @property
+    def licencia(self):
+        return self.licencias[0] if self.licencias else None
+
+    @property
+    def licencia_activa(self):
+        """La licencia con estado activo de fecha_fin más reciente (la que muestran las plantillas)."""
+        return next((licencia for licencia in self.licencias if licencia.estado), None)
+
+    @cached_property
+    def vigente(self):
+        """Indica si la licencia está vigente, consultándola solo cuando el veredicto guardado en la sesión
+        es de otro usuario, de otra versión de sus licencias (`Usuario.licencia_version`, que incrementa la
+        señal de LicenciaTemporal) o ya pasó su `fecha_fin`.
+        """
+        usuario = self.usuario
+        if not usuario.is_authenticated:
+            return False
+        hoy = date.today()
+        veredicto = self.request.session.get(SESION_LICENCIA)
+        if (not veredicto or veredicto.get('usuario') != usuario.pk
+                or veredicto.get('version') != usuario.licencia_version
+                or (veredicto.get('hasta') and veredicto['hasta'] < hoy.isoformat())):
+            licencia = self.licencia
+            vigente = bool(licencia and licencia.fecha_fin >= hoy and licencia.estado)
+            veredicto = {
+                'usuario': usuario.pk,
+                'version': usuario.licencia_version,
+                'vigente': vigente,
+                'hasta': licencia.fecha_fin.isoformat() if vigente else None,
+            }
+            self.request.session[SESION_LICENCIA] = veredicto
+        self._hasta = veredicto['hasta']
+        return veredicto['vigente']
+
+    @property
+    def fecha_fin_activa(self):
+        """fecha_fin de `licencia_activa`; si la licencia está vigente sale del veredicto, sin consultar."""
+        if self.vigente:
+            return date.fromisoformat(self._hasta)
+        activa = self.licencia_activa
+        return activa.fecha_fin if activa else None
+
+
+def get_principal(request):
+    principal = getattr(request, 'principal', None)
+    # login()/logout() reemplazan request.user durante la petición
+    if principal is None or principal.usuario is not request.user:
+        principal = request.principal = Principal(request)
+    return principal
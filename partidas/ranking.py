@@ -0,0 +1,145 @@
+"""Ranking de relevancia BM25 para la búsqueda de partidas.
+
+Mantiene en memoria las estadísticas de términos (frecuencia por campo,
+frecuencia de documento y longitud de cada campo) sobre `codigo`,
+`descripcion` y `capitulo`, y ordena los candidatos que devuelve el backend de
+búsqueda con BM25 sumando cada campo con su peso (`SEARCH_FIELD_BOOSTS`).
+"""
+import heapq
+import math
+from bisect import bisect_left
+
+from django.conf import settings
+
+from .search_index import _IndiceProceso, normalizar_codigo, tokenizar
+
+
+CAMPOS_RANKING = ('codigo', 'descripcion', 'capitulo')
+
+BOOSTS_POR_DEFECTO = {'codigo': 3.0, 'descripcion': 1.0, 'capitulo': 0.3}
+
+# una palabra que solo coincide por prefijo ("caball" -> "caballos") pesa menos que la palabra completa
+FACTOR_PREFIJO = 0.7
+
+
+def get_boosts():
+    boosts = dict(BOOSTS_POR_DEFECTO)
+    boosts.update(getattr(settings, 'SEARCH_FIELD_BOOSTS', {}) or {})
+    return boosts
+
+
+def _tokens_campo(campo, valor):
+    if campo == 'codigo':
+        cod = normalizar_codigo(valor)
+        return [cod] if cod else []
+    return tokenizar(valor)
+
+
+def _tokens_consulta(termino):
+    tokens = tokenizar(termino)
+    codigo = {normalizar_codigo(termino)} | {t for t in tokens if t.isdigit()}
+    codigo.discard('')
+    return {'codigo': sorted(codigo), 'descripcion': tokens, 'capitulo': tokens}
+
+
+class MotorBM25:
+    """Estadísticas de términos por campo y puntuación BM25 con pesos por campo."""
+
+    def __init__(self, k1=1.2, b=0.75):
+        self.k1 = k1
+        self.b = b
+        self.tf = {campo: {} for campo in CAMPOS_RANKING}
+        self.vocab = {campo: [] for campo in CAMPOS_RANKING}
+        self.longitudes = {campo: {} for campo in CAMPOS_RANKING}
+        self.longitud_media = {campo: 0.0 for campo in CAMPOS_RANKING}
+        self.df = {}
+        self.total = 0
+
+    def agregar(self, pk, codigo='', descripcion='', capitulo=''):
+        valores = {'codigo': codigo, 'descripcion': descripcion, 'capitulo': capitulo}
+        vistos = set()
+        for campo in CAMPOS_RANKING:
+            tokens = _tokens_campo(campo, valores[campo])
+            self.longitudes[campo][pk] = len(tokens)
+            postings = self.tf[campo]
+            for token in tokens:
+                frecuencias = postings.setdefault(token, {})
+                frecuencias[pk] = frecuencias.get(pk, 0) + 1
+            vistos.update(tokens)
+        for token in vistos:
+            self.df[token] = self.df.get(token, 0) + 1
+        self.total += 1
+
+    def finalizar(self):
+        for campo in CAMPOS_RANKING:
+            self.vocab[campo] = sorted(self.tf[campo])
+            longitudes = self.longitudes[campo]
+            self.longitud_media[campo] = (sum(longitudes.values()) / len(longitudes)) if longitudes else 0.0
+        return self
+
+    @classmethod
+    def desde_filas(cls, filas, **kwargs):
+        """Construye el motor a partir de tuplas (id, codigo, descripcion, capitulo)."""
+        motor = cls(**kwargs)
+        for pk, codigo, descripcion, capitulo in filas:
+            motor.agregar(pk, codigo, descripcion, capitulo)
+        return motor.finalizar()
+
+    def idf(self, token):
+        n = self.df.get(token, 0)
+        return math.log(1 + (self.total - n + 0.5) / (n + 0.5))
+
+    def _expandir(self, campo, token):
+        """Pares (término, factor) del vocabulario del campo que empiezan por `token`."""
+        vocab = self.vocab[campo]
+        i = bisect_left(vocab, token)
+        while i < len(vocab) and vocab[i].startswith(token):
+            yield vocab[i], (1.0 if vocab[i] == token else FACTOR_PREFIJO)
+            i += 1
+
+    def puntuar(self, termino, candidatos=None, boosts=None):
+        """Devuelve {id: puntuación} para los documentos (o solo los `candidatos`) que coinciden."""
+        boosts = boosts or get_boosts()
+        puntuaciones = {}
+        for campo, tokens in _tokens_consulta(termino).items():
+            boost = boosts.get(campo, 0)
+            if not boost:
+                continue
+            postings = self.tf[campo]
+            longitudes = self.longitudes[campo]
+            media = self.longitud_media[campo] or 1.0
+            for token in tokens:
+                for termino_vocab, factor in self._expandir(campo, token):
+                    peso = boost * factor * self.idf(termino_vocab)
+                    for pk, tf in postings[termino_vocab].items():
+                        if candidatos is not None and pk not in candidatos:
+                            continue
+                        norma = self.k1 * (1 - self.b + self.b * longitudes[pk] / media)
+                        puntuaciones[pk] = puntuaciones.get(pk, 0.0) + peso * tf * (self.k1 + 1) / (tf + norma)
+        return puntuaciones
+
+    def ordenar(self, termino, candidatos, k=None, boosts=None):
+        """Ids de `candidatos` de mayor a menor relevancia (desempate por id). Con `k`, solo los k primeros."""
+        candidatos = set(candidatos)
+        puntuaciones = self.puntuar(termino, candidatos, boosts)
+
+        def clave(pk):
+            return (-puntuaciones.get(pk, 0.0), pk)
+
+        if k is not None and k < len(candidatos):
+            return heapq.nsmallest(k, candidatos, key=clave)
+        return sorted(candidatos, key=clave)
+
+
+def construir_motor():
+    from .models import PartidaArancelaria
+    filas = PartidaArancelaria.objects.values_list('id', 'codigo', 'descripcion', 'capitulo').iterator()
+    return MotorBM25.desde_filas(filas)
+
+
+_motor = _IndiceProceso(construir_motor)
+
+
+def get_motor_ranking():
+    """Motor BM25 del proceso; se invalida junto con los índices de búsqueda."""
+    return _motor.get()
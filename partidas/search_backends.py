@@ -0,0 +1,196 @@
+"""Backends intercambiables para la búsqueda de partidas por término.
+
+Todas las vistas que filtran `PartidaArancelaria` por código o descripción
+usan `get_search_backend()` en lugar de `icontains`. El backend se elige con
+`SEARCH_BACKEND` (ruta con puntos, como `EMAIL_BACKEND`):
+
+  - `IndiceMemoriaBackend`: índice invertido en memoria de cada proceso (por defecto).
+  - `SQLiteFTS5Backend`: tabla virtual FTS5 mantenida por triggers.
+  - `PostgresFTSBackend`: columna tsvector con índice GIN mantenida por trigger.
+  - `ColumnasNormalizadasBackend`: LIKE sobre `descripcion_norm` / `codigo_norm`,
+    sin estructuras adicionales (cualquier base de datos).
+
+Los tres comparten la semántica: cada palabra de la descripción se compara
+como prefijo (sin acentos) y el código normalizado se compara como prefijo.
+"""
+from django.conf import settings
+from django.db import connection
+from django.db.models import Q, Value
+from django.db.models.expressions import RawSQL
+from django.utils.module_loading import import_string
+
+from .search_index import get_indice, normalizar_codigo, tokenizar
+
+
+CAMPOS = ('codigo', 'descripcion')
+
+FTS_TABLE = 'partidas_partida_fts'  # la crean las migraciones 0023 y 0025
+
+
+class BaseSearchBackend:
+    """Interfaz común. `campos` limita la búsqueda a 'codigo' y/o 'descripcion'."""
+    nombre = 'base'
+
+    def buscar(self, termino, campos=CAMPOS):
+        """Devuelve el conjunto de ids de partidas que coinciden con el término."""
+        raise NotImplementedError
+
+    def buscar_varios(self, terminos, campos=CAMPOS):
+        """Devuelve {termino: ids} para varios términos."""
+        return {termino: self.buscar(termino, campos) for termino in terminos}
+
+    def buscar_descripcion(self, termino):
+        return self.buscar(termino, campos=('descripcion',))
+
+    def buscar_codigo(self, termino):
+        return self.buscar(termino, campos=('codigo',))
+
+    def filtrar(self, qs, termino, campos=CAMPOS):
+        """Aplica el filtro por término a un queryset de PartidaArancelaria."""
+        return qs.filter(id__in=self.buscar(termino, campos=campos))
+
+
+def _buscar_varios(backend, terminos, campos):
+    """`buscar_varios` de los backends de base de datos: una sola consulta (UNION ALL de los filtros de cada
+    término, marcados con su posición)."""
+    from .models import PartidaArancelaria
+    terminos = list(terminos)
+    resultado = {termino: set() for termino in terminos}
+    consultas = []
+    for i, termino in enumerate(terminos):
+        qs = backend.filtrar(PartidaArancelaria.objects.order_by(), termino, campos)
+        if not qs.query.is_empty():
+            consultas.append(qs.annotate(n=Value(i)).values_list('n', 'id'))
+    if consultas:
+        for i, pk in consultas[0].union(*consultas[1:], all=True):
+            resultado[terminos[i]].add(pk)
+    return resultado
+
+
+class IndiceMemoriaBackend(BaseSearchBackend):
+    nombre = 'memoria'
+
+    def buscar(self, termino, campos=CAMPOS):
+        indice = get_indice()
+        ids = set()
+        if 'codigo' in campos:
+            ids |= indice.buscar_codigo(termino)
+        if 'descripcion' in campos:
+            ids |= indice.buscar_descripcion(termino)
+        return ids
+
+
+class ColumnasNormalizadasBackend(BaseSearchBackend):
+    """Compara la consulta normalizada con las columnas normalizadas de la partida.
+    El código usa el índice B-tree de `codigo_norm` (solo consultas numéricas).
+    """
+    nombre = 'columnas_normalizadas'
+
+    def condicion(self, termino, campos=CAMPOS):
+        """Q equivalente a la búsqueda, o None si el término no tiene nada que buscar."""
+        condicion = None
+        codigo = normalizar_codigo(termino)
+        if 'codigo' in campos and codigo.isdigit():
+            # prefijo como rango ('9' < ':') para que use el B-tree también en SQLite
+            condicion = Q(codigo_norm__gte=codigo, codigo_norm__lt=codigo + ':')
+        tokens = tokenizar(termino)
+        if 'descripcion' in campos and tokens:
+            descripcion = Q()
+            for t in tokens:
+                descripcion &= Q(descripcion_norm__startswith=t) | Q(descripcion_norm__contains=' ' + t)
+            condicion = descripcion if condicion is None else (condicion | descripcion)
+        return condicion
+
+    def buscar(self, termino, campos=CAMPOS):
+        from .models import PartidaArancelaria
+        return set(self.filtrar(PartidaArancelaria.objects.all(), termino, campos).values_list('id', flat=True))
+
+    def buscar_varios(self, terminos, campos=CAMPOS):
+        return _buscar_varios(self, terminos, campos)
+
+    def filtrar(self, qs, termino, campos=CAMPOS):
+        condicion = self.condicion(termino, campos)
+        return qs.none() if condicion is None else qs.filter(condicion)
+
+
+class _SQLSearchBackend(BaseSearchBackend):
+    """Backends que resuelven la búsqueda con una subconsulta SQL de ids."""
+
+    def sql_ids(self, termino, campos):
+        """Devuelve (sql, params) de una consulta que selecciona los ids coincidentes, o None."""
+        raise NotImplementedError
+
+    def buscar(self, termino, campos=CAMPOS):
+        consulta = self.sql_ids(termino, campos)
+        if consulta is None:
+            return set()
+        sql, params = consulta
+        with connection.cursor() as cursor:
+            cursor.execute(sql, params)
+            return {row[0] for row in cursor.fetchall()}
+
+    def buscar_varios(self, terminos, campos=CAMPOS):
+        return _buscar_varios(self, terminos, campos)
+
+    def filtrar(self, qs, termino, campos=CAMPOS):
+        consulta = self.sql_ids(termino, campos)
+        if consulta is None:
+            return qs.none()
+        return qs.filter(id__in=RawSQL(*consulta))
+
+
+class SQLiteFTS5Backend(_SQLSearchBackend):
+    nombre = 'sqlite_fts5'
+
+    def expresion_match(self, termino, campos=CAMPOS):
+        """Construye la expresión MATCH de FTS5. Los tokens solo contienen [0-9a-z]."""
+        partes = []
+        codigo = normalizar_codigo(termino)
+        if 'codigo' in campos and codigo:
+            partes.append(f'codigo : "{codigo}" *')
+        tokens = tokenizar(termino)
+        if 'descripcion' in campos and tokens:
+            partes.append('(' + ' AND '.join(f'descripcion : "{t}" *' for t in tokens) + ')')
+        return ' OR '.join(partes)
+
+    def sql_ids(self, termino, campos):
+        expresion = self.expresion_match(termino, campos)
+        if not expresion:
+            return None
+        return f"SELECT rowid FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH %s", [expresion]
+
+
+class PostgresFTSBackend(_SQLSearchBackend):
+    nombre = 'postgres_fts'
+
+    def expresion_tsquery(self, termino, campos=CAMPOS):
+        """Construye la expresión para `to_tsquery('simple', ...)` con pesos A (código) y B (descripción)."""
+        partes = []
+        codigo = normalizar_codigo(termino)
+        if 'codigo' in campos and codigo:
+            partes.append(f'{codigo}:*A')
+        tokens = tokenizar(termino)
+        if 'descripcion' in campos and tokens:
+            partes.append('(' + ' & '.join(f'{t}:*B' for t in tokens) + ')')
+        return ' | '.join(partes)
+
+    def sql_ids(self, termino, campos):
+        expresion = self.expresion_tsquery(termino, campos)
+        if not expresion:
+            return None
+        return (
+            "SELECT id FROM partidas_partidaarancelaria WHERE search_vector @@ to_tsquery('simple', %s)",
+            [expresion],
+        )
+
+
+_backend = None
+
+
+def get_search_backend():
+    """Instancia (única por proceso) del backend configurado en `SEARCH_BACKEND`."""
+    global _backend
+    ruta = getattr(settings, 'SEARCH_BACKEND', 'partidas.search_backends.IndiceMemoriaBackend')
+    if _backend is None or _backend.__class__.__module__ + '.' + _backend.__class__.__name__ != ruta:
+        _backend = import_string(ruta)()
+    return _backend
@@ -0,0 +1,263 @@
+"""Índice invertido en memoria sobre las partidas arancelarias.
+
+Tokeniza la descripción (sin acentos y en minúsculas) y el código de cada
+`PartidaArancelaria` para que las búsquedas por término no tengan que recorrer
+la tabla completa con `icontains`. Cada término de la consulta se compara como
+prefijo contra el vocabulario ordenado, y varios términos se combinan con AND.
+"""
+import re
+import threading
+import time
+import unicodedata
+from bisect import bisect_left, bisect_right
+
+from django.conf import settings
+
+from .trigramas import IndiceTrigramas
+
+
+def normalizar_texto(s) -> str:
+    """Quita acentos, pasa a minúsculas y deja solo letras, dígitos y espacios."""
+    s = str(s or '')
+    s = ''.join(c for c in unicodedata.normalize('NFKD', s) if not unicodedata.combining(c))
+    s = s.lower()
+    s = re.sub(r'[^0-9a-z]+', ' ', s)
+    return ' '.join(s.split())
+
+
+def tokenizar(s):
+    return normalizar_texto(s).split()
+
+
+def normalizar_codigo(s) -> str:
+    """Normaliza un código arancelario quitando puntos, guiones y espacios.
+    Ej: '0101.21.00' -> '01012100'
+    """
+    return normalizar_texto(s).replace(' ', '')
+
+
+def solo_digitos(s) -> str:
+    """Deja solo los dígitos de un código: '0101.21.00' -> '01012100'."""
+    return re.sub(r'\D', '', str(s or ''))
+
+
+def _expandir_prefijo(vocab, postings, prefijo):
+    """Une los postings de todos los términos del vocabulario que empiezan por `prefijo`."""
+    ids = set()
+    if not prefijo:
+        return ids
+    i = bisect_left(vocab, prefijo)
+    while i < len(vocab) and vocab[i].startswith(prefijo):
+        ids |= postings[vocab[i]]
+        i += 1
+    return ids
+
+
+class IndiceCodigos:
+    """Códigos normalizados ordenados, agrupados por longitud.
+
+    Una búsqueda por prefijo hace un rango con búsqueda binaria en cada grupo
+    (hay pocas longitudes distintas: 4, 6, 8, 10 dígitos...), así que cuesta
+    O(log n + k) y los ids salen ya ordenados por (longitud, código).
+    """
+
+    def __init__(self, filas=()):
+        grupos = {}
+        for pk, codigo in filas:
+            cod = normalizar_codigo(codigo)
+            if cod:
+                grupos.setdefault(len(cod), []).append((cod, pk))
+        self.longitudes = sorted(grupos)
+        self.claves = {}
+        self.ids = {}
+        for n in self.longitudes:
+            entradas = sorted(grupos[n])
+            self.claves[n] = [cod for cod, _ in entradas]
+            self.ids[n] = [pk for _, pk in entradas]
+
+    def __len__(self):
+        return sum(len(v) for v in self.ids.values())
+
+    def prefijo(self, termino, limite=None):
+        """Ids cuyo código normalizado empieza por `termino`, ordenados por longitud y código."""
+        p = normalizar_codigo(termino)
+        resultado = []
+        if not p:
+            return resultado
+        for n in self.longitudes:
+            if n < len(p):
+                continue
+            claves = self.claves[n]
+            i = bisect_left(claves, p)
+            j = bisect_left(claves, p + '\uffff', i)
+            if limite is not None:
+                j = min(j, i + limite - len(resultado))
+            resultado.extend(self.ids[n][i:j])
+            if limite is not None and len(resultado) >= limite:
+                break
+        return resultado
+
+    def exacto(self, termino):
+        """Ids cuyo código normalizado es igual a `termino`."""
+        p = normalizar_codigo(termino)
+        claves = self.claves.get(len(p))
+        if not p or claves is None:
+            return []
+        i = bisect_left(claves, p)
+        j = bisect_right(claves, p, i)
+        return self.ids[len(p)][i:j]
+
+
+class IndiceInvertido:
+    """Índice término -> ids de partida para `descripcion` y `codigo`."""
+
+    def __init__(self):
+        self.postings = {}
+        self.vocab = []
+        self.codigos = IndiceCodigos()
+        self.trigramas = IndiceTrigramas()
+        self._filas_codigo = []
+        self.total = 0
+
+    def agregar(self, pk, codigo, descripcion):
+        for token in set(tokenizar(descripcion)):
+            self.postings.setdefault(token, set()).add(pk)
+        self._filas_codigo.append((pk, codigo))
+        self.total += 1
+
+    def finalizar(self):
+        self.vocab = sorted(self.postings)
+        self.codigos = IndiceCodigos(self._filas_codigo)
+        self.trigramas = IndiceTrigramas(self.vocab)
+        self._filas_codigo = []
+        return self
+
+    @classmethod
+    def desde_filas(cls, filas):
+        """Construye el índice a partir de tuplas (id, codigo, descripcion)."""
+        indice = cls()
+        for pk, codigo, descripcion in filas:
+            indice.agregar(pk, codigo, descripcion)
+        return indice.finalizar()
+
+    def buscar_descripcion(self, termino):
+        """Ids cuya descripción contiene todos los términos (como prefijo de palabra)."""
+        tokens = tokenizar(termino)
+        if not tokens:
+            return set()
+
+        tokens.sort(key=len, reverse=True)
+        resultado = None
+        for token in tokens:
+            ids = _expandir_prefijo(self.vocab, self.postings, token)
+            resultado = ids if resultado is None else (resultado & ids)
+            if not resultado:
+                return set()
+        return resultado
+
+    def buscar_codigo(self, termino):
+        """Ids cuyo código normalizado empieza por el término normalizado."""
+        return set(self.codigos.prefijo(termino))
+
+    def buscar(self, termino):
+        """Equivalente indexado de `Q(codigo__icontains=...) | Q(descripcion__icontains=...)`."""
+        return self.buscar_codigo(termino) | self.buscar_descripcion(termino)
+
+    def buscar_aproximado(self, termino, umbral=None):
+        """Búsqueda tolerante a errores de tipeo en la descripción.
+        Las palabras que no coinciden como prefijo se reemplazan por las del vocabulario
+        con trigramas similares. Devuelve (ids, término corregido); ids vacío si alguna
+        palabra no tiene ninguna parecida.
+        """
+        resultado = None
+        corregidas = []
+        for token in tokenizar(termino):
+            ids = _expandir_prefijo(self.vocab, self.postings, token)
+            corregida = token
+            if not ids:
+                similares = self.trigramas.similares(token, umbral)
+                for palabra, _ in similares:
+                    ids |= self.postings[palabra]
+                if similares:
+                    corregida = similares[0][0]
+            corregidas.append(corregida)
+            resultado = ids if resultado is None else (resultado & ids)
+            if not resultado:
+                return set(), termino
+        return (resultado or set()), ' '.join(corregidas)
+
+
+_procesos = []
+
+
+class _IndiceProceso:
+    """Estructura de búsqueda cacheada por proceso, reconstruida si se invalida o expira.
+    Los cambios hechos por otros procesos se detectan con la generación del catálogo;
+    el TTL (`SEARCH_INDEX_TTL`, segundos) queda como red de seguridad.
+    Todas las instancias se descartan juntas con `invalidar_indice()`.
+    """
+
+    def __init__(self, construir):
+        self.construir = construir
+        self.valor = None
+        self.construido_en = 0.0
+        self.generacion = None
+        self.version = 0
+        self.lock = threading.Lock()
+        _procesos.append(self)
+
+    def _expirado(self, generacion):
+        ttl = getattr(settings, 'SEARCH_INDEX_TTL', 300)
+        if generacion != self.generacion:
+            return True
+        return ttl is not None and (time.monotonic() - self.construido_en) >= ttl
+
+    def get(self):
+        from .catalogo import get_generacion
+        generacion = get_generacion()
+        valor = self.valor
+        if valor is not None and not self._expirado(generacion):
+            return valor
+        with self.lock:
+            if self.valor is None or self._expirado(generacion):
+                version = self.version
+                self.valor = self.construir()
+                self.generacion = generacion
+                # si hubo una escritura durante la construcción, forzar otra en la próxima llamada
+                self.construido_en = time.monotonic() if version == self.version else float('-inf')
+            return self.valor
+
+    def invalidar(self):
+        self.version += 1
+        self.valor = None
+
+
+def construir_indice():
+    from .models import PartidaArancelaria
+    filas = PartidaArancelaria.objects.values_list('id', 'codigo', 'descripcion').iterator()
+    return IndiceInvertido.desde_filas(filas)
+
+
+def construir_indice_codigos():
+    from .models import PartidaArancelaria
+    return IndiceCodigos(PartidaArancelaria.objects.values_list('id', 'codigo').iterator())
+
+
+_indice = _IndiceProceso(construir_indice)
+_indice_codigos = _IndiceProceso(construir_indice_codigos)
+
+
+def get_indice():
+    """Índice invertido (descripción + código) del proceso."""
+    return _indice.get()
+
+
+def get_indice_codigos():
+    """Índice ordenado de códigos del proceso; solo carga `id` y `codigo`."""
+    return _indice_codigos.get()
+
+
+def invalidar_indice(**kwargs):
+    """Descarta los índices actuales; se reconstruyen en la próxima búsqueda."""
+    for proceso in _procesos:
+        proceso.invalidar()
@@ -0,0 +1,162 @@
+"""Series de tiempo del volumen de búsquedas para gráficos.
+
+El total de búsquedas sale del registro `Busqueda` (admite intervalos de una
+hora) y las series por capítulo de `SearchStatisticDaily` (día o semana). El
+valor de cada intervalo cerrado ya no cambia, así que se guarda sin vencimiento en
+el cache `SEARCH_STATS_SERIES_CACHE` (uno propio, con lugar para todos los
+intervalos de muchos rangos): cada petición solo consulta los intervalos que no
+estaban en el cache (normalmente el actual) con una consulta agrupada. Si el
+rango tiene más intervalos que los puntos pedidos, se suman intervalos
+consecutivos en el servidor para que la respuesta sea chica.
+
+Un intervalo se da por cerrado `SEARCH_STATS_SERIES_MARGIN` segundos después de
+su fin, y nunca mientras la bitácora tenga búsquedas pendientes de esa fecha o
+anteriores (un spool recuperado inserta filas con su fecha original). Los
+intervalos ya archivados con `archivar_registros` que no estaban en el cache
+se cuentan sobre las filas que quedan en `Busqueda`, es decir, como 0.
+"""
+import hashlib
+import math
+from datetime import datetime, time, timedelta, timezone as dt_timezone
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db.models import Count
+from django.db.models.functions import TruncDate, TruncHour
+from django.utils import timezone
+
+from .agregados import inicio_periodo
+from .bitacora import BUSQUEDA, get_bitacora
+from .models import Busqueda, SearchStatisticDaily
+
+
+INTERVALOS = ('hora', 'dia', 'semana')
+
+TOTAL = 'total'
+
+
+def _medianoche(fecha):
+    return timezone.make_aware(datetime.combine(fecha, time.min))
+
+
+def _inicios(intervalo, desde, hasta):
+    """Inicio de cada intervalo que toca el rango de fechas [desde, hasta]."""
+    if intervalo == 'hora':
+        # se avanza en UTC para no depender de cambios de horario
+        actual = _medianoche(desde).astimezone(dt_timezone.utc)
+        fin = _medianoche(hasta + timedelta(days=1)).astimezone(dt_timezone.utc)
+        inicios = []
+        while actual < fin:
+            inicios.append(actual)
+            actual += timedelta(hours=1)
+        return inicios
+    paso = 7 if intervalo == 'semana' else 1
+    actual = inicio_periodo(desde, 'semana') if intervalo == 'semana' else desde
+    inicios = []
+    while actual <= hasta:
+        inicios.append(actual)
+        actual += timedelta(days=paso)
+    return inicios
+
+
+def _fin(intervalo, inicio):
+    if intervalo == 'hora':
+        return inicio + timedelta(hours=1)
+    return _medianoche(inicio + timedelta(days=7 if intervalo == 'semana' else 1))
+
+
+def _inicio_dt(intervalo, inicio):
+    return inicio if intervalo == 'hora' else _medianoche(inicio)
+
+
+def get_cache():
+    return caches[getattr(settings, 'SEARCH_STATS_SERIES_CACHE', 'default')]
+
+
+def _clave(intervalo, nombre, inicio):
+    serie = hashlib.md5(nombre.encode('utf-8')).hexdigest()
+    marca = int(inicio.timestamp()) if intervalo == 'hora' else inicio.isoformat()
+    return f'partidas:serie:{intervalo}:{serie}:{marca}'
+
+
+def _contar_busquedas(intervalo, primero, ultimo):
+    qs = Busqueda.objects.filter(
+        fecha__gte=_inicio_dt(intervalo, primero), fecha__lt=_fin(intervalo, ultimo)
+    )
+    tz = timezone.get_current_timezone()
+    if intervalo == 'hora':
+        return {
+            (TOTAL, fila['inicio']): fila['n']
+            for fila in qs.annotate(inicio=TruncHour('fecha', tzinfo=tz)).values('inicio').annotate(n=Count('id'))
+        }
+    conteos = {}
+    for fila in qs.annotate(dia=TruncDate('fecha', tzinfo=tz)).values('dia').annotate(n=Count('id')):
+        inicio = inicio_periodo(fila['dia'], 'semana') if intervalo == 'semana' else fila['dia']
+        conteos[(TOTAL, inicio)] = conteos.get((TOTAL, inicio), 0) + fila['n']
+    return conteos
+
+
+def _contar_capitulos(intervalo, primero, ultimo, capitulos):
+    fin = ultimo + timedelta(days=6) if intervalo == 'semana' else ultimo
+    conteos = {}
+    for capitulo, fecha, count in SearchStatisticDaily.objects.filter(
+        capitulo__in=capitulos, fecha__range=(primero, fin)
+    ).values_list('capitulo', 'fecha', 'count'):
+        inicio = inicio_periodo(fecha, 'semana') if intervalo == 'semana' else fecha
+        conteos[(capitulo, inicio)] = conteos.get((capitulo, inicio), 0) + count
+    return conteos
+
+
+def serie_busquedas(intervalo, desde, hasta, capitulos=None, puntos=None):
+    """Búsquedas por intervalo ('hora', 'dia' o 'semana') entre las fechas `desde` y `hasta`.
+
+    Sin `capitulos` devuelve una serie 'total'; con capítulos, una serie por capítulo
+    (solo por día o semana). `puntos` es la cantidad máxima de puntos por serie.
+    """
+    if intervalo not in INTERVALOS:
+        raise ValueError(f'Intervalo inválido: {intervalo}')
+    if capitulos and intervalo == 'hora':
+        raise ValueError('Las series por capítulo solo están disponibles por día o por semana')
+    inicios = _inicios(intervalo, desde, hasta)
+    if len(inicios) > getattr(settings, 'SEARCH_STATS_SERIES_MAX_BUCKETS', 5000):
+        raise ValueError('El rango tiene demasiados intervalos; use un intervalo mayor')
+    nombres = list(capitulos) if capitulos else [TOTAL]
+
+    claves = {(nombre, inicio): _clave(intervalo, nombre, inicio) for nombre in nombres for inicio in inicios}
+    guardados = get_cache().get_many(list(claves.values()))
+    valores = {k: guardados[clave] for k, clave in claves.items() if clave in guardados}
+    faltan = [inicio for (nombre, inicio) in claves if (nombre, inicio) not in valores]
+    if faltan:
+        # un intervalo se da por cerrado un margen después de su fin y si no quedan búsquedas anteriores en la
+        # bitácora (se calcula antes de contar, para no cerrar con filas que se insertan mientras tanto)
+        cierre = timezone.now() - timedelta(seconds=getattr(settings, 'SEARCH_STATS_SERIES_MARGIN', 300))
+        if not capitulos:
+            pendiente = get_bitacora().pendiente_desde(BUSQUEDA)
+            if pendiente is not None:
+                cierre = min(cierre, pendiente)
+        primero, ultimo = min(faltan), max(faltan)
+        if capitulos:
+            contados = _contar_capitulos(intervalo, primero, ultimo, nombres)
+        else:
+            contados = _contar_busquedas(intervalo, primero, ultimo)
+        cerrados = {}
+        for k, clave in claves.items():
+            if k in valores:
+                continue
+            valores[k] = contados.get(k, 0)
+            if _fin(intervalo, k[1]) <= cierre:
+                cerrados[clave] = valores[k]
+        if cerrados:
+            get_cache().set_many(cerrados, timeout=None)
+
+    puntos = puntos or getattr(settings, 'SEARCH_STATS_SERIES_POINTS', 200)
+    agrupados = max(math.ceil(len(inicios) / puntos), 1)
+    series = []
+    for nombre in nombres:
+        datos = []
+        for i in range(0, len(inicios), agrupados):
+            inicio = inicios[i]
+            etiqueta = timezone.localtime(inicio).isoformat() if intervalo == 'hora' else inicio.isoformat()
+            datos.append([etiqueta, sum(valores[(nombre, j)] for j in inicios[i:i + agrupados])])
+        series.append({'nombre': nombre, 'puntos': datos})
+    return {'intervalo': intervalo, 'agrupados': agrupados, 'series': series}
@@ -0,0 +1,51 @@
+from django.conf import settings
+from django.core.signals import request_finished
+from django.db.models import F
+from django.db.models.signals import post_init, post_save, post_delete
+from django.dispatch import receiver
+
+from .bitacora import get_bitacora
+from .cache_resultados import get_cache_resultados
+from .catalogo import registrar_cambio
+from .estadisticas import get_agregador
+from .models import LicenciaTemporal, PartidaArancelaria, Usuario
+from .search_index import invalidar_indice
+
+
+@receiver(post_init, sender=PartidaArancelaria)
+def partida_cargada(sender, instance, **kwargs):
+    # capítulo original, para incrementar también su generación si la edición lo cambia
+    instance._capitulo_original = instance.__dict__.get('capitulo')
+
+
+@receiver(post_save, sender=PartidaArancelaria)
+@receiver(post_delete, sender=PartidaArancelaria)
+def partida_modificada(sender, instance, **kwargs):
+    """Incrementa la generación del catálogo e invalida las estructuras y resultados de búsqueda en memoria."""
+    registrar_cambio(instance.capitulo, getattr(instance, '_capitulo_original', None))
+    instance._capitulo_original = instance.capitulo
+    invalidar_indice()
+    get_cache_resultados().limpiar()
+
+
+@receiver(post_save, sender=LicenciaTemporal)
+@receiver(post_delete, sender=LicenciaTemporal)
+def licencia_modificada(sender, instance, update_fields=None, **kwargs):
+    """Invalida el veredicto de licencia guardado en las sesiones del usuario (ver `licencia_vigente`)."""
+    if update_fields and set(update_fields) <= {'notified_pre_expiry'}:
+        return
+    Usuario.objects.filter(pk=instance.usuario_id).update(licencia_version=F('licencia_version') + 1)
+
+
+@receiver(request_finished)
+def vaciar_estadisticas(sender, **kwargs):
+    """Sin hilo de fondo, las estadísticas pendientes se guardan al terminar una petición (ya enviada la respuesta)."""
+    if not getattr(settings, 'SEARCH_STATS_BACKGROUND_FLUSH', False):
+        get_agregador().vaciar_si_corresponde()
+
+
+@receiver(request_finished)
+def vaciar_bitacora(sender, **kwargs):
+    """Igual que las estadísticas: sin hilo de fondo, la bitácora se guarda al terminar las peticiones."""
+    if not getattr(settings, 'BITACORA_BACKGROUND_FLUSH', False):
+        get_bitacora().vaciar_si_corresponde()
@@ -0,0 +1,21 @@
+import atexit
+import tempfile
+
+from django.test.utils import override_settings
+
+from partidas.bitacora import get_bitacora
+from partidas.estadisticas import get_agregador
+
+
+# los registros diferidos de los tests van a un spool temporal y lo que quede pendiente al salir se descarta
+# (los atexit corren en orden inverso: esto se ejecuta antes que los vaciados de bitacora.py y estadisticas.py)
+_spool = tempfile.mkdtemp(prefix='bitacora-tests-')
+override_settings(BITACORA_SPOOL_DIR=_spool).enable()
+
+
+def _descartar_pendientes():
+    get_bitacora().pendientes.clear()
+    get_agregador().pendientes.clear()
+
+
+atexit.register(_descartar_pendientes)
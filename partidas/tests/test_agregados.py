@@ -0,0 +1,55 @@
+from datetime import date, timedelta
+from io import StringIO
+
+from django.core.management import CommandError, call_command
+from django.test import TestCase
+from django.utils import timezone
+
+from partidas.agregados import acumular_dias_cerrados, ranking_periodo
+from partidas.models import MarcaAgregacion, SearchStatistic, SearchStatisticDaily
+
+
+class AcumularDiasCerradosTests(TestCase):
+    def setUp(self):
+        # miércoles 28 y jueves 29 de enero, lunes 2 de febrero de 2026
+        for fecha, capitulo, count in [
+            (date(2026, 1, 28), '02', 3), (date(2026, 1, 29), '02', 2), (date(2026, 1, 29), '09', 4),
+            (date(2026, 2, 2), '02', 5),
+        ]:
+            SearchStatisticDaily.objects.create(fecha=fecha, capitulo=capitulo, count=count)
+
+    def _conteos(self, periodo, inicio):
+        return dict(SearchStatistic.objects.filter(periodo=periodo, periodo_inicio=inicio).values_list('capitulo', 'count'))
+
+    def test_acumula_solo_dias_nuevos(self):
+        self.assertEqual(acumular_dias_cerrados(hasta=date(2026, 1, 31)), (date(2026, 1, 28), date(2026, 1, 31)))
+        self.assertEqual(self._conteos('semana', date(2026, 1, 26)), {'02': 5, '09': 4})
+        self.assertEqual(self._conteos('mes', date(2026, 1, 1)), {'02': 5, '09': 4})
+        self.assertIsNone(acumular_dias_cerrados(hasta=date(2026, 1, 31)))
+        self.assertEqual(self._conteos('mes', date(2026, 1, 1)), {'02': 5, '09': 4})
+
+        SearchStatisticDaily.objects.create(fecha=date(2026, 2, 3), capitulo='02', count=1)
+        acumular_dias_cerrados(hasta=date(2026, 2, 3))
+        self.assertEqual(self._conteos('semana', date(2026, 2, 2)), {'02': 6})
+        self.assertEqual(self._conteos('mes', date(2026, 2, 1)), {'02': 6})
+        self.assertEqual(MarcaAgregacion.objects.get().hasta, date(2026, 2, 3))
+
+        mes = list(ranking_periodo('mes', fecha=date(2026, 1, 15)))
+        self.assertEqual([(f.capitulo, f.count) for f in mes], [('02', 5), ('09', 4)])
+        self.assertEqual(mes[0].periodo_fin, date(2026, 1, 31))
+
+    def test_comando_reconstruir(self):
+        acumular_dias_cerrados(hasta=date(2026, 2, 2))
+        call_command('acumular_estadisticas', '--reconstruir', '--hasta', '2026-02-02', stdout=StringIO())
+        self.assertEqual(self._conteos('mes', date(2026, 2, 1)), {'02': 5})
+
+    def test_no_acumula_el_dia_en_curso(self):
+        hoy = timezone.localdate()
+        SearchStatisticDaily.objects.create(fecha=hoy, capitulo='02', count=1)
+        for hasta in (hoy, hoy + timedelta(days=1)):
+            with self.assertRaises(CommandError):
+                call_command('acumular_estadisticas', '--hasta', hasta.isoformat(), stdout=StringIO())
+            with self.assertRaises(ValueError):
+                acumular_dias_cerrados(hasta=hasta)
+        self.assertFalse(MarcaAgregacion.objects.exists())
+        self.assertEqual(acumular_dias_cerrados()[1], hoy - timedelta(days=1))
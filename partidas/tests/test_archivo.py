@@ -0,0 +1,81 @@
+import gzip
+import json
+import os
+import tempfile
+from datetime import datetime
+from io import StringIO
+
+from django.core.management import call_command
+from django.test import TestCase
+from django.utils import timezone
+
+from partidas.archivo import archivar, restaurar, ruta_archivo
+from partidas.models import Busqueda, ClickLog, HistoriaActividad, Usuario
+
+
+class ArchivoRegistrosTests(TestCase):
+    def setUp(self):
+        self.destino = tempfile.mkdtemp()
+        self.usuario = Usuario.objects.create_user(username='u1', password='pass1234')
+
+    def _busqueda(self, cuando, termino='cafe'):
+        return Busqueda.objects.create(usuario=self.usuario, termino_buscado=termino, tipo_busqueda='Texto',
+                                       fecha=timezone.make_aware(cuando))
+
+    def test_archiva_por_dia_en_lotes_y_restaura(self):
+        for i in range(5):
+            self._busqueda(datetime(2020, 1, 1, 10, i), f'viejo {i}')
+        self._busqueda(datetime(2020, 1, 2, 9, 0), 'otro día')
+        reciente = Busqueda.objects.create(usuario=self.usuario, termino_buscado='hoy', tipo_busqueda='Texto')
+
+        total, rutas = archivar('busqueda', dias=30, destino=self.destino, lote=2)
+        self.assertEqual(total, 6)
+        self.assertEqual(list(Busqueda.objects.values_list('pk', flat=True)), [reciente.pk])
+        dia1 = ruta_archivo(self.destino, 'busqueda', datetime(2020, 1, 1).date())
+        self.assertEqual(rutas, [dia1, ruta_archivo(self.destino, 'busqueda', datetime(2020, 1, 2).date())])
+        with gzip.open(dia1, 'rt', encoding='utf-8') as f:
+            filas = [json.loads(linea) for linea in f]
+        self.assertEqual([fila['termino_buscado'] for fila in filas], [f'viejo {i}' for i in range(5)])
+
+        self.assertEqual(restaurar(dia1), 5)
+        self.assertEqual(restaurar(dia1), 5)  # las filas que ya existen se omiten
+        self.assertEqual(Busqueda.objects.filter(termino_buscado__startswith='viejo').count(), 5)
+        self.assertEqual(Busqueda.objects.get(termino_buscado='viejo 0').fecha,
+                         timezone.make_aware(datetime(2020, 1, 1, 10, 0)))
+
+    def test_archiva_y_restaura_campos_binarios(self):
+        busqueda = self._busqueda(datetime(2020, 1, 1, 10, 0))
+        Busqueda.objects.filter(pk=busqueda.pk).update(ids_top=Busqueda.empaquetar_ids([7, 3, 12]))
+        _, (ruta,) = archivar('busqueda', dias=30, destino=self.destino)
+        self.assertFalse(Busqueda.objects.exists())
+
+        self.assertEqual(restaurar(ruta), 1)
+        self.assertEqual(Busqueda.objects.get(pk=busqueda.pk).ids_resultados, [7, 3, 12])
+
+    def test_restaurar_sin_la_fila_referenciada(self):
+        otro = Usuario.objects.create_user(username='u2', password='pass1234')
+        click = ClickLog.objects.create(usuario=otro, accion='historial_click')
+        ClickLog.objects.filter(pk=click.pk).update(fecha_hora=timezone.make_aware(datetime(2020, 1, 1)))
+        HistoriaActividad.objects.create(usuario=otro, accion='vieja', fecha_hora=timezone.make_aware(datetime(2020, 1, 1)))
+        _, (ruta_click,) = archivar('clicklog', dias=30, destino=self.destino)
+        _, (ruta_actividad,) = archivar('historiaactividad', dias=30, destino=self.destino)
+        otro.delete()
+
+        self.assertEqual(restaurar(ruta_click), 1)
+        self.assertIsNone(ClickLog.objects.get().usuario)
+        # HistoriaActividad.usuario no admite NULL: la fila se omite
+        self.assertEqual(restaurar(ruta_actividad), 0)
+
+    def test_comando(self):
+        self._busqueda(datetime(2020, 1, 1, 10, 0))
+        salida = StringIO()
+        call_command('archivar_registros', '--tabla', 'busqueda', '--dias', '30', '--destino', self.destino,
+                     '--simular', stdout=salida)
+        self.assertIn('busqueda: 1 filas', salida.getvalue())
+        self.assertEqual(Busqueda.objects.count(), 1)
+
+        salida = StringIO()
+        call_command('archivar_registros', '--tabla', 'busqueda', '--dias', '30', '--destino', self.destino, stdout=salida)
+        self.assertNotIn('compactada', salida.getvalue())  # VACUUM solo con --compactar
+        self.assertEqual(Busqueda.objects.count(), 0)
+        self.assertTrue(os.path.exists(ruta_archivo(self.destino, 'busqueda', datetime(2020, 1, 1).date())))
@@ -0,0 +1,120 @@
+import base64
+import json
+import os
+import tempfile
+from datetime import date, datetime, timedelta
+from unittest import mock, skipIf
+
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+
+from partidas import bitacora
+from partidas.bitacora import ACTIVIDAD, BUSQUEDA, CHAT, Bitacora
+from partidas.models import Busqueda, ChatMessage, HistoriaActividad, LicenciaTemporal, Usuario
+
+
+class BitacoraTests(TestCase):
+    def setUp(self):
+        self.directorio = tempfile.mkdtemp()
+        ajustes = override_settings(BITACORA_SPOOL_DIR=self.directorio, BITACORA_BUFFER_MAX=100)
+        ajustes.enable()
+        self.addCleanup(ajustes.disable)
+        self.usuario = Usuario.objects.create_user(username='u1', password='pass1234')
+
+    def _spools(self):
+        return sorted(os.listdir(self.directorio))
+
+    def test_registra_en_spool_y_guarda_en_lote(self):
+        b = Bitacora()
+        cuando = timezone.make_aware(datetime(2024, 3, 4, 10, 30))
+        b.registrar(BUSQUEDA, usuario_id=self.usuario.pk, termino_buscado='cafe', tipo_busqueda='Texto',
+                    resultados='1 resultados', fecha=cuando)
+        b.registrar(ACTIVIDAD, usuario_id=self.usuario.pk, accion='admin: crear partida')
+        b.registrar(CHAT, usuario_id=None, mensaje='hola', respuesta='¿En qué ayudo?', publico=True)
+        self.assertEqual(Busqueda.objects.count(), 0)
+        spool, = self._spools()
+        with open(os.path.join(self.directorio, spool), encoding='utf-8') as f:
+            self.assertEqual(len(f.readlines()), 3)
+
+        with self.assertNumQueries(6):  # usuarios, 3 inserts y el savepoint de la transacción
+            self.assertEqual(b.vaciar(), 3)
+        self.assertEqual(Busqueda.objects.get().fecha, cuando)
+        self.assertTrue(HistoriaActividad.objects.filter(usuario=self.usuario).exists())
+        self.assertEqual(ChatMessage.objects.get().respuesta, '¿En qué ayudo?')
+        self.assertEqual(self._spools(), [])
+
+    def test_recupera_spool_abandonado(self):
+        registros = [
+            {'tipo': ACTIVIDAD, 'campos': {'usuario_id': self.usuario.pk, 'accion': 'antes de caer',
+                                           'fecha_hora': '2024-03-04T10:00:00Z'}},
+            # usuario borrado: la actividad se descarta, el chat queda sin usuario
+            {'tipo': ACTIVIDAD, 'campos': {'usuario_id': 999, 'accion': 'huérfana', 'fecha_hora': '2024-03-04T10:00:00Z'}},
+            {'tipo': CHAT, 'campos': {'usuario_id': 999, 'mensaje': 'hola', 'respuesta': 'x', 'publico': False,
+                                      'created_at': '2024-03-04T10:00:00Z'}},
+            {'tipo': BUSQUEDA, 'campos': {'usuario_id': self.usuario.pk, 'termino_buscado': 'cafe', 'tipo_busqueda': 'Texto',
+                                          'fecha': '2024-03-04T10:00:00Z', 'total_resultados': 2,
+                                          'ids_top': base64.b64encode(Busqueda.empaquetar_ids([7, 3])).decode()}},
+        ]
+        with open(os.path.join(self.directorio, '1-muerto.jsonl'), 'w', encoding='utf-8') as f:
+            f.writelines(json.dumps(r) + '\n' for r in registros)
+            f.write('{"tipo": "actividad", "cam')  # línea cortada
+
+        Bitacora().vaciar()
+        self.assertEqual(list(HistoriaActividad.objects.values_list('accion', flat=True)), ['antes de caer'])
+        self.assertIsNone(ChatMessage.objects.get().usuario)
+        self.assertEqual(Busqueda.objects.get().ids_resultados, [7, 3])
+        self.assertEqual(self._spools(), [])
+
+    def test_registro_invalido_va_a_cuarentena(self):
+        b = Bitacora()
+        b.registrar(BUSQUEDA, usuario_id=self.usuario.pk, termino_buscado=None, tipo_busqueda='Texto')
+        b.registrar(ACTIVIDAD, usuario_id=self.usuario.pk, accion='válida')
+        with open(os.path.join(self.directorio, '1-muerto.jsonl'), 'w', encoding='utf-8') as f:
+            f.write(json.dumps({'tipo': CHAT, 'campos': {'mensaje': 'x', 'no_existe': 1}}) + '\n')
+
+        b.vaciar()
+        self.assertEqual(list(HistoriaActividad.objects.values_list('accion', flat=True)), ['válida'])
+        self.assertFalse(Busqueda.objects.exists())
+        self.assertEqual(self._spools(), ['cuarentena'])
+        apartados = []
+        for nombre in os.listdir(os.path.join(self.directorio, 'cuarentena')):
+            with open(os.path.join(self.directorio, 'cuarentena', nombre), encoding='utf-8') as f:
+                apartados += [json.loads(linea)['tipo'] for linea in f]
+        self.assertEqual(sorted(apartados), [BUSQUEDA, CHAT])
+
+    @override_settings(BITACORA_BACKGROUND_FLUSH=True, BITACORA_BUFFER_MAX=2)
+    def test_buffer_lleno_despierta_al_hilo(self):
+        b = Bitacora()
+        b._iniciar_hilo = mock.Mock()
+        with mock.patch.object(b, 'vaciar') as vaciar:
+            b.registrar(ACTIVIDAD, usuario_id=self.usuario.pk, accion='uno')
+            self.assertFalse(b._despertar.is_set())
+            b.registrar(ACTIVIDAD, usuario_id=self.usuario.pk, accion='dos')
+        vaciar.assert_not_called()
+        self.assertTrue(b._despertar.is_set())
+        self.assertEqual(len(b), 2)
+        b.vaciar()
+        self.assertEqual(HistoriaActividad.objects.count(), 2)
+
+    @skipIf(bitacora.fcntl is None, 'requiere flock')
+    def test_no_toma_el_spool_de_otro_proceso_activo(self):
+        otro = Bitacora()
+        otro.registrar(ACTIVIDAD, usuario_id=self.usuario.pk, accion='de otro proceso')
+        Bitacora().vaciar()
+        self.assertFalse(HistoriaActividad.objects.exists())
+        self.assertEqual(len(self._spools()), 1)
+        otro.vaciar()
+        self.assertEqual(HistoriaActividad.objects.count(), 1)
+
+    @override_settings(BITACORA_FLUSH_INTERVAL=0)
+    def test_chat_help_registra_al_terminar_la_peticion(self):
+        bitacora.get_bitacora().pendientes.clear()
+        hoy = date.today()
+        LicenciaTemporal.objects.create(usuario=self.usuario, fecha_inicio=hoy, fecha_fin=hoy + timedelta(days=30), estado=True)
+        self.client.force_login(self.usuario)
+        resp = self.client.post(reverse('api_chat_help'), {'message': 'licencia'})
+        self.assertEqual(resp.status_code, 200)
+        chat = ChatMessage.objects.get(usuario=self.usuario)
+        self.assertEqual(chat.respuesta, resp.json()['reply'])
+        self.assertTrue(HistoriaActividad.objects.filter(accion='chat_help: licencia').exists())
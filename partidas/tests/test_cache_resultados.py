@@ -0,0 +1,56 @@
+from datetime import date, timedelta
+from unittest import mock
+
+from django.test import Client, TestCase
+from django.urls import reverse
+
+from partidas.cache_resultados import CacheResultados, clave_termino, get_cache_resultados, ids_compactos
+from partidas.models import LicenciaTemporal, PartidaArancelaria, Usuario
+from partidas.search_backends import get_search_backend
+
+
+class CacheResultadosTests(TestCase):
+    def test_lru_acotado_por_cantidad_de_ids(self):
+        cache = CacheResultados(max_ids=5, ttl=60)
+        cache.obtener('a', lambda: ids_compactos([1, 2]))
+        cache.obtener('b', lambda: ids_compactos([3, 4]))
+        cache.obtener('a', lambda: ids_compactos([]))
+        cache.obtener('c', lambda: ids_compactos([5, 6]))
+        self.assertEqual(list(cache.entradas), ['a', 'c'])
+        self.assertEqual(list(cache.obtener('a', lambda: ids_compactos([]))), [1, 2])
+        self.assertEqual(cache.estadisticas()['aciertos'], 2)
+        self.assertEqual(cache.estadisticas()['fallos'], 3)
+
+    def test_expira_por_ttl(self):
+        cache = CacheResultados(max_ids=10, ttl=0)
+        cache.obtener('a', lambda: ids_compactos([1]))
+        self.assertEqual(list(cache.obtener('a', lambda: ids_compactos([2]))), [2])
+
+    def test_clave_normaliza_acentos_mayusculas_y_espacios(self):
+        self.assertEqual(clave_termino('  CAFÉ   Tostado'), clave_termino('cafe tostado'))
+
+
+class BuscarConCacheTests(TestCase):
+    def setUp(self):
+        self.user = Usuario.objects.create_user(username='despachante', password='pass1234')
+        hoy = date.today()
+        LicenciaTemporal.objects.create(usuario=self.user, fecha_inicio=hoy, fecha_fin=hoy + timedelta(days=30), estado=True)
+        PartidaArancelaria.objects.create(capitulo='02', codigo='0201.10.00', descripcion='Carne bovina fresca')
+        self.client = Client()
+        self.client.force_login(self.user)
+
+    def test_consulta_repetida_no_vuelve_a_buscar_y_expira_al_cambiar_catalogo(self):
+        cache = get_cache_resultados()
+        cache.limpiar()
+        backend = get_search_backend()
+        with mock.patch.object(backend, 'buscar', wraps=backend.buscar) as buscar:
+            self.client.get(reverse('buscar_partidas'), {'termino': 'carne'})
+            llamadas = buscar.call_count
+            resp = self.client.get(reverse('buscar_partidas'), {'termino': 'CARNE '})
+            self.assertEqual(buscar.call_count, llamadas)
+            self.assertEqual(len(resp.context['resultados']), 1)
+
+            PartidaArancelaria.objects.create(capitulo='02', codigo='0202.10.00', descripcion='Carne congelada')
+            resp = self.client.get(reverse('buscar_partidas'), {'termino': 'carne'})
+            self.assertGreater(buscar.call_count, llamadas)
+            self.assertEqual(len(resp.context['resultados']), 2)
@@ -0,0 +1,50 @@
+from io import BytesIO
+
+from django.core.cache import cache
+from django.test import TestCase
+from openpyxl import Workbook
+
+from partidas.catalogo import get_generacion
+from partidas.importar_excel import process_import
+from partidas.models import GeneracionCatalogo, PartidaArancelaria
+
+
+class GeneracionCatalogoTests(TestCase):
+    def setUp(self):
+        cache.clear()
+
+    def test_escrituras_incrementan_generacion_global_y_de_capitulo(self):
+        self.assertEqual(get_generacion(), 0)
+        partida = PartidaArancelaria.objects.create(capitulo='09', codigo='0901.11.00', descripcion='Café')
+        self.assertEqual(get_generacion(), 1)
+        self.assertEqual(get_generacion('09'), 1)
+        self.assertEqual(get_generacion('02'), 0)
+
+        partida = PartidaArancelaria.objects.get(pk=partida.pk)
+        partida.capitulo = '02'
+        partida.save()
+        self.assertEqual((get_generacion(), get_generacion('09'), get_generacion('02')), (2, 2, 1))
+
+        partida.delete()
+        self.assertEqual((get_generacion(), get_generacion('02')), (3, 2))
+
+        with self.assertNumQueries(0):
+            get_generacion()
+
+    def test_importacion_incrementa_una_sola_vez(self):
+        PartidaArancelaria.objects.create(capitulo='01', codigo='0101.99', descripcion='Sobra')
+        wb = Workbook()
+        ws = wb.active
+        ws.append(['Capítulo', 'Partida', 'Código', 'Descripción'])
+        ws.append(['01', '0101', '0101.21', 'Caballos reproductores'])
+        ws.append(['01', '0101', '0101.29', 'Caballos de carrera'])
+        bio = BytesIO()
+        wb.save(bio)
+        bio.seek(0)
+
+        antes = get_generacion()
+        result = process_import(bio, sync_catalog=True, nombre_archivo='cap01.xlsx')
+        self.assertEqual(result['created'], 2)
+        self.assertEqual(result['deleted'], 1)
+        self.assertEqual(get_generacion(), antes + 1)
+        self.assertTrue(GeneracionCatalogo.objects.filter(capitulo='01').exists())
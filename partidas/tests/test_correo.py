@@ -0,0 +1,79 @@
+from datetime import timedelta
+from unittest import mock
+
+from django.core import mail
+from django.core.mail.backends.locmem import EmailBackend
+from django.test import TestCase, override_settings
+from django.utils import timezone
+
+from partidas.correo import duracion_reserva, encolar, procesar_lote, procesar_pendientes
+from partidas.models import CorreoSaliente, NotificationLog, SolicitudSoporte, Usuario
+
+
+@override_settings(CORREO_MAX_INTENTOS=3, CORREO_REINTENTO_BASE=60, CORREO_REINTENTO_MAX=100)
+class BandejaSalidaTests(TestCase):
+    def setUp(self):
+        self.usuario = Usuario.objects.create_user(username='u1', password='pass1234', email='u1@x.com')
+
+    def test_envia_el_lote_por_una_conexion(self):
+        for i in range(3):
+            encolar(f'Aviso {i}', 'cuerpo', f'd{i}@x.com', usuario=self.usuario, registrar=True)
+        encolar('Bienvenida', 'hola', 'u1@x.com', cuerpo_html='<b>hola</b>')
+
+        with mock.patch.object(EmailBackend, 'open', autospec=True) as abrir:
+            self.assertEqual(procesar_pendientes(lote=10), (4, 0))
+        self.assertEqual(abrir.call_count, 1)
+        self.assertEqual(len(mail.outbox), 4)
+        self.assertEqual(mail.outbox[3].alternatives[0][0], '<b>hola</b>')
+        self.assertFalse(CorreoSaliente.objects.exclude(estado='sent').exists())
+        # solo los correos con `registrar` quedan en NotificationLog
+        self.assertEqual(NotificationLog.objects.filter(success=True, destinatario=self.usuario).count(), 3)
+        self.assertEqual(procesar_lote(), (0, 0))
+
+    def test_reintentos_con_espera_exponencial(self):
+        solicitud = SolicitudSoporte.objects.create(correo='u1@x.com', mensaje='ayuda')
+        log = NotificationLog.objects.create(destinatario_email='u1@x.com', asunto='Reintento', success=False)
+        correo = encolar('Soporte', 'ayuda', 'soporte@x.com', solicitud=solicitud)
+        reintento = encolar('Reintento', 'x', 'u1@x.com', notificacion=log)
+
+        esperas = []
+        with mock.patch.object(EmailBackend, 'send_messages', side_effect=OSError('smtp caído')):
+            for _ in range(3):
+                antes = timezone.now()
+                self.assertEqual(procesar_pendientes(), (0, 2))
+                correo.refresh_from_db()
+                esperas.append(round((correo.proximo_intento - antes).total_seconds() / 10) * 10)
+                # ya no está listo: otra pasada no lo toma
+                self.assertEqual(procesar_pendientes(), (0, 0))
+                CorreoSaliente.objects.update(proximo_intento=timezone.now() - timedelta(seconds=1))
+        self.assertEqual(esperas[:2], [60, 100])
+
+        correo.refresh_from_db()
+        solicitud.refresh_from_db()
+        log.refresh_from_db()
+        self.assertEqual((correo.estado, correo.intentos), ('error', 3))
+        self.assertEqual((solicitud.estado, solicitud.error_message), ('error', 'smtp caído'))
+        self.assertEqual((log.success, log.error_message), (False, 'smtp caído'))
+
+        CorreoSaliente.objects.filter(pk=reintento.pk).update(estado='pending', intentos=0)
+        self.assertEqual(procesar_pendientes(), (1, 0))
+        log.refresh_from_db()
+        self.assertTrue(log.success)
+
+    @override_settings(EMAIL_TIMEOUT=20, CORREO_RESERVA=300)
+    def test_reserva_cubre_el_peor_caso_del_lote(self):
+        self.assertGreater(duracion_reserva(50), 50 * 20)
+        correo = encolar('Aviso', 'cuerpo', 'd@x.com', usuario=self.usuario, registrar=True)
+
+        def otro_worker(mensajes):
+            # la reserva venció durante el envío y otro worker tomó el correo y guardó su resultado
+            CorreoSaliente.objects.filter(pk=correo.pk).update(
+                estado='error', intentos=1, error_message='del otro worker', proximo_intento=timezone.now())
+            return len(mensajes)
+
+        with mock.patch.object(EmailBackend, 'send_messages', side_effect=otro_worker):
+            self.assertEqual(procesar_lote(lote=50), (1, 0))
+        correo.refresh_from_db()
+        self.assertEqual((correo.estado, correo.error_message), ('error', 'del otro worker'))
+        # el resultado lo registra el worker dueño de la reserva, no este
+        self.assertFalse(NotificationLog.objects.exists())
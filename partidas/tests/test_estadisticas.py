@@ -0,0 +1,124 @@
+import threading
+import time
+from datetime import date, timedelta
+
+from django.db import OperationalError, close_old_connections, connection
+
+from django.test import Client, TestCase, TransactionTestCase, override_settings
+from django.urls import reverse
+
+from partidas.estadisticas import AgregadorEstadisticas, get_agregador, registrar_busqueda
+from partidas.models import (
+    LicenciaTemporal, PartidaArancelaria, SearchStatisticDaily, SearchStatisticProductTotal, SearchStatisticTotal,
+    Usuario,
+)
+
+
+FILAS = [
+    (1, '0201.10.00', 'Carne bovina', '02'),
+    (2, '0201.20.00', 'Carne bovina deshuesada', '02'),
+    (3, '1602.50.00', 'Preparaciones de carne', '16'),
+    (4, '', 'Sin código', None),
+]
+
+
+class RegistrarBusquedaTests(TestCase):
+    def test_una_busqueda_suma_uno_por_capitulo_con_consultas_fijas(self):
+        hoy = date(2026, 1, 15)
+        with self.assertNumQueries(8):  # 6 + savepoint/release de la transacción
+            registrar_busqueda(FILAS, fecha=hoy)
+        registrar_busqueda(FILAS[:1], fecha=hoy)
+
+        diarias = dict(SearchStatisticDaily.objects.filter(fecha=hoy).values_list('capitulo', 'count'))
+        self.assertEqual(diarias, {'02': 2, '16': 1, 'Sin capítulo': 1})
+        self.assertEqual(SearchStatisticTotal.objects.get(capitulo='02').total, 2)
+        productos = dict(SearchStatisticProductTotal.objects.values_list('codigo', 'total'))
+        self.assertEqual(productos, {'0201.10.00': 2, '1602.50.00': 1, '4': 1})
+
+    def test_sin_coincidencias_no_consulta(self):
+        with self.assertNumQueries(0):
+            registrar_busqueda([])
+
+
+class AgregadorEstadisticasTests(TestCase):
+    def setUp(self):
+        self.partidas = [
+            PartidaArancelaria.objects.create(capitulo=cap, codigo=cod, descripcion=desc)
+            for pk, cod, desc, cap in FILAS[:3]
+        ]
+        # búsquedas pendientes de otros tests (sus partidas ya no existen)
+        get_agregador().pendientes.clear()
+
+    def test_busquedas_se_acumulan_y_se_aplican_juntas(self):
+        agregador = AgregadorEstadisticas()
+        ids = [p.id for p in self.partidas]
+        hoy = date(2026, 1, 15)
+        agregador.registrar(ids, fecha=hoy)
+        agregador.registrar(ids[:1], fecha=hoy)
+        agregador.registrar(ids[2:], fecha=hoy + timedelta(days=1))
+        self.assertEqual(SearchStatisticTotal.objects.count(), 0)
+
+        self.assertEqual(agregador.vaciar(), 3)
+        self.assertEqual(len(agregador), 0)
+        self.assertEqual(SearchStatisticDaily.objects.get(capitulo='02', fecha=hoy).count, 2)
+        self.assertEqual(dict(SearchStatisticTotal.objects.values_list('capitulo', 'total')), {'02': 2, '16': 2})
+        self.assertEqual(SearchStatisticProductTotal.objects.get(codigo='0201.10.00').total, 2)
+
+    @override_settings(SEARCH_STATS_BUFFER_MAX=2)
+    def test_buffer_lleno_se_vacia_al_registrar(self):
+        agregador = AgregadorEstadisticas()
+        agregador.registrar([self.partidas[0].id])
+        self.assertEqual(len(agregador), 1)
+        agregador.registrar([self.partidas[0].id])
+        self.assertEqual(len(agregador), 0)
+        self.assertEqual(SearchStatisticTotal.objects.get(capitulo='02').total, 2)
+
+    @override_settings(SEARCH_STATS_FLUSH_INTERVAL=3600)
+    def test_la_busqueda_no_escribe_estadisticas(self):
+        user = Usuario.objects.create_user(username='despachante', password='pass1234')
+        LicenciaTemporal.objects.create(usuario=user, fecha_inicio=date.today(), fecha_fin=date.today() + timedelta(days=30), estado=True)
+        client = Client()
+        client.force_login(user)
+        client.get(reverse('buscar_partidas'), {'termino': 'carne'})
+        self.assertEqual(SearchStatisticTotal.objects.count(), 0)
+        self.assertEqual(len(get_agregador()), 1)
+        get_agregador().vaciar()
+        self.assertEqual(SearchStatisticTotal.objects.get(capitulo='02').total, 1)
+
+
+class ContadoresConcurrentesTests(TransactionTestCase):
+    def test_no_se_pierden_incrementos(self):
+        hilos, busquedas = 8, 25
+        hoy = date(2026, 1, 15)
+        errores = []
+
+        def trabajar():
+            try:
+                for _ in range(busquedas):
+                    # la base SQLite en memoria de los tests rechaza escrituras simultáneas en lugar de esperar;
+                    # la transacción fallida no aplica nada, así que se reintenta
+                    while True:
+                        try:
+                            registrar_busqueda(FILAS, fecha=hoy)
+                            break
+                        except OperationalError as e:
+                            if 'locked' not in str(e):
+                                raise
+                            time.sleep(0.001)
+            except Exception as e:
+                errores.append(e)
+            finally:
+                close_old_connections()
+                connection.close()
+
+        threads = [threading.Thread(target=trabajar) for _ in range(hilos)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+
+        self.assertEqual(errores, [])
+        esperado = hilos * busquedas
+        self.assertEqual(SearchStatisticDaily.objects.get(capitulo='02', fecha=hoy).count, esperado)
+        self.assertEqual(SearchStatisticTotal.objects.get(capitulo='16').total, esperado)
+        self.assertEqual(SearchStatisticProductTotal.objects.get(codigo='0201.10.00').total, esperado)
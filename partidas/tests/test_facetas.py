@@ -0,0 +1,23 @@
+from django.core.cache import cache
+from django.test import TestCase
+
+from partidas.facetas import get_facetas
+from partidas.models import PartidaArancelaria
+
+
+class FacetasCacheTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        PartidaArancelaria.objects.create(capitulo='Capítulo 09: Café, té', codigo='0901.11.00', descripcion='Café', gravamen='10%')
+        PartidaArancelaria.objects.create(capitulo='Sin datos', codigo='0201.10.00', descripcion='Carne', gravamen='5%')
+
+    def test_se_calculan_una_vez_y_se_invalidan_al_cambiar_partidas(self):
+        facetas = get_facetas()
+        self.assertEqual(facetas['capitulos'], [('Capítulo 09: Café, té', 'Café, té', 9)])
+        self.assertEqual(sorted(facetas['gravamenes']), ['10%', '5%'])
+
+        with self.assertNumQueries(0):
+            get_facetas()
+
+        PartidaArancelaria.objects.create(capitulo='02', codigo='0202.10.00', descripcion='Carne congelada', gravamen='15%')
+        self.assertIn('15%', get_facetas()['gravamenes'])
@@ -83,3 +83,27 @@ class FeatureTestsNew(TestCase):
         self.assertEqual(resp.status_code, 200)
 
         self.assertTrue(ExportLog.objects.filter(usuario=self.admin_user, accion='export_busquedas_csv').exists())
+
+    def test_log_clicks_registra_lote(self):
+        import json
+        from django.db import connection
+        from django.test.utils import CaptureQueriesContext
+        from partidas.models import ClickLog
+
+        c = Client()
+        self.assertTrue(c.login(username='user1', password='userpass'))
+        eventos = [{'partida_id': self.partida.id, 'termino': 'Prueba'} for _ in range(5)]
+        eventos += [{'partida_id': 999999, 'accion': 'otro'}, {'partida_id': 'x'}]
+        with CaptureQueriesContext(connection) as ctx:
+            resp = c.post(reverse('log_clicks'), {'eventos': json.dumps(eventos)})
+        self.assertEqual(resp.status_code, 204)
+        self.assertEqual(ClickLog.objects.filter(usuario=self.normal_user).count(), 7)
+        self.assertEqual(ClickLog.objects.filter(partida=self.partida, extra='Prueba').count(), 5)
+        self.assertEqual(ClickLog.objects.filter(partida__isnull=True).count(), 2)
+        sqls = [q['sql'] for q in ctx.captured_queries]
+        self.assertEqual(len([s for s in sqls if s.startswith('INSERT') and 'clicklog' in s]), 1)
+        self.assertEqual(len([s for s in sqls if 'FROM "partidas_partidaarancelaria"' in s]), 1)
+
+        resp = c.post(reverse('log_clicks'), data=json.dumps({'eventos': [{}]}), content_type='application/json')
+        self.assertEqual(resp.status_code, 204)
+        self.assertEqual(c.post(reverse('log_clicks'), {'eventos': '{roto'}).status_code, 400)
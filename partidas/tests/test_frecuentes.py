@@ -0,0 +1,80 @@
+import random
+from importlib import import_module
+from collections import Counter
+
+from django.apps import apps
+from django.test import TestCase, override_settings
+from django.urls import reverse
+
+from partidas.frecuentes import CAPITULOS, PRODUCTOS, RastreadorFrecuentes, SpaceSaving
+from partidas.models import ResumenFrecuentes, SearchStatisticProductTotal, Usuario
+
+
+class SpaceSavingTests(TestCase):
+    def test_garantias_de_error(self):
+        rnd = random.Random(7)
+        flujo = [f'p{int(rnd.paretovariate(1.2))}' for _ in range(20000)]
+        reales = Counter(flujo)
+        resumen = SpaceSaving(50)
+        for clave in flujo:
+            resumen.agregar(clave)
+
+        cota = resumen.error_maximo
+        self.assertEqual(cota, len(flujo) // 50)
+        for clave, conteo, error in resumen.top(50):
+            self.assertGreaterEqual(conteo, reales[clave])
+            self.assertLessEqual(conteo - reales[clave], min(error, cota))
+        # todo lo que aparece más de N/k veces está en el resumen
+        for clave, n in reales.items():
+            if n > cota:
+                self.assertIn(clave, resumen.conteos)
+        self.assertEqual([c for c, _, _ in resumen.top(3)], [c for c, _ in reales.most_common(3)])
+
+    def test_combinar_y_serializar(self):
+        a, b = SpaceSaving(3), SpaceSaving(3)
+        for clave, n in [('x', 5), ('y', 3), ('z', 1)]:
+            a.agregar(clave, n)
+        for clave, n in [('x', 2), ('w', 4)]:
+            b.agregar(clave, n)
+        a.combinar(b)
+        self.assertEqual(a.top(2), [('x', 7, 0), ('w', 5, 1)])
+        copia = SpaceSaving.desde_json(a.a_json())
+        self.assertEqual(copia.top(3), a.top(3))
+        self.assertEqual(copia.total, 15)
+
+
+class RastreadorFrecuentesTests(TestCase):
+    def setUp(self):
+        # fila sembrada por la migración 0035 (sin totales en la base de pruebas)
+        self.sembrado = ResumenFrecuentes.objects.get(nombre=PRODUCTOS).datos
+
+    @override_settings(SEARCH_TOPK_ERROR=0.01)
+    def test_guarda_y_combina_con_lo_persistido(self):
+        rastreador = RastreadorFrecuentes()
+        rastreador.registrar({'0901.11.00': 12, '0201.10.00': 10}, {'09': 12, '02': 10})
+        # leer no guarda: lo pendiente se combina en memoria
+        self.assertEqual(rastreador.top(PRODUCTOS, 5), ([('0901.11.00', 12, 0), ('0201.10.00', 10, 0)], 0))
+        self.assertEqual(ResumenFrecuentes.objects.get(nombre=PRODUCTOS).datos, self.sembrado)
+
+        rastreador.guardar()
+        otro = RastreadorFrecuentes()
+        otro.registrar({'0201.10.00': 5}, {'02': 5})
+        otro.guardar()
+        self.assertEqual(otro.top(PRODUCTOS, 1)[0], [('0201.10.00', 15, 0)])
+        self.assertEqual(otro.top(CAPITULOS, 5), ([('02', 15, 0), ('09', 12, 0)], 0))
+        # sin nada pendiente, guardar no vuelve a sumar
+        rastreador.guardar()
+        self.assertEqual(rastreador.top(PRODUCTOS, 1)[0], [('0201.10.00', 15, 0)])
+
+    def test_admin_muestra_ranking(self):
+        admin = Usuario.objects.create_superuser(username='admin', password='pass1234', email='a@a.com')
+        SearchStatisticProductTotal.objects.create(codigo='0201.10.00', descripcion='Carne bovina', capitulo='02', total=3)
+        for i in range(5):
+            SearchStatisticProductTotal.objects.create(codigo=f'0100.0{i}', descripcion='Otro', capitulo='01', total=1)
+        with override_settings(SEARCH_TOPK_ERROR=0.5):  # k = 2
+            import_module('partidas.migrations.0035_sembrar_resumen_frecuentes').sembrar(apps, None)
+        resumen = SpaceSaving.desde_json(ResumenFrecuentes.objects.get(nombre=PRODUCTOS).datos)
+        self.assertEqual((len(resumen), resumen.total), (2, 8))  # el total cuenta todas las filas, no solo el top
+        self.client.force_login(admin)
+        resp = self.client.get(reverse('admin:partidas_searchstatisticproducttotal_changelist'))
+        self.assertContains(resp, 'Carne bovina')
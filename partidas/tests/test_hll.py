@@ -0,0 +1,92 @@
+from datetime import date
+
+from django.test import TestCase
+from django.urls import reverse
+
+from partidas.estadisticas import registrar_busqueda, usuarios_distintos
+from partidas.hll import HyperLogLog, unir
+from partidas.models import SearchStatisticDaily, Usuario
+
+
+class HyperLogLogTests(TestCase):
+    def test_estimacion_dentro_del_error(self):
+        hll = HyperLogLog(10)
+        for i in range(20000):
+            hll.agregar(i)
+        # error típico ~3% con p=10; se admite 3 desviaciones
+        self.assertAlmostEqual(hll.estimar(), 20000, delta=20000 * 0.1)
+
+    def test_pocos_elementos_y_repetidos(self):
+        hll = HyperLogLog(10)
+        for _ in range(3):
+            for i in range(40):
+                hll.agregar(i)
+        self.assertAlmostEqual(hll.estimar(), 40, delta=2)
+        self.assertEqual(HyperLogLog(10).estimar(), 0)
+
+    def test_union_y_serializacion(self):
+        a, b = HyperLogLog(10), HyperLogLog(10)
+        for i in range(0, 3000):
+            a.agregar(i)
+        for i in range(2000, 5000):
+            b.agregar(i)
+        total = unir([a.a_bytes(), None, b.a_bytes()])
+        self.assertAlmostEqual(total.estimar(), 5000, delta=500)
+        self.assertEqual(HyperLogLog.desde_bytes(memoryview(a.a_bytes())).registros, a.registros)
+        with self.assertRaises(ValueError):
+            HyperLogLog(8).reducir(10)
+
+    def test_union_con_distinta_precision(self):
+        a, b = HyperLogLog(12), HyperLogLog(10)
+        for i in range(0, 3000):
+            a.agregar(i)
+        for i in range(2000, 5000):
+            b.agregar(i)
+        # reducir da el mismo sketch que si se hubiera armado con la precisión menor
+        c = HyperLogLog(10)
+        for i in range(0, 3000):
+            c.agregar(i)
+        self.assertEqual(a.reducir(10).registros, c.registros)
+
+        total = unir([a.a_bytes(), b.a_bytes()])
+        self.assertEqual(total.p, 10)
+        self.assertAlmostEqual(total.estimar(), 5000, delta=500)
+
+
+class UsuariosDistintosTests(TestCase):
+    def test_sketches_diarios_se_combinan(self):
+        filas = [(1, '0901.11.00', 'Café', '09')]
+        for dia, usuarios in ((1, [1, 2, 3]), (2, [2, 3, 4]), (3, [9])):
+            for usuario_id in usuarios:
+                registrar_busqueda(filas, fecha=date(2024, 3, dia), usuario_id=usuario_id)
+        registrar_busqueda([(2, '0201.10.00', 'Carne', '02')], fecha=date(2024, 3, 1), usuario_id=1)
+
+        self.assertEqual(SearchStatisticDaily.objects.get(capitulo='09', fecha=date(2024, 3, 1)).count, 3)
+        por_capitulo, total = usuarios_distintos(date(2024, 3, 1), date(2024, 3, 2))
+        self.assertEqual(por_capitulo, {'09': (4, 6), '02': (1, 1)})
+        self.assertEqual(total, 4)
+        self.assertEqual(usuarios_distintos(date(2024, 3, 1), date(2024, 3, 31), ['09'])[0], {'09': (5, 7)})
+
+    def test_sketches_guardados_con_otra_precision(self):
+        filas = [(1, '0901.11.00', 'Café', '09')]
+        with self.settings(SEARCH_HLL_PRECISION=12):
+            for usuario_id in (1, 2, 3):
+                registrar_busqueda(filas, fecha=date(2024, 3, 1), usuario_id=usuario_id)
+        with self.settings(SEARCH_HLL_PRECISION=8):
+            for usuario_id in (3, 4):
+                registrar_busqueda(filas, fecha=date(2024, 3, 2), usuario_id=usuario_id)
+            registrar_busqueda([(2, '0201.10.00', 'Carne', '02')], fecha=date(2024, 3, 2), usuario_id=5)
+        por_capitulo, total = usuarios_distintos(date(2024, 3, 1), date(2024, 3, 2))
+        self.assertEqual(por_capitulo, {'09': (4, 5), '02': (1, 1)})
+        self.assertEqual(total, 5)
+
+    def test_api(self):
+        admin = Usuario.objects.create_superuser(username='admin', password='pass1234', email='a@a.com')
+        registrar_busqueda([(1, '0901.11.00', 'Café', '09')], fecha=date(2024, 3, 5), usuario_id=admin.pk)
+        self.client.force_login(admin)
+        resp = self.client.get(reverse('api_usuarios_distintos'), {'desde': '2024-03-01', 'hasta': '2024-03-31'})
+        data = resp.json()
+        self.assertEqual(data['usuarios_distintos'], 1)
+        self.assertEqual(data['data'], [{'capitulo': '09', 'usuarios': 1, 'busquedas': 1}])
+        resp = self.client.get(reverse('api_usuarios_distintos'), {'desde': 'ayer'})
+        self.assertEqual(resp.status_code, 400)
@@ -0,0 +1,119 @@
+from datetime import date, timedelta
+from io import StringIO
+
+from django.core import mail
+from django.core.management import call_command
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from partidas.principal import SESION_LICENCIA
+from partidas.correo import procesar_pendientes
+from partidas.licencias import avisar_vencimientos, vencer_licencias
+from partidas.models import LicenciaTemporal, NotificationLog, Usuario
+
+
+class VeredictoLicenciaTests(TestCase):
+    def setUp(self):
+        self.usuario = Usuario.objects.create_user(username='u1', password='pass1234')
+        hoy = date.today()
+        self.licencia = LicenciaTemporal.objects.create(usuario=self.usuario, fecha_inicio=hoy,
+                                                        fecha_fin=hoy + timedelta(days=30), estado=True)
+        self.client.force_login(self.usuario)
+
+    def _pedir(self):
+        """Petición liviana (sin plantilla) para medir solo las consultas del middleware."""
+        with CaptureQueriesContext(connection) as ctx:
+            resp = self.client.post(reverse('log_clicks'), {'eventos': '[]'})
+        consultas = [q['sql'] for q in ctx.captured_queries if 'licenciatemporal' in q['sql']]
+        return resp, consultas
+
+    def test_consulta_la_licencia_solo_si_el_veredicto_caduco(self):
+        resp, consultas = self._pedir()
+        self.assertEqual(resp.status_code, 204)
+        self.assertEqual(len(consultas), 1)
+        self.assertEqual(self.client.session[SESION_LICENCIA]['hasta'], self.licencia.fecha_fin.isoformat())
+
+        resp, consultas = self._pedir()
+        self.assertEqual(resp.status_code, 204)
+        self.assertEqual(consultas, [])
+
+        # marcar el aviso no cambia el veredicto
+        self.licencia.notified_pre_expiry = True
+        self.licencia.save(update_fields=['notified_pre_expiry'])
+        self.assertEqual(self._pedir()[1], [])
+
+    def test_cambio_de_licencia_invalida_el_veredicto(self):
+        self._pedir()
+        self.licencia.estado = False
+        self.licencia.save()
+        resp, consultas = self._pedir()
+        self.assertRedirects(resp, reverse('licencia_expirada'), fetch_redirect_response=False)
+        self.assertEqual(len(consultas), 1)
+
+        LicenciaTemporal.objects.create(usuario=self.usuario, fecha_inicio=date.today(),
+                                        fecha_fin=date.today() + timedelta(days=60), estado=True)
+        self.assertEqual(self._pedir()[0].status_code, 204)
+
+    def test_veredicto_vencido_se_vuelve_a_consultar(self):
+        self._pedir()
+        sesion = self.client.session
+        sesion[SESION_LICENCIA] = dict(sesion[SESION_LICENCIA], hasta=(date.today() - timedelta(days=1)).isoformat())
+        sesion.save()
+        resp, consultas = self._pedir()
+        self.assertEqual(resp.status_code, 204)
+        self.assertEqual(len(consultas), 1)
+
+
+class RevisionLicenciasTests(TestCase):
+    def _usuario(self, username, dias, **campos):
+        usuario = Usuario.objects.create_user(username=username, password='pass1234', email=f'{username}@x.com')
+        hoy = date.today()
+        licencia = LicenciaTemporal.objects.create(usuario=usuario, fecha_inicio=hoy - timedelta(days=10),
+                                                   fecha_fin=hoy + timedelta(days=dias), estado=True, **campos)
+        return Usuario.objects.get(pk=usuario.pk), licencia
+
+    def test_vence_licencias_y_actualiza_usuarios(self):
+        vencido, _ = self._usuario('vencido', -1)
+        vigente, _ = self._usuario('vigente', 30)
+        Usuario.objects.filter(pk=vigente.pk).update(estado_licencia=False)
+
+        self.assertEqual(vencer_licencias(), (1, 1, 1))
+        self.assertFalse(LicenciaTemporal.objects.get(usuario=vencido).estado)
+        self.assertEqual(Usuario.objects.get(pk=vencido.pk).licencia_version, vencido.licencia_version + 1)
+        self.assertEqual(dict(Usuario.objects.values_list('username', 'estado_licencia')),
+                         {'vencido': False, 'vigente': True})
+        self.assertEqual(vencer_licencias(), (0, 0, 0))
+
+    def test_avisos_en_lote(self):
+        _, por_vencer = self._usuario('u1', 1)
+        _, vence_hoy = self._usuario('u2', 0)
+        self._usuario('u3', 1, notified_pre_expiry=True)
+        self._usuario('u4', 10)
+
+        # licencias, CorreoSaliente y bulk_update (con su savepoint) y la búsqueda del siguiente lote
+        with self.assertNumQueries(6):
+            self.assertEqual(avisar_vencimientos(), 2)
+        self.assertEqual(len(mail.outbox), 0)  # solo se encolan
+        self.assertTrue(all(LicenciaTemporal.objects.get(pk=lic.pk).notified_pre_expiry for lic in (por_vencer, vence_hoy)))
+        self.assertEqual(avisar_vencimientos(), 0)
+
+        salida = StringIO()
+        call_command('revisar_licencias', stdout=salida)
+        self.assertIn('Avisos de vencimiento encolados: 0', salida.getvalue())
+
+        self.assertEqual(procesar_pendientes(), (2, 0))
+        self.assertEqual(sorted(m.to[0] for m in mail.outbox), ['u1@x.com', 'u2@x.com'])
+        self.assertIn('faltan 2 días', next(m.body for m in mail.outbox if m.to == ['u1@x.com']))
+        self.assertEqual(NotificationLog.objects.filter(success=True).count(), 2)
+
+    def test_aviso_en_inicio_sigue_los_dias_configurados(self):
+        usuario, _ = self._usuario('u1', 4)  # vence en 5 días contando el de vencimiento
+        self.client.force_login(usuario)
+        for dias, avisa in ((3, False), (7, True)):
+            with self.settings(LICENCIA_AVISO_DIAS=dias):
+                resp = self.client.get(reverse('inicio'))
+            avisos = [str(m) for m in resp.context['messages'] if 'vence en 5 días' in str(m)]
+            self.assertEqual(bool(avisos), avisa, dias)
+            self.assertEqual(avisar_vencimientos(dias=dias) > 0, avisa)
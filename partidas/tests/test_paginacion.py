@@ -0,0 +1,141 @@
+from django.test import TestCase, Client, override_settings
+from django.urls import reverse
+
+from datetime import date, timedelta
+
+from partidas.bitacora import get_bitacora
+from partidas.models import Usuario, PartidaArancelaria, LicenciaTemporal, Busqueda
+
+
+@override_settings(SEARCH_PAGE_SIZE=4, SEARCH_PAGE_SIZE_MAX=5)
+class PaginacionBusquedaTests(TestCase):
+    def setUp(self):
+        get_bitacora().pendientes.clear()
+        self.user = Usuario.objects.create_user(username='despachante', password='pass1234')
+        hoy = date.today()
+        LicenciaTemporal.objects.create(usuario=self.user, fecha_inicio=hoy, fecha_fin=hoy + timedelta(days=30), estado=True)
+        for i in range(10):
+            PartidaArancelaria.objects.create(capitulo='04', codigo=f'0401.{i:02d}', descripcion=f'Leche tipo {i}', ace22_chi_prot='10; 20')
+        self.client = Client()
+        self.client.force_login(self.user)
+
+    def _recorrer(self, params):
+        url = reverse('buscar_partidas')
+        paginas = []
+        resp = self.client.get(url, params)
+        while True:
+            paginas.append([p.codigo for p in resp.context['resultados']])
+            if not resp.context['url_siguiente']:
+                return paginas, resp
+            resp = self.client.get(url + resp.context['url_siguiente'])
+
+    # la bitácora se guarda al terminar cada petición
+    @override_settings(BITACORA_FLUSH_INTERVAL=0)
+    def test_recorrido_por_termino_sin_repetidos(self):
+        paginas, ultima = self._recorrer({'termino': 'leche'})
+        self.assertEqual([len(p) for p in paginas], [4, 4, 2])
+        codigos = [c for p in paginas for c in p]
+        self.assertEqual(sorted(codigos), [f'0401.{i:02d}' for i in range(10)])
+        self.assertEqual(Busqueda.objects.count(), 1)
+
+        anterior = self.client.get(reverse('buscar_partidas') + ultima.context['url_anterior'])
+        self.assertEqual([p.codigo for p in anterior.context['resultados']], paginas[1])
+
+    def test_recorrido_por_filtro_ordenado_por_codigo(self):
+        paginas, _ = self._recorrer({'capitulo': '04', 'por_pagina': '50'})
+        self.assertEqual([len(p) for p in paginas], [5, 5])
+        self.assertEqual(paginas[0][0], '0401.00')
+        self.assertEqual(paginas[1][-1], '0401.09')
+
+    def test_termino_con_filtro_sin_lista_de_ids(self):
+        from django.db import connection
+        from django.test.utils import CaptureQueriesContext
+
+        for i in range(3):
+            PartidaArancelaria.objects.create(capitulo='05', codigo=f'0501.{i:02d}', descripcion=f'Leche en polvo {i}')
+        url = reverse('buscar_partidas')
+        siguiente, paginas, consultas = '?termino=leche&capitulo=04', [], []
+        while siguiente:
+            # cada petición reinicia el registro de consultas de la conexión
+            with CaptureQueriesContext(connection) as ctx:
+                resp = self.client.get(url + siguiente)
+            consultas += ctx.captured_queries
+            paginas.append([p.codigo for p in resp.context['resultados']])
+            siguiente = resp.context['url_siguiente']
+        self.assertEqual(sorted(c for p in paginas for c in p), [f'0401.{i:02d}' for i in range(10)])
+        anterior = self.client.get(url + resp.context['url_anterior'])
+        self.assertEqual([p.codigo for p in anterior.context['resultados']], paginas[1])
+        # el filtro va a la base de datos sin la lista de ids del término
+        filtradas = [q['sql'] for q in consultas if '"capitulo" LIKE' in q['sql']]
+        self.assertTrue(filtradas)
+        for sql in filtradas:
+            self.assertNotIn(' IN (', sql)
+
+    def test_ace22_solo_en_pagina_visible(self):
+        resp = self.client.get(reverse('buscar_partidas'), {'termino': 'leche', 'despues': 'no-es-un-cursor'})
+        resultados = resp.context['resultados']
+        self.assertEqual(len(resultados), 4)
+        self.assertEqual(resultados[0].ace22_chi, '10')
+
+    def test_relacionadas_excluye_solo_la_pagina_visible(self):
+        from django.db import connection
+        from django.test.utils import CaptureQueriesContext
+
+        PartidaArancelaria.objects.create(capitulo='04', codigo='0402.00', descripcion='Queso')
+        with CaptureQueriesContext(connection) as ctx:
+            resp = self.client.get(reverse('buscar_partidas'), {'termino': 'leche'})
+        visibles = {p.id for p in resp.context['resultados']}
+        relacionadas = list(resp.context['relacionadas'])
+        self.assertTrue(relacionadas)
+        self.assertFalse(visibles & {p.id for p in relacionadas})
+        sql, = [q['sql'] for q in ctx.captured_queries if 'NOT' in q['sql'] and 'LIMIT 15' in q['sql']]
+        self.assertEqual(sql.split(' NOT ', 1)[1].count(','), len(visibles) - 1)
+
+    @override_settings(BITACORA_FLUSH_INTERVAL=0, SEARCH_SNAPSHOT_TOP=3)
+    def test_instantanea_en_busqueda_e_historial(self):
+        from unittest import mock
+        from partidas.catalogo import get_generacion
+
+        resp = self.client.get(reverse('buscar_partidas'), {'termino': 'leche'})
+        b = Busqueda.objects.get()
+        self.assertEqual(b.total_resultados, 10)
+        self.assertEqual(b.generacion_catalogo, get_generacion())
+        primeros = [p.id for p in resp.context['resultados'][:3]]
+        self.assertEqual(b.ids_resultados, primeros)
+
+        with mock.patch('partidas.views.get_search_backend') as backend:
+            historial = self.client.get(reverse('historial_buscador')).context['historial']
+        backend.assert_not_called()
+        self.assertEqual([p.id for p in historial[0]['matches']], primeros)
+
+    @override_settings(SEARCH_BACKEND='partidas.search_backends.SQLiteFTS5Backend')
+    def test_historial_con_consultas_constantes(self):
+        from django.db import connection
+        from django.test.utils import CaptureQueriesContext
+
+        def contar():
+            with CaptureQueriesContext(connection) as ctx:
+                resp = self.client.get(reverse('historial_buscador'))
+            return len(ctx.captured_queries), resp.context['historial']
+
+        # búsquedas anteriores a las instantáneas: todos los términos se resuelven en una consulta del backend
+        Busqueda.objects.create(usuario=self.user, termino_buscado='leche', tipo_busqueda='Texto')
+        contar()  # construye el motor de ranking del proceso
+        consultas, historial = contar()
+        self.assertEqual(len(historial[0]['matches']), 10)
+        self.assertEqual(historial[0]['matches'][0].ace22_chi, '10')
+
+        for i in range(9):
+            Busqueda.objects.create(usuario=self.user, termino_buscado=f'leche tipo {i}', tipo_busqueda='Texto')
+        consultas_10, historial = contar()
+        self.assertEqual(len(historial), 10)
+        self.assertEqual(consultas_10, consultas)
+        self.assertEqual({p.codigo for e in historial[:9] for p in e['matches']}, {f'0401.{i:02d}' for i in range(9)})
+
+        # con instantánea, las partidas de todas las entradas salen de la misma consulta
+        for i in range(10):
+            Busqueda.objects.create(usuario=self.user, termino_buscado=f'leche tipo {i}', tipo_busqueda='Texto',
+                                    ids_top=Busqueda.empaquetar_ids([PartidaArancelaria.objects.get(codigo=f'0401.{i:02d}').pk]))
+        consultas_20, historial = contar()
+        self.assertEqual(len(historial), 20)
+        self.assertEqual(consultas_20, consultas)
@@ -1,9 +1,11 @@
-from django.test import TestCase, Client
+from django.test import TestCase, Client, override_settings
 from django.urls import reverse
+from partidas.bitacora import get_bitacora
 from partidas.models import PartidaArancelaria, Rol, Usuario, HistoriaActividad
 
 class PartidasCrudTests(TestCase):
     def setUp(self):
+        get_bitacora().pendientes.clear()
         self.client = Client()
         self.rol = Rol.objects.create(nombre='Administrador', descripcion_permisos='full')
         self.user = Usuario.objects.create_user(username='admin2', password='pass1234', rol=self.rol)
@@ -20,6 +22,8 @@ class PartidasCrudTests(TestCase):
         )
         self.client.force_login(self.user)
 
+    # la bitácora se guarda al terminar cada petición
+    @override_settings(BITACORA_FLUSH_INTERVAL=0)
     def test_create_edit_delete_partida_and_history(self):
 
         resp_inicio = self.client.get(reverse('inicio'))
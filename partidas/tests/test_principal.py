@@ -0,0 +1,62 @@
+from datetime import date, timedelta
+
+from django.core import mail
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from partidas.models import LicenciaTemporal, Rol, Usuario
+
+
+class PrincipalConsultasTests(TestCase):
+    """Cada página carga usuario y rol en una consulta y la licencia a lo sumo en otra."""
+
+    def _crear(self, username, rol, dias):
+        usuario = Usuario.objects.create_user(username=username, password='pass1234', email=f'{username}@x.com',
+                                              rol=Rol.objects.create(nombre=rol, descripcion_permisos=''))
+        LicenciaTemporal.objects.create(usuario=usuario, fecha_inicio=date.today(),
+                                        fecha_fin=date.today() + timedelta(days=dias), estado=True)
+        self.client.login(username=username, password='pass1234')
+        return usuario
+
+    def _consultas(self, url):
+        with CaptureQueriesContext(connection) as ctx:
+            resp = self.client.get(url)
+        self.assertEqual(resp.status_code, 200)
+        por_tabla = {'usuario': 0, 'rol': 0, 'licencia': 0}
+        for q in ctx.captured_queries:
+            desde = q['sql'].split(' FROM ', 1)[-1]
+            if desde.startswith('"partidas_usuario"'):
+                por_tabla['usuario'] += 1
+                self.assertIn('"partidas_rol"', desde)  # el rol llega con el usuario
+            elif desde.startswith('"partidas_rol"'):
+                por_tabla['rol'] += 1
+            elif desde.startswith('"partidas_licenciatemporal"'):
+                por_tabla['licencia'] += 1
+        return por_tabla
+
+    def test_inicio_con_licencia_por_vencer(self):
+        self._crear('despachante', 'Despachante', 2)
+        # middleware, context processor y vista comparten la misma consulta de licencias
+        self.assertEqual(self._consultas(reverse('inicio')), {'usuario': 1, 'rol': 0, 'licencia': 1})
+        self.assertEqual(len(mail.outbox), 0)  # el correo lo envía la revisión nocturna
+        self.assertEqual(self._consultas(reverse('inicio')), {'usuario': 1, 'rol': 0, 'licencia': 0})
+
+    def test_pagina_con_rol_requerido(self):
+        self._crear('admin1', 'Administrador', 30)
+        self.assertEqual(self._consultas(reverse('panel_partidas')), {'usuario': 1, 'rol': 0, 'licencia': 1})
+        self.assertEqual(self._consultas(reverse('panel_partidas')), {'usuario': 1, 'rol': 0, 'licencia': 0})
+        self.assertEqual(self._consultas(reverse('inicio')), {'usuario': 1, 'rol': 0, 'licencia': 0})
+
+    def test_rol_distinto_no_entra(self):
+        self._crear('despachante', 'Despachante', 30)
+        self.assertEqual(self.client.get(reverse('panel_partidas')).status_code, 403)
+
+
+    def test_sesion_iniciada_con_model_backend(self):
+        # sesiones abiertas antes de UsuarioBackend: siguen válidas mientras ModelBackend esté configurado
+        usuario = self._crear('despachante', 'Despachante', 30)
+        self.client.logout()
+        self.client.force_login(usuario, backend='django.contrib.auth.backends.ModelBackend')
+        self.assertEqual(self.client.get(reverse('inicio')).status_code, 200)
@@ -0,0 +1,49 @@
+from django.test import TestCase, Client, override_settings
+from django.urls import reverse
+
+from datetime import date, timedelta
+
+from partidas.models import Usuario, PartidaArancelaria, LicenciaTemporal
+from partidas.ranking import MotorBM25
+
+
+class MotorBM25Tests(TestCase):
+    def setUp(self):
+        self.motor = MotorBM25.desde_filas([
+            (1, '0401.10.00', 'Leche y nata sin concentrar, con un contenido de materias grasas inferior al 1%', 'Capitulo 4: Leche y productos lácteos'),
+            (2, '0402.10.00', 'Leche en polvo', 'Capitulo 4: Leche y productos lácteos'),
+            (3, '1901.10.00', 'Preparaciones para la alimentación infantil a base de harina, leche', 'Capitulo 19: Preparaciones a base de cereales'),
+            (4, '0201.10.00', 'Carne bovina en canales', 'Capitulo 2: Carne y despojos comestibles'),
+        ])
+
+    def test_descripcion_corta_y_capitulo_pesan_mas(self):
+        self.assertEqual(self.motor.ordenar('leche', {1, 2, 3}), [2, 1, 3])
+
+    def test_codigo_tiene_prioridad(self):
+        self.assertEqual(self.motor.ordenar('0402', {2, 4})[0], 2)
+
+    def test_top_k_y_pesos_configurables(self):
+        self.assertEqual(self.motor.ordenar('leche', {1, 2, 3}, k=1), [2])
+        sin_descripcion = {'codigo': 0, 'descripcion': 0, 'capitulo': 1.0}
+        self.assertEqual(self.motor.ordenar('leche', {2, 3}, boosts=sin_descripcion), [2, 3])
+        self.assertEqual(self.motor.puntuar('leche', {3}, boosts={'capitulo': 1.0}), {})
+
+
+class BuscarRankingTests(TestCase):
+    def setUp(self):
+        self.user = Usuario.objects.create_user(username='despachante', password='pass1234')
+        hoy = date.today()
+        LicenciaTemporal.objects.create(usuario=self.user, fecha_inicio=hoy, fecha_fin=hoy + timedelta(days=30), estado=True)
+        for i in range(5):
+            PartidaArancelaria.objects.create(capitulo='19', codigo=f'1901.{i:02d}', descripcion=f'Preparaciones alimenticias variadas número {i} con leche')
+        PartidaArancelaria.objects.create(capitulo='04', codigo='0402.10', descripcion='Leche en polvo')
+        self.client = Client()
+        self.client.force_login(self.user)
+
+    @override_settings(SEARCH_PAGE_SIZE=3)
+    def test_resultados_ordenados_por_relevancia(self):
+        resp = self.client.get(reverse('buscar_partidas'), {'termino': 'leche'})
+        resultados = resp.context['resultados']
+        self.assertEqual(len(resultados), 3)
+        self.assertEqual(resultados[0].codigo, '0402.10')
+        self.assertEqual(resp.context['total_resultados'], 6)
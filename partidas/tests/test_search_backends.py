@@ -0,0 +1,61 @@
+from django.test import TestCase, override_settings
+
+from partidas.models import PartidaArancelaria
+from partidas.search_backends import (
+    ColumnasNormalizadasBackend, IndiceMemoriaBackend, PostgresFTSBackend, SQLiteFTS5Backend, get_search_backend,
+)
+
+
+class SearchBackendsTests(TestCase):
+    def setUp(self):
+        self.cafe = PartidaArancelaria.objects.create(capitulo='09', codigo='0901.11.00', descripcion='Café sin tostar')
+        self.tostado = PartidaArancelaria.objects.create(capitulo='09', codigo='0901.21.00', descripcion='Café tostado')
+        self.carne = PartidaArancelaria.objects.create(capitulo='02', codigo='0201.10.00', descripcion='Carne bovina fresca')
+
+    def test_fts5_coincide_con_indice_en_memoria(self):
+        memoria = IndiceMemoriaBackend()
+        fts = SQLiteFTS5Backend()
+        for termino in ('cafe', 'CAFÉ tost', '0901', '0901.21', 'bovina', 'inexistente'):
+            self.assertEqual(fts.buscar(termino), memoria.buscar(termino), termino)
+        self.assertEqual(fts.buscar_codigo('cafe'), set())
+
+    def test_columnas_normalizadas(self):
+        self.assertEqual((self.cafe.descripcion_norm, self.cafe.codigo_norm), ('cafe sin tostar', '09011100'))
+        self.tostado.descripcion = 'LÁCTEOS Tostados'
+        self.tostado.save(update_fields=['descripcion'])
+        self.tostado.refresh_from_db()
+        self.assertEqual(self.tostado.descripcion_norm, 'lacteos tostados')
+
+        memoria = IndiceMemoriaBackend()
+        normalizadas = ColumnasNormalizadasBackend()
+        for termino in ('cafe', 'CAFÉ tost', 'lácteos', '0901', '0901.21', 'bovina', 'ostar', 'inexistente'):
+            self.assertEqual(normalizadas.buscar(termino), memoria.buscar(termino), termino)
+        self.assertEqual(list(PartidaArancelaria.objects.filter(codigo_norm='09011100')), [self.cafe])
+
+    def test_triggers_mantienen_fts_sincronizado(self):
+        fts = SQLiteFTS5Backend()
+        self.carne.descripcion = 'Carne porcina'
+        self.carne.save()
+        self.assertEqual(fts.buscar('bovina'), set())
+        self.assertEqual(fts.buscar('porcina'), {self.carne.id})
+
+        self.tostado.delete()
+        self.assertEqual(fts.buscar('cafe'), {self.cafe.id})
+
+        qs = fts.filtrar(PartidaArancelaria.objects.all(), 'cafe')
+        self.assertEqual(list(qs.values_list('id', flat=True)), [self.cafe.id])
+
+    def test_buscar_varios_en_una_consulta(self):
+        terminos = ['cafe', 'CAFÉ tost', '0201', 'inexistente', '']
+        esperado = IndiceMemoriaBackend().buscar_varios(terminos)
+        for backend in (SQLiteFTS5Backend(), ColumnasNormalizadasBackend()):
+            with self.assertNumQueries(1):
+                self.assertEqual(backend.buscar_varios(terminos), esperado, backend.nombre)
+
+    def test_expresion_tsquery_postgres(self):
+        expr = PostgresFTSBackend().expresion_tsquery('Café tostado')
+        self.assertEqual(expr, 'cafetostado:*A | (cafe:*B & tostado:*B)')
+
+    @override_settings(SEARCH_BACKEND='partidas.search_backends.SQLiteFTS5Backend')
+    def test_backend_configurable(self):
+        self.assertIsInstance(get_search_backend(), SQLiteFTS5Backend)
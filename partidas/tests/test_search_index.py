@@ -0,0 +1,110 @@
+from django.test import TestCase, Client
+from django.urls import reverse
+
+from datetime import date, timedelta
+
+from partidas.models import Usuario, PartidaArancelaria, LicenciaTemporal
+from partidas.search_index import IndiceCodigos, IndiceInvertido, get_indice
+
+
+class IndiceInvertidoTests(TestCase):
+    def setUp(self):
+        self.indice = IndiceInvertido.desde_filas([
+            (1, '0901.11.00', 'Café sin tostar, sin descafeinar'),
+            (2, '0901.21.00', 'Café tostado sin descafeinar'),
+            (3, '0201.10.00', 'Carne de animales de la especie bovina, fresca'),
+        ])
+
+    def test_busqueda_sin_acentos_ni_mayusculas(self):
+        self.assertEqual(self.indice.buscar('CAFE'), {1, 2})
+        self.assertEqual(self.indice.buscar('café'), {1, 2})
+
+    def test_varios_terminos_se_combinan_con_and(self):
+        self.assertEqual(self.indice.buscar('cafe tostado'), {2})
+        self.assertEqual(self.indice.buscar('cafe bovina'), set())
+
+    def test_prefijo_de_codigo_ignora_puntos(self):
+        self.assertEqual(self.indice.buscar('0901'), {1, 2})
+        self.assertEqual(self.indice.buscar('0901.21'), {2})
+        self.assertEqual(self.indice.buscar_codigo('carne'), set())
+
+
+class BuscarConIndiceTests(TestCase):
+    def setUp(self):
+        self.user = Usuario.objects.create_user(username='despachante', password='pass1234')
+        hoy = date.today()
+        LicenciaTemporal.objects.create(usuario=self.user, fecha_inicio=hoy, fecha_fin=hoy + timedelta(days=30), estado=True)
+        PartidaArancelaria.objects.create(capitulo='09', codigo='0901.11.00', descripcion='Café sin tostar')
+        self.client = Client()
+        self.client.force_login(self.user)
+
+    def test_buscar_encuentra_con_acentos_y_refleja_cambios(self):
+        resp = self.client.get(reverse('buscar_partidas'), {'termino': 'cafe'})
+        self.assertEqual(resp.status_code, 200)
+        self.assertEqual([p.codigo for p in resp.context['resultados']], ['0901.11.00'])
+
+        PartidaArancelaria.objects.create(capitulo='09', codigo='0901.21.00', descripcion='Café tostado')
+        self.assertEqual(len(get_indice().buscar('cafe')), 2)
+
+
+class IndiceCodigosTests(TestCase):
+    def setUp(self):
+        self.codigos = IndiceCodigos([
+            (1, '0101.21.00.00'),
+            (2, '0101.29.10.00'),
+            (3, '0101'),
+            (4, '0102.21.00.00'),
+            (5, '0101.21'),
+        ])
+
+    def test_prefijo_ordenado_por_longitud_y_codigo(self):
+        self.assertEqual(self.codigos.prefijo('0101'), [3, 5, 1, 2])
+        self.assertEqual(self.codigos.prefijo('0101.21'), [5, 1])
+        self.assertEqual(self.codigos.prefijo('0101', limite=2), [3, 5])
+        self.assertEqual(self.codigos.prefijo('0103'), [])
+
+    def test_exacto(self):
+        self.assertEqual(self.codigos.exacto('0101 21 00 00'), [1])
+        self.assertEqual(self.codigos.exacto('0101.2'), [])
+
+
+class AutocompleteCodigoTests(TestCase):
+    def test_autocomplete_por_prefijo_de_codigo(self):
+        PartidaArancelaria.objects.create(codigo='0101.29.10.00', descripcion='Caballos - Para carrera')
+        PartidaArancelaria.objects.create(codigo='0101.21.00.00', descripcion='Caballos - Reproductores')
+        PartidaArancelaria.objects.create(codigo='0201.10.00.00', descripcion='Carne 0101')
+        resp = self.client.get(reverse('api_autocomplete'), {'q': '010121'})
+        self.assertEqual([r['codigo'] for r in resp.json()['results']], ['0101.21.00.00'])
+        resp = self.client.get(reverse('api_autocomplete'), {'q': '0101'})
+        self.assertEqual([r['codigo'] for r in resp.json()['results']], ['0101.21.00.00', '0101.29.10.00'])
+
+
+class BusquedaAproximadaTests(TestCase):
+    def setUp(self):
+        self.indice = IndiceInvertido.desde_filas([
+            (1, '0201.10.00', 'Carne de animales de la especie bovina'),
+            (2, '8471.30.00', 'Computadoras portátiles'),
+            (3, '0901.11.00', 'Café sin tostar'),
+        ])
+
+    def test_corrige_palabras_mal_escritas(self):
+        self.assertEqual(self.indice.buscar('carme'), set())
+        self.assertEqual(self.indice.buscar_aproximado('carme'), ({1}, 'carne'))
+        self.assertEqual(self.indice.buscar_aproximado('computadra'), ({2}, 'computadoras'))
+        self.assertEqual(self.indice.buscar_aproximado('carme bovina'), ({1}, 'carne bovina'))
+        self.assertEqual(self.indice.buscar_aproximado('xyzw'), (set(), 'xyzw'))
+
+    def test_buscar_y_autocomplete_usan_coincidencia_aproximada(self):
+        user = Usuario.objects.create_user(username='despachante', password='pass1234')
+        hoy = date.today()
+        LicenciaTemporal.objects.create(usuario=user, fecha_inicio=hoy, fecha_fin=hoy + timedelta(days=30), estado=True)
+        PartidaArancelaria.objects.create(capitulo='84', codigo='8471.30.00', descripcion='Computadoras portátiles')
+        client = Client()
+        client.force_login(user)
+
+        resp = client.get(reverse('buscar_partidas'), {'termino': 'computadra'})
+        self.assertEqual([p.codigo for p in resp.context['resultados']], ['8471.30.00'])
+        self.assertEqual(resp.context['termino_corregido'], 'computadoras')
+
+        resp = client.get(reverse('api_autocomplete'), {'q': 'computadra'})
+        self.assertEqual([r['codigo'] for r in resp.json()['results']], ['8471.30.00'])
@@ -0,0 +1,118 @@
+import json
+import os
+import uuid
+from datetime import date, datetime, timedelta
+
+from django.core.cache import cache
+from django.test import TestCase
+from django.urls import reverse
+from django.utils import timezone
+
+from partidas.bitacora import BUSQUEDA, get_bitacora
+from partidas.models import Busqueda, SearchStatisticDaily, Usuario
+from partidas.series import get_cache, serie_busquedas
+
+
+def _busqueda(usuario, cuando):
+    b = Busqueda.objects.create(usuario=usuario, termino_buscado='cafe', tipo_busqueda='descripcion')
+    Busqueda.objects.filter(pk=b.pk).update(fecha=cuando)
+
+
+class SerieBusquedasTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        get_cache().clear()
+        self.usuario = Usuario.objects.create_user(username='u1', password='pass1234', email='u1@a.com')
+
+    def test_total_por_hora_y_dia(self):
+        for hora, minuto in ((9, 5), (9, 40), (14, 0)):
+            _busqueda(self.usuario, timezone.make_aware(datetime(2024, 3, 4, hora, minuto)))
+        _busqueda(self.usuario, timezone.make_aware(datetime(2024, 3, 6, 23, 59)))
+
+        por_hora = serie_busquedas('hora', date(2024, 3, 4), date(2024, 3, 4))
+        puntos = dict(por_hora['series'][0]['puntos'])
+        self.assertEqual(len(puntos), 24)
+        self.assertEqual(puntos[timezone.make_aware(datetime(2024, 3, 4, 9)).isoformat()], 2)
+        self.assertEqual(sum(puntos.values()), 3)
+
+        por_dia = serie_busquedas('dia', date(2024, 3, 4), date(2024, 3, 7))
+        self.assertEqual(por_dia['series'][0]['puntos'],
+                         [['2024-03-04', 3], ['2024-03-05', 0], ['2024-03-06', 1], ['2024-03-07', 0]])
+        # reducido a 2 puntos se suman intervalos consecutivos
+        reducido = serie_busquedas('dia', date(2024, 3, 4), date(2024, 3, 7), puntos=2)
+        self.assertEqual(reducido['agrupados'], 2)
+        self.assertEqual(reducido['series'][0]['puntos'], [['2024-03-04', 3], ['2024-03-06', 1]])
+
+    def test_intervalos_cerrados_no_se_recalculan(self):
+        _busqueda(self.usuario, timezone.make_aware(datetime(2024, 3, 4, 10)))
+        serie_busquedas('dia', date(2024, 3, 4), date(2024, 3, 4))
+        with self.assertNumQueries(0):
+            resultado = serie_busquedas('dia', date(2024, 3, 4), date(2024, 3, 4))
+        self.assertEqual(resultado['series'][0]['puntos'], [['2024-03-04', 1]])
+
+        # el día en curso no se cachea
+        _busqueda(self.usuario, timezone.now())
+        hoy = timezone.localdate()
+        self.assertEqual(serie_busquedas('dia', hoy, hoy)['series'][0]['puntos'][0][1], 1)
+        _busqueda(self.usuario, timezone.now())
+        self.assertEqual(serie_busquedas('dia', hoy, hoy)['series'][0]['puntos'][0][1], 2)
+
+    def test_un_mes_por_hora_queda_en_el_cache(self):
+        _busqueda(self.usuario, timezone.make_aware(datetime(2024, 3, 4, 10)))
+        desde, hasta = date(2024, 3, 1), date(2024, 3, 30)
+        self.assertEqual(len(serie_busquedas('hora', desde, hasta, puntos=720)['series'][0]['puntos']), 720)
+        with self.assertNumQueries(0):
+            resultado = serie_busquedas('hora', desde, hasta)
+        self.assertEqual(sum(n for _, n in resultado['series'][0]['puntos']), 1)
+
+    def test_busquedas_pendientes_en_bitacora_no_cierran_el_intervalo(self):
+        bitacora = get_bitacora()
+        bitacora.vaciar()
+        bitacora.registrar(BUSQUEDA, usuario_id=self.usuario.pk, termino_buscado='cafe', tipo_busqueda='descripcion',
+                           fecha=timezone.make_aware(datetime(2024, 3, 4, 10)))
+        self.assertEqual(serie_busquedas('dia', date(2024, 3, 4), date(2024, 3, 4))['series'][0]['puntos'],
+                         [['2024-03-04', 0]])
+        bitacora.vaciar()
+        self.assertEqual(serie_busquedas('dia', date(2024, 3, 4), date(2024, 3, 4))['series'][0]['puntos'],
+                         [['2024-03-04', 1]])
+        with self.assertNumQueries(0):
+            serie_busquedas('dia', date(2024, 3, 4), date(2024, 3, 4))
+
+    def test_spool_abandonado_se_revisa_al_iniciar_el_proceso(self):
+        # spool de otro proceso que terminó sin guardar una búsqueda del 5 de marzo
+        bitacora = get_bitacora()
+        os.makedirs(bitacora.directorio, exist_ok=True)
+        ruta = os.path.join(bitacora.directorio, f'0-{uuid.uuid4().hex}.jsonl')
+        registro = {'tipo': BUSQUEDA, 'campos': {
+            'usuario_id': self.usuario.pk, 'termino_buscado': 'cafe', 'tipo_busqueda': 'descripcion',
+            'fecha': timezone.make_aware(datetime(2024, 3, 5, 10)).isoformat()}}
+        with open(ruta, 'w', encoding='utf-8') as archivo:
+            archivo.write(json.dumps(registro) + '\n')
+
+        bitacora.recuperado = False  # como en un proceso recién iniciado
+        self.assertEqual(serie_busquedas('dia', date(2024, 3, 5), date(2024, 3, 5))['series'][0]['puntos'],
+                         [['2024-03-05', 1]])
+        self.assertFalse(os.path.exists(ruta))
+
+    def test_por_capitulo_y_semana(self):
+        lunes = date(2024, 3, 4)
+        for i, n in enumerate((2, 3, 0, 0, 0, 0, 1, 4)):
+            SearchStatisticDaily.objects.create(capitulo='09', fecha=lunes + timedelta(days=i), count=n)
+        SearchStatisticDaily.objects.create(capitulo='02', fecha=lunes, count=7)
+
+        data = serie_busquedas('semana', date(2024, 3, 6), date(2024, 3, 12), capitulos=['09', '02'])
+        series = {s['nombre']: s['puntos'] for s in data['series']}
+        self.assertEqual(series['09'], [['2024-03-04', 6], ['2024-03-11', 4]])
+        self.assertEqual(series['02'], [['2024-03-04', 7], ['2024-03-11', 0]])
+        with self.assertRaises(ValueError):
+            serie_busquedas('hora', lunes, lunes, capitulos=['09'])
+
+    def test_api(self):
+        admin = Usuario.objects.create_superuser(username='admin', password='pass1234', email='a@a.com')
+        _busqueda(admin, timezone.make_aware(datetime(2024, 3, 4, 10)))
+        self.client.force_login(admin)
+        resp = self.client.get(reverse('api_serie_busquedas'),
+                               {'desde': '2024-03-04', 'hasta': '2024-03-05', 'intervalo': 'dia'})
+        self.assertEqual(resp.json()['series'], [{'nombre': 'total', 'puntos': [['2024-03-04', 1], ['2024-03-05', 0]]}])
+        resp = self.client.get(reverse('api_serie_busquedas'), {'intervalo': 'mes'})
+        self.assertEqual(resp.status_code, 400)
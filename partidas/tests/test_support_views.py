@@ -3,6 +3,7 @@ from django.urls import reverse
 from django.contrib.auth import get_user_model
 from unittest.mock import patch
 
+from partidas.correo import procesar_pendientes
 from partidas.models import SolicitudSoporte
 
 
@@ -28,7 +29,9 @@ class SupportViewTests(TestCase):
 
         s = SolicitudSoporte.objects.filter(correo__icontains='tester@example.com').first()
         self.assertIsNotNone(s, 'SolicitudSoporte no creada')
+        self.assertEqual(s.estado, 'pending')  # el correo queda en la bandeja de salida
 
+        procesar_pendientes()
         s.refresh_from_db()
         self.assertEqual(s.estado, 'sent')
 
@@ -50,7 +53,8 @@ class SupportViewTests(TestCase):
         self.client.logout()
         self.login()
 
-    @patch('partidas.views.send_mail')
+    @override_settings(CORREO_MAX_INTENTOS=1)
+    @patch('django.core.mail.backends.locmem.EmailBackend.send_messages')
     def test_soporte_submit_marks_error_on_email_failure(self, mock_send):
 
         mock_send.side_effect = Exception('SMTP failure')
@@ -58,6 +62,7 @@ class SupportViewTests(TestCase):
         url = reverse('soporte_submit')
         data = {'nombre': 'Tester Nombre', 'email': 'tester@example.com', 'subject': 'Prueba error', 'message': 'Mensaje que hará fallar'}
         resp = self.client.post(url, data, follow=True)
+        procesar_pendientes()
         s = SolicitudSoporte.objects.filter(asunto__icontains='Prueba error').first()
         self.assertIsNotNone(s)
         s.refresh_from_db()
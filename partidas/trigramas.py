@@ -0,0 +1,63 @@
+"""Coincidencia aproximada por trigramas sobre las palabras de las descripciones.
+
+Cada palabra del vocabulario del índice invertido se descompone en trigramas de
+caracteres (con relleno al inicio y al final, como `pg_trgm`). Para una palabra
+mal escrita ("carme", "computadra") se cuentan los trigramas compartidos con
+cada palabra del vocabulario usando las listas trigrama -> palabras, y se
+aceptan las que superan `SEARCH_FUZZY_THRESHOLD` de similitud (Jaccard).
+
+Solo se recorren las listas de los trigramas de la consulta, así que el costo
+no depende del número de partidas sino del tamaño del vocabulario que comparte
+trigramas con la palabra buscada.
+"""
+from array import array
+
+from django.conf import settings
+
+
+def trigramas(palabra):
+    """Conjunto de trigramas de `palabra` (ya normalizada) con relleno '  palabra '."""
+    p = f'  {palabra} '
+    return {p[i:i + 3] for i in range(len(p) - 2)}
+
+
+def get_umbral():
+    return getattr(settings, 'SEARCH_FUZZY_THRESHOLD', 0.3)
+
+
+class IndiceTrigramas:
+    """Listas trigrama -> posiciones en `vocab` y cantidad de trigramas de cada palabra."""
+
+    def __init__(self, vocab=()):
+        self.vocab = list(vocab)
+        self.tamanos = array('H')
+        listas = {}
+        for i, palabra in enumerate(self.vocab):
+            tris = trigramas(palabra)
+            self.tamanos.append(min(len(tris), 65535))
+            for tri in tris:
+                listas.setdefault(tri, array('I')).append(i)
+        self.listas = listas
+
+    def similares(self, palabra, umbral=None, limite=5):
+        """Pares (palabra del vocabulario, similitud) con similitud >= umbral, de mayor a menor."""
+        umbral = get_umbral() if umbral is None else umbral
+        tris = trigramas(palabra)
+        if not palabra or not tris:
+            return []
+        comunes = {}
+        for tri in tris:
+            for i in self.listas.get(tri, ()):
+                comunes[i] = comunes.get(i, 0) + 1
+        n = len(tris)
+        # Jaccard >= umbral exige al menos umbral * n trigramas en común
+        minimo = umbral * n
+        candidatos = []
+        for i, c in comunes.items():
+            if c < minimo:
+                continue
+            similitud = c / (n + self.tamanos[i] - c)
+            if similitud >= umbral:
+                candidatos.append((-similitud, self.vocab[i]))
+        candidatos.sort()
+        return [(w, -s) for s, w in candidatos[:limite]]
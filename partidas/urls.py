@@ -8,6 +8,7 @@ urlpatterns = [
     path('inicio/', views.inicio, name='inicio'),
     path('estadisticas-aranceles/', views.estadisticas_aranceles, name='estadisticas_aranceles'),
     path('log/click/', views.log_click, name='log_click'),
+    path('log/clicks/', views.log_clicks, name='log_clicks'),
     path('registro/', views.registro, name='registro'),
     path('accounts/login/', views.CustomLoginView.as_view(template_name='registration/login.html'), name='login'),
     path('buscar/', views.buscar_partidas, name='buscar_partidas'),
@@ -38,6 +39,8 @@ urlpatterns = [
     path('api/dialogflow-webhook/', views.dialogflow_webhook, name='dialogflow_webhook'),
     path('api/autocomplete/', views.api_autocomplete, name='api_autocomplete'),
     path('api/stats-by-chapter/', views.api_stats_by_chapter, name='api_stats_by_chapter'),
+    path('api/stats/usuarios-distintos/', views.api_usuarios_distintos, name='api_usuarios_distintos'),
+    path('api/stats/serie/', views.api_serie_busquedas, name='api_serie_busquedas'),
     path('api/autocomplete-entidades/', views.api_autocomplete_entidades, name='api_autocomplete_entidades'),
     path('api/autocomplete-capitulos/', views.api_autocomplete_capitulos, name='api_autocomplete_capitulos'),
     path('licencia-expirada/', views.licencia_expirada, name='licencia_expirada'),
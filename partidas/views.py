@@ -1,10 +1,23 @@
 from django.shortcuts import render, get_object_or_404, redirect
-from .models import PartidaArancelaria, Busqueda, Manual, LicenciaTemporal, Rol, PartidaReferencia, HistoriaActividad, Usuario
+from .models import PartidaArancelaria, Busqueda, Manual, LicenciaTemporal, Rol, PartidaReferencia, Usuario
 from .forms import CargarExcelForm, PartidaForm, RegistroUsuarioForm, UsuarioAdminForm
 from .importar_excel import preview_import, process_import
+from .search_backends import get_search_backend
+from .search_index import get_indice, get_indice_codigos, normalizar_codigo, solo_digitos
+from .ranking import get_motor_ranking
+from .facetas import get_facetas
+from .estadisticas import get_agregador
+from .bitacora import BUSQUEDA, CHAT, get_bitacora, registrar_actividad
+from .cache_resultados import clave_termino, get_cache_resultados, ids_compactos
+from .catalogo import get_generacion
+from .correo import encolar
+from .licencias import get_dias_aviso
+from .paginacion import leer_cursor, paginar_ordenados, paginar_queryset, tamano_pagina, url_con_cursor
 import tempfile
 import os
+from array import array
 from .decorators import rol_requerido
+from .principal import get_principal
 from django.contrib.auth.decorators import login_required
 from django.contrib.auth.views import LoginView
 from django.contrib import messages
@@ -15,7 +28,6 @@ from datetime import timedelta, datetime
 from django.utils.safestring import mark_safe
 import re
 from django.http import HttpResponse, JsonResponse, StreamingHttpResponse
-from django.core.mail import send_mail
 from django.conf import settings
 from django.views.decorators.csrf import csrf_exempt
 import csv
@@ -105,9 +117,7 @@ def registro(request):
                         if usuario.email:
                             subject = 'Bienvenido a SISARM - licencia temporal activada'
                             body = f"Hola {usuario.username},\n\nTu licencia temporal ha sido activada hasta el {fecha_fin}. Tendrás acceso completo durante 7 días.\n\nSaludos,\nEquipo SISARM"
-                            from_email = getattr(settings, 'DEFAULT_FROM_EMAIL', None)
-
-                            send_mail(subject, body, from_email or '', [usuario.email], fail_silently=True)
+                            encolar(subject, body, usuario.email, usuario=usuario)
                     except Exception:
 
                         pass
@@ -126,36 +136,25 @@ def registro(request):
 @login_required
 def inicio(request):
     from datetime import date
-    from .models import LicenciaTemporal
-    licencia = LicenciaTemporal.objects.filter(usuario=request.user, estado=True).order_by('-fecha_fin').first()
+    fecha_fin = get_principal(request).fecha_fin_activa
     dias_licencia = None
     fecha_fin_iso = None
-    if licencia:
+    if fecha_fin:
         hoy = date.today()
-        raw_days = (licencia.fecha_fin - hoy).days
+        raw_days = (fecha_fin - hoy).days
 
         dias_licencia = (raw_days + 1) if raw_days >= 0 else 0
 
-        fecha_fin_iso = licencia.fecha_fin.isoformat()
+        fecha_fin_iso = fecha_fin.isoformat()
 
         try:
 
-            if raw_days >= 0 and dias_licencia <= 3:
-                messages.warning(request, f"Tu licencia vence en {dias_licencia} día{'' if dias_licencia==1 else 's'} (hasta {licencia.fecha_fin}). Por favor renueva para evitar interrupciones.")
-
-                try:
-                    if not getattr(licencia, 'notified_pre_expiry', False) and request.user.email:
-                        subject = 'Aviso: licencia SISARM próxima a vencer'
-                        body = f"Hola {request.user.username},\n\nTu licencia de SISARM vence el {licencia.fecha_fin} (faltan {dias_licencia} día{'' if dias_licencia==1 else 's'}). Por favor renueva para evitar interrupciones.\n\nSaludos,\nEquipo SISARM"
-                        from_email = getattr(settings, 'DEFAULT_FROM_EMAIL', None)
-                        send_mail(subject, body, from_email or '', [request.user.email], fail_silently=True)
-                        licencia.notified_pre_expiry = True
-                        licencia.save()
-                except Exception:
-                    pass
+            if raw_days >= 0 and dias_licencia <= get_dias_aviso():
+                messages.warning(request, f"Tu licencia vence en {dias_licencia} día{'' if dias_licencia==1 else 's'} (hasta {fecha_fin}). Por favor renueva para evitar interrupciones.")
+                # el aviso por correo lo envía la revisión nocturna (manage.py revisar_licencias)
             elif raw_days < 0:
 
-                messages.error(request, f"Tu licencia expiró el {licencia.fecha_fin}. Algunas funciones pueden estar limitadas.")
+                messages.error(request, f"Tu licencia expiró el {fecha_fin}. Algunas funciones pueden estar limitadas.")
         except Exception:
             pass
     return render(request, 'partidas/inicio.html', {
@@ -174,8 +173,22 @@ def buscar_partidas(request):
     disp_legal = request.GET.get('disp_legal', '').strip()
 
 
+    resultados_cache = get_cache_resultados()
+    filtros_clave = (capitulo, gravamen, tipo_documento, entidad_emite, disp_legal)
+    ids_termino = ()
+    termino_busqueda = termino
     if termino:
-        partidas = partidas.filter(Q(codigo__icontains=termino) | Q(descripcion__icontains=termino))
+        backend = get_search_backend()
+        consulta = clave_termino(termino)
+        ids_termino = resultados_cache.obtener(
+            ('buscar', consulta), lambda: ids_compactos(backend.buscar(termino))
+        )
+        if not ids_termino:
+            # sin coincidencias exactas: probar con palabras parecidas ("carme" -> "carne")
+            ids_aproximados, termino_corregido = get_indice().buscar_aproximado(termino)
+            if ids_aproximados:
+                ids_termino = ids_compactos(ids_aproximados)
+                termino_busqueda = termino_corregido
 
     if capitulo:
         partidas = partidas.filter(capitulo__icontains=capitulo)
@@ -189,69 +202,86 @@ def buscar_partidas(request):
         partidas = partidas.filter(disp_legal__iexact=disp_legal)
 
 
-    if request.user.is_authenticated and termino:
+    tamano = tamano_pagina(request)
+    direccion, cursor = leer_cursor(request)
+    total_resultados = None
+    if termino:
+
+        def _rankear():
+            # ids ordenados por (-puntuación, id) con sus puntuaciones, calculados una vez por consulta y filtros
+            ids = set(ids_termino)
+            if any(filtros_clave):
+                # los filtros van a la base de datos sin la lista de ids del término
+                ids.intersection_update(partidas.values_list('id', flat=True).iterator())
+            puntos = get_motor_ranking().puntuar(termino_busqueda, ids)
+            orden = sorted(ids, key=lambda pk: (-puntos.get(pk, 0.0), pk))
+            return ids_compactos(orden), array('d', (puntos.get(pk, 0.0) for pk in orden))
+
+        ids_resultados, valores_puntuacion = resultados_cache.obtener(('rankear', consulta, filtros_clave), _rankear)
+        total_resultados = len(ids_resultados)
+        posiciones, cursor_siguiente, cursor_anterior = paginar_ordenados(
+            total_resultados, lambda i: (-valores_puntuacion[i], ids_resultados[i]), direccion, cursor, tamano
+        )
+        ids_pagina = [ids_resultados[i] for i in posiciones]
+        por_id = PartidaArancelaria.objects.in_bulk(ids_pagina)
+        resultados = [por_id[pk] for pk in ids_pagina if pk in por_id]
+    else:
+        resultados, cursor_siguiente, cursor_anterior = paginar_queryset(
+            partidas, ('codigo', 'id'), direccion, cursor, tamano
+        )
+
+
+    # las páginas siguientes de una misma búsqueda no se registran de nuevo
+    if request.user.is_authenticated and termino and direccion is None:
 
         try:
-            total_hits = partidas.count()
-            ejemplos = list(partidas.values_list('codigo', flat=True)[:5])
+            total_hits = total_resultados
+            ejemplos = [p.codigo for p in resultados[:5]]
             ejemplos_txt = ', '.join(ejemplos) if ejemplos else 'sin resultados'
             resumen = f"{total_hits} resultados; Ej: {ejemplos_txt}"
         except Exception:
 
             resumen = 'No disponible'
 
-        Busqueda.objects.create(
-            usuario=request.user,
-            termino_buscado=termino,
+        # instantánea con lo ya calculado: total, primeras partidas del ranking y generación del catálogo
+        ids_top = ids_resultados[:getattr(settings, 'SEARCH_SNAPSHOT_TOP', 15)]
+        get_bitacora().registrar(
+            BUSQUEDA,
+            usuario_id=request.user.pk,
+            termino_buscado=termino[:100],
             tipo_busqueda="Texto o Código",
-            fecha=now(),
-            resultados=resumen
+            resultados=resumen,
+            total_resultados=total_resultados,
+            ids_top=Busqueda.empaquetar_ids(ids_top),
+            generacion_catalogo=get_generacion(),
         )
 
-        from .models import SearchStatisticDaily, SearchStatisticTotal, SearchStatisticProductTotal
-        from datetime import date as _date
-        hoy = _date.today()
-        matches_for_stats = PartidaArancelaria.objects.filter(Q(codigo__icontains=termino) | Q(descripcion__icontains=termino))
-        chapters_seen = set()
-        for m in matches_for_stats:
-            chap = m.capitulo or 'Sin capítulo'
-            if chap in chapters_seen:
-                continue
-            chapters_seen.add(chap)
-
-            d_obj, _ = SearchStatisticDaily.objects.get_or_create(capitulo=chap, fecha=hoy, defaults={'count': 0})
-            d_obj.count = d_obj.count + 1
-            d_obj.save()
-
-            t_obj, _ = SearchStatisticTotal.objects.get_or_create(capitulo=chap, defaults={'total': 0})
-            t_obj.total = t_obj.total + 1
-            t_obj.save()
-
-            prod_key = m.codigo or f"{m.id}"
-            p_obj, _ = SearchStatisticProductTotal.objects.get_or_create(
-                codigo=prod_key,
-                defaults={'descripcion': m.descripcion, 'capitulo': chap, 'total': 0}
-            )
-            p_obj.total = p_obj.total + 1
-
-            p_obj.descripcion = m.descripcion
-            p_obj.capitulo = chap
-            p_obj.save()
+        get_agregador().registrar(ids_termino, usuario_id=request.user.pk)
 
-    capitulo_relacionado = partidas.first().capitulo if partidas.exists() else None
+    if termino:
+        capitulo_relacionado = resultados[0].capitulo if resultados else None
+    else:
+        capitulo_relacionado = partidas.first().capitulo if partidas.exists() else None
+    # solo se excluye la página visible: excluir todas las coincidencias manda la lista completa de ids
     relacionadas = PartidaArancelaria.objects.filter(
         capitulo=capitulo_relacionado
-    ).exclude(id__in=partidas)[:15] if capitulo_relacionado else []
+    ).exclude(id__in=[p.id for p in resultados])[:15] if capitulo_relacionado else []
 
     similares = []
     if termino:
-        similares = PartidaArancelaria.objects.filter(
-            descripcion__icontains=termino
-        ).exclude(id__in=partidas.values_list('id', flat=True))[:15]
+        ids_similares = resultados_cache.obtener(
+            ('similares', consulta, filtros_clave),
+            lambda: ids_compactos(get_motor_ranking().ordenar(
+                termino_busqueda, backend.buscar_descripcion(termino_busqueda).difference(ids_resultados), k=15
+            )),
+        )
+        por_id = PartidaArancelaria.objects.in_bulk(ids_similares) if ids_similares else {}
+        similares = [por_id[pk] for pk in ids_similares if pk in por_id]
 
     if termino:
-        patron = re.compile(re.escape(termino), re.IGNORECASE)
-        for p in partidas:
+        palabras = sorted(set(termino_busqueda.split()), key=len, reverse=True)
+        patron = re.compile('|'.join(re.escape(w) for w in palabras), re.IGNORECASE)
+        for p in resultados:
             p.descripcion_resaltada = mark_safe(
                 patron.sub(
                     lambda m: f'<mark style="background-color:#00ff55; color:#000; padding:0.2em 0.3em; border-radius:5px;">{m.group(0)}</mark>',
@@ -266,14 +296,14 @@ def buscar_partidas(request):
                 )
             )
     else:
-        for p in partidas:
+        for p in resultados:
             p.descripcion_resaltada = p.descripcion
         for s in similares:
             s.descripcion_resaltada = s.descripcion
 
 
     try:
-        for p in partidas:
+        for p in resultados:
             full_ace22 = (p.ace22_chi_prot or '').strip()
             ace22_chi, ace22_prot = _split_normalize_ace22(full_ace22)
 
@@ -284,79 +314,15 @@ def buscar_partidas(request):
         pass
 
 
-    raw_capitulos = list(PartidaArancelaria.objects.values_list('capitulo', flat=True).distinct())
-    def clean_capitulo_label(c):
-        if not c:
-            return None
-        s = str(c).strip()
-        if not s:
-            return None
- 
-        s_clean = re.sub(r'^(capitulo|capículo|capítulo)\s*\d+\s*[:\-\)]?\s*', '', s, flags=re.IGNORECASE)
-        s_clean = re.sub(r'^\d+\s*[:\.\-\)]\s*', '', s_clean)
-        s_clean = s_clean.strip()
-        return s_clean or None
-
-    capitulos_disponibles = []
-    seen = set()
-    for c in raw_capitulos:
-
-        if c is None:
-            continue
-        orig = str(c).strip()
-        if not orig or orig.lower() in ('sin datos', 'n/a'):
-            continue
-        if orig in seen:
-            continue
-        seen.add(orig)
-        label = clean_capitulo_label(orig)
-
-        num_match = re.search(r"(\d+)", orig)
-        numero = int(num_match.group(1)) if num_match else None
-
-        if not label:
-            label = orig
-        capitulos_disponibles.append((orig, label, numero))
-    
-
-    gravamenes_raw = PartidaArancelaria.objects.values_list('gravamen', flat=True).distinct()
-    gravamenes_set = set()
-    gravamenes_disponibles = []
-    for g in gravamenes_raw:
-        if g and g not in gravamenes_set:
-            gravamenes_set.add(g)
-            gravamenes_disponibles.append(g)
-    
-
-    tipos_raw = list(PartidaArancelaria.objects.values_list('tipo_documento', flat=True).distinct())
-    tipos_set = set()
-    tipos_disponibles = []
-    for t in tipos_raw:
-        if t and t not in tipos_set:
-            tipos_set.add(t)
-            tipos_disponibles.append(t)
-    
-
-    entidades_raw = list(PartidaArancelaria.objects.values_list('entidad_emite', flat=True).distinct())
-    entidades_set = set()
-    entidades_disponibles = []
-    for e in entidades_raw:
-        if e and e not in entidades_set:
-            entidades_set.add(e)
-            entidades_disponibles.append(e)
-    
-
-    disp_legal_raw = list(PartidaArancelaria.objects.values_list('disp_legal', flat=True).distinct())
-    disp_legal_set = set()
-    disp_legal_disponibles = []
-    for d in disp_legal_raw:
-        if d and d not in disp_legal_set:
-            disp_legal_set.add(d)
-            disp_legal_disponibles.append(d)
+    facetas = get_facetas()
 
     return render(request, 'partidas/buscar.html', {
-        'resultados': partidas,
+        'resultados': resultados,
+        'total_resultados': total_resultados,
+        'url_siguiente': url_con_cursor(request, 'despues', cursor_siguiente),
+        'url_anterior': url_con_cursor(request, 'antes', cursor_anterior),
         'termino': termino,
+        'termino_corregido': termino_busqueda if termino_busqueda != termino else None,
         'relacionadas': relacionadas,
         'similares': similares,
         'capitulo': capitulo_relacionado,
@@ -367,21 +333,34 @@ def buscar_partidas(request):
             'entidad_emite': entidad_emite,
             'disp_legal': disp_legal
         },
-        'capitulos': capitulos_disponibles,
-        'gravamenes': gravamenes_disponibles,
-        'tipos_doc': tipos_disponibles,
-        'entidades': entidades_disponibles,
-        'disp_legales': disp_legal_disponibles
+        'capitulos': facetas['capitulos'],
+        'gravamenes': facetas['gravamenes'],
+        'tipos_doc': facetas['tipos_doc'],
+        'entidades': facetas['entidades'],
+        'disp_legales': facetas['disp_legales']
     })
 
 
+def _ids_autocomplete(q, max_results):
+    """Ids más relevantes para `q`; si faltan, se completan con coincidencias aproximadas."""
+    motor = get_motor_ranking()
+    ids = motor.ordenar(q, get_search_backend().buscar(q), k=max_results)
+    if len(ids) < max_results:
+        ids_aproximados, q_corregida = get_indice().buscar_aproximado(q)
+        ids_aproximados.difference_update(ids)
+        if ids_aproximados:
+            ids += motor.ordenar(q_corregida, ids_aproximados, k=max_results - len(ids))
+    return ids
+
+
 def api_autocomplete(request):
     """Endpoint simple de autocompletado usado por la UI.
     Devuelve JSON con lista de objetos {codigo, descripcion}.
     Estrategia:
-      1) Buscar por código que empiece por la query (prioridad)
-      2) Luego buscar por código que contenga o descripción que contenga
-      3) Si quedan espacios, intentar búsqueda por tokens en la descripción
+      1) Si la query es un código (solo dígitos, con o sin puntos), rango por prefijo
+         en el índice ordenado de códigos: resultados ya ordenados por longitud y código
+      2) Si no, buscar por código o descripción (cada palabra como prefijo)
+         y devolver los más relevantes según BM25
     """
     q = (request.GET.get('q') or '').strip()
     if not q:
@@ -392,57 +371,25 @@ def api_autocomplete(request):
 
     try:
 
-        tokens = [t.strip().lower() for t in q.split() if t.strip()]
-        q_lower = q.lower()
-
-
-        candidates = PartidaArancelaria.objects.filter(
-            Q(codigo__icontains=q) | Q(descripcion__icontains=q)
-        ).order_by('codigo')[:200]
-
-        scored = []
-        seen = set()
-        for p in candidates:
-            if p.id in seen:
-                continue
-            seen.add(p.id)
-            score = 0
-            codigo = (p.codigo or '').lower()
-            descripcion = (p.descripcion or '').lower()
-
-
-            if codigo == q_lower:
-                score += 300
-            if codigo.startswith(q_lower):
-                score += 150
-            if q_lower in codigo and not codigo.startswith(q_lower):
-                score += 80
-
-
-            if q_lower in descripcion:
-                score += 60
-
-
-            token_matches = 0
-            for t in tokens:
-                if t in descripcion:
-                    token_matches += 1
-            score += token_matches * 12
-
-
-            try:
-                if codigo:
-                    score += max(0, 10 - len(codigo))
-            except Exception:
-                pass
-
-            scored.append((score, p))
-
-
-        scored.sort(key=lambda x: (-x[0], x[1].codigo or ''))
+        codigo_q = normalizar_codigo(q)
+        if codigo_q.isdigit():
+            ids = get_indice_codigos().prefijo(codigo_q, limite=max_results)
+            if ids:
+                por_id = PartidaArancelaria.objects.only('codigo', 'descripcion').in_bulk(ids)
+                for pk in ids:
+                    p = por_id.get(pk)
+                    if p:
+                        results.append({'codigo': p.codigo, 'descripcion': p.descripcion or ''})
+                return JsonResponse({'results': results})
 
-        for score, p in scored[:max_results]:
-            results.append({'codigo': p.codigo, 'descripcion': p.descripcion or ''})
+        ids = get_cache_resultados().obtener(
+            ('autocomplete', clave_termino(q)), lambda: ids_compactos(_ids_autocomplete(q, max_results))
+        )
+        por_id = PartidaArancelaria.objects.only('codigo', 'descripcion').in_bulk(ids)
+        for pk in ids:
+            p = por_id.get(pk)
+            if p:
+                results.append({'codigo': p.codigo, 'descripcion': p.descripcion or ''})
 
     except Exception as e:
         try:
@@ -498,7 +445,13 @@ def dialogflow_webhook(request):
             codigo = params.get('codigo') or params.get('number') or params.get('any')
             if codigo:
                 try:
-                    p = PartidaArancelaria.objects.filter(codigo__icontains=str(codigo)).first()
+                    # primero igualdad exacta sobre el índice de codigo_norm, luego por prefijo
+                    digitos = solo_digitos(codigo)
+                    p = PartidaArancelaria.objects.filter(codigo_norm=digitos).order_by('codigo').first() if digitos else None
+                    if p is None:
+                        p = get_search_backend().filtrar(
+                            PartidaArancelaria.objects.all(), str(codigo), campos=('codigo',)
+                        ).order_by('codigo').first()
                     if p:
                         text = f"Partida {p.codigo}: {p.descripcion[:300]}"
                         return JsonResponse({'fulfillmentText': text})
@@ -664,21 +617,35 @@ def historial_buscador(request):
         return redirect('historial_buscador')
 
 
-    historial_qs = Busqueda.objects.filter(usuario=request.user).order_by('-fecha')[:20]
-    historial = []
-    for b in historial_qs:
-        matches = PartidaArancelaria.objects.filter(
-            Q(codigo__icontains=b.termino_buscado) | Q(descripcion__icontains=b.termino_buscado)
-        ).order_by('codigo')[:15]
+    historial_qs = list(Busqueda.objects.filter(usuario=request.user).order_by('-fecha')[:20])
 
+    # ids de cada entrada: la instantánea guardada al buscar o, en búsquedas anteriores a las
+    # instantáneas, el backend de búsqueda (una sola búsqueda para todos los términos); luego una
+    # sola consulta para todas las partidas
+    limite = getattr(settings, 'SEARCH_SNAPSHOT_TOP', 15)
+    sin_instantanea = {b.termino_buscado for b in historial_qs if b.ids_resultados is None}
+    candidatos = get_search_backend().buscar_varios(sin_instantanea) if sin_instantanea else {}
+    ids_por_entrada = []
+    for b in historial_qs:
+        ids = b.ids_resultados
+        if ids is None:
+            encontrados = candidatos[b.termino_buscado]
+            ids = get_motor_ranking().ordenar(b.termino_buscado, encontrados, k=limite) if encontrados else []
+        ids_por_entrada.append(ids)
+
+    por_id = PartidaArancelaria.objects.in_bulk({pk for ids in ids_por_entrada for pk in ids})
+    for p in por_id.values():
         try:
-            for p in matches:
-                chi, prot = _split_normalize_ace22(p.ace22_chi_prot or '')
-                setattr(p, 'ace22_chi', chi)
-                setattr(p, 'ace22_prot', prot)
+            chi, prot = _split_normalize_ace22(p.ace22_chi_prot or '')
         except Exception:
-            pass
-        historial.append({'item': b, 'matches': matches})
+            chi, prot = '', ''
+        p.ace22_chi = chi
+        p.ace22_prot = prot
+
+    historial = [
+        {'item': b, 'matches': [por_id[pk] for pk in ids if pk in por_id]}
+        for b, ids in zip(historial_qs, ids_por_entrada)
+    ]
     return render(request, 'partidas/historial.html', {'historial': historial})
 
 @login_required
@@ -752,7 +719,7 @@ def panel_partidas(request):
     cap = request.GET.get('capitulo', '').strip()
 
     if q:
-        partidas = partidas.filter(Q(codigo__icontains=q) | Q(descripcion__icontains=q))
+        partidas = get_search_backend().filtrar(partidas, q)
     if cap:
         partidas = partidas.filter(capitulo__icontains=cap)
 
@@ -773,10 +740,7 @@ def crear_partida(request):
         form = PartidaForm(request.POST)
         if form.is_valid():
             partida = form.save()
-            try:
-                HistoriaActividad.objects.create(usuario=request.user, accion=f"admin: crear partida {partida.codigo} (id={partida.pk})")
-            except Exception:
-                pass
+            registrar_actividad(request.user, f"admin: crear partida {partida.codigo} (id={partida.pk})")
             messages.success(request, 'Partida creada correctamente.')
             return redirect('panel_partidas')
     else:
@@ -791,10 +755,7 @@ def editar_partida(request, partida_id):
         form = PartidaForm(request.POST, instance=partida)
         if form.is_valid():
             part = form.save()
-            try:
-                HistoriaActividad.objects.create(usuario=request.user, accion=f"admin: editar partida {part.codigo} (id={part.pk})")
-            except Exception:
-                pass
+            registrar_actividad(request.user, f"admin: editar partida {part.codigo} (id={part.pk})")
             messages.success(request, 'Partida actualizada correctamente.')
             return redirect('panel_partidas')
     else:
@@ -808,10 +769,7 @@ def eliminar_partida(request, partida_id):
     if request.method == 'POST':
         codigo = partida.codigo
         partida.delete()
-        try:
-            HistoriaActividad.objects.create(usuario=request.user, accion=f"admin: eliminar partida {codigo} (id={partida_id})")
-        except Exception:
-            pass
+        registrar_actividad(request.user, f"admin: eliminar partida {codigo} (id={partida_id})")
         messages.success(request, 'Partida eliminada correctamente.')
         return redirect('panel_partidas')
     return render(request, 'partidas/partida_confirm_delete.html', {'partida': partida})
@@ -830,10 +788,7 @@ def crear_usuario(request):
         form = UsuarioAdminForm(request.POST)
         if form.is_valid():
             user = form.save()
-            try:
-                HistoriaActividad.objects.create(usuario=request.user, accion=f"admin: crear usuario {user.username} (id={user.pk})")
-            except Exception:
-                pass
+            registrar_actividad(request.user, f"admin: crear usuario {user.username} (id={user.pk})")
             messages.success(request, 'Usuario creado correctamente.')
             return redirect('admin_usuarios')
     else:
@@ -848,10 +803,7 @@ def editar_usuario(request, usuario_id):
         form = UsuarioAdminForm(request.POST, instance=user)
         if form.is_valid():
             form.save()
-            try:
-                HistoriaActividad.objects.create(usuario=request.user, accion=f"admin: editar usuario {user.username} (id={user.pk})")
-            except Exception:
-                pass
+            registrar_actividad(request.user, f"admin: editar usuario {user.username} (id={user.pk})")
             messages.success(request, 'Usuario actualizado correctamente.')
             return redirect('admin_usuarios')
     else:
@@ -864,10 +816,7 @@ def toggle_usuario_activo(request, usuario_id):
     user = get_object_or_404(Usuario, pk=usuario_id)
     user.is_active = not user.is_active
     user.save()
-    try:
-        HistoriaActividad.objects.create(usuario=request.user, accion=f"admin: {'activar' if user.is_active else 'desactivar'} usuario {user.username} (id={user.pk})")
-    except Exception:
-        pass
+    registrar_actividad(request.user, f"admin: {'activar' if user.is_active else 'desactivar'} usuario {user.username} (id={user.pk})")
     messages.success(request, f"Usuario {'activado' if user.is_active else 'desactivado'}.")
     return redirect('admin_usuarios')
 
@@ -1005,7 +954,7 @@ def exportar_partidas_excel(request):
     entidad_emite = request.GET.get('entidad_emite', '').strip()
 
     if termino:
-        qs = qs.filter(Q(codigo__icontains=termino) | Q(descripcion__icontains=termino))
+        qs = get_search_backend().filtrar(qs, termino)
     if capitulo:
         qs = qs.filter(capitulo__icontains=capitulo)
     if gravamen:
@@ -1129,19 +1078,9 @@ class CustomLoginView(LoginView):
     def form_valid(self, form):
 
         response = super().form_valid(form)
-        try:
-            user = self.request.user
-            from datetime import date
-            licencia = None
-            try:
-                licencia = user.licenciatemporal_set.order_by('-fecha_fin').first()
-            except Exception:
-                licencia = None
-            if (not licencia) or (licencia and licencia.fecha_fin < date.today()) or (licencia and not getattr(licencia, 'estado', True)):
-                return redirect('licencia_expirada')
-        except Exception:
-
-            return response
+        # el veredicto queda en la sesión y el middleware no vuelve a consultar la licencia
+        if not get_principal(self.request).vigente:
+            return redirect('licencia_expirada')
         return response
 
 def chat_asistente(request):
@@ -1204,7 +1143,7 @@ def licencia_expirada(request):
 def solicitar_renovacion(request):
     """Vista pública para solicitar renovación o contactar soporte desde la página de licencia expirada.
     GET: muestra un formulario para indicar correo y mensaje.
-    POST: crea `SolicitudSoporte`, intenta enviar el correo y redirige a `licencia_expirada` con mensaje.
+    POST: crea `SolicitudSoporte`, encola el correo al equipo de soporte y redirige a `licencia_expirada` con mensaje.
     """
     from .models import SolicitudSoporte
 
@@ -1245,7 +1184,7 @@ def solicitar_renovacion(request):
 
         try:
             support_to = getattr(settings, 'SUPPORT_EMAIL', 'soporte@sisarm.com')
-            send_mail(subject, message, email or getattr(settings, 'DEFAULT_FROM_EMAIL', ''), [support_to], fail_silently=False)
+            encolar(subject, message, support_to, remitente=email, solicitud=solicitud)
 
             messages.success(request, 'Solicitud registrada. El equipo de soporte la procesará.')
         except Exception as e:
@@ -1278,7 +1217,7 @@ def soporte(request):
 
 @login_required
 def soporte_submit(request):
-    """Recibe POST desde el formulario de Soporte y lo envía por email al equipo de soporte.
+    """Recibe POST desde el formulario de Soporte y encola el email al equipo de soporte.
     Guarda también una entrada en HistoriaActividad.
     """
     from django.shortcuts import redirect
@@ -1317,21 +1256,11 @@ def soporte_submit(request):
 
         support_to = getattr(settings, 'SUPPORT_EMAIL', 'soporte@sisarm.com')
         try:
-            sent_count = send_mail(subject or 'Solicitud de soporte desde la aplicación', full_body, email_from, [support_to], fail_silently=False)
-
-            try:
-                HistoriaActividad.objects.create(usuario=request.user if request.user.is_authenticated else None, accion=f"soporte_submit: {subject[:200]}")
-            except Exception:
-                pass
-
-            try:
-                if solicitud:
-                    solicitud.estado = 'sent'
-                    solicitud.error_message = ''
-                    solicitud.save()
-            except Exception:
-                pass
-            messages.success(request, 'Solicitud registrada y enviada al equipo de soporte. Gracias.')
+            # el worker de correos marca la solicitud como enviada o con error
+            encolar(subject or 'Solicitud de soporte desde la aplicación', full_body, support_to,
+                    remitente=email_from, solicitud=solicitud)
+            registrar_actividad(request.user, f"soporte_submit: {subject[:200]}")
+            messages.success(request, 'Solicitud registrada; la enviaremos al equipo de soporte en breve. Gracias.')
         except Exception as e:
 
             try:
@@ -1438,17 +1367,6 @@ def api_chat_help(request):
         session_id = 'default'
 
 
-    try:
-        from .models import ChatMessage
-        chat_entry = ChatMessage.objects.create(
-            usuario=request.user if request.user.is_authenticated else None,
-            mensaje=message,
-            publico=is_public
-        )
-    except Exception:
-        chat_entry = None
-
-
     reply = None
     sugerencias = []
     action = None
@@ -1465,22 +1383,14 @@ def api_chat_help(request):
         reply = "No entendí exactamente. ¿Cuál es tu pregunta?"
 
 
-    if chat_entry:
-        try:
-            chat_entry.respuesta = reply
-            chat_entry.save()
-        except Exception:
-            pass
-
-
-    try:
-        from .models import HistoriaActividad
-        HistoriaActividad.objects.create(
-            usuario=request.user if request.user.is_authenticated else None,
-            accion=f"chat_help: {message[:100]}"
-        )
-    except Exception:
-        pass
+    get_bitacora().registrar(
+        CHAT,
+        usuario_id=request.user.pk if request.user.is_authenticated else None,
+        mensaje=message,
+        respuesta=reply,
+        publico=is_public
+    )
+    registrar_actividad(request.user, f"chat_help: {message[:100]}")
 
 
     return JsonResponse({
@@ -1614,6 +1524,55 @@ def log_click(request):
         return JsonResponse({'ok': False, 'error': str(e)}, status=500)
 
 
+MAX_CLICKS_POR_LOTE = 200
+
+
+@login_required
+def log_clicks(request):
+    """Registra en lote los clicks acumulados en la UI (pensado para `navigator.sendBeacon`).
+    Espera POST con 'eventos': lista JSON de objetos con 'partida_id', 'accion' y 'termino' (opcionales),
+    en un campo de formulario o como cuerpo JSON. Responde 204 sin contenido.
+    """
+    import json
+
+    if request.method != 'POST':
+        return JsonResponse({'ok': False, 'error': 'POST required'}, status=400)
+    try:
+        if request.content_type == 'application/json':
+            eventos = json.loads(request.body or b'[]')
+            if isinstance(eventos, dict):
+                eventos = eventos.get('eventos', [])
+        else:
+            eventos = json.loads(request.POST.get('eventos') or '[]')
+    except ValueError:
+        return JsonResponse({'ok': False, 'error': 'JSON inválido'}, status=400)
+    if not isinstance(eventos, list):
+        return JsonResponse({'ok': False, 'error': 'Se esperaba una lista de eventos'}, status=400)
+    eventos = [e for e in eventos[:MAX_CLICKS_POR_LOTE] if isinstance(e, dict)]
+
+    def _id(valor):
+        try:
+            return int(valor)
+        except (TypeError, ValueError):
+            return None
+
+    ids = {_id(e.get('partida_id') or e.get('partida')) for e in eventos} - {None}
+    # una sola consulta para validar todos los ids; los inexistentes se registran sin partida
+    existentes = set(PartidaArancelaria.objects.filter(id__in=ids).values_list('id', flat=True)) if ids else set()
+    clicks = []
+    for e in eventos:
+        partida_id = _id(e.get('partida_id') or e.get('partida'))
+        clicks.append(ClickLog(
+            usuario=request.user,
+            partida_id=partida_id if partida_id in existentes else None,
+            accion=str(e.get('accion') or 'historial_click')[:100],
+            extra=str(e.get('termino') or ''),
+        ))
+    if clicks:
+        ClickLog.objects.bulk_create(clicks)
+    return HttpResponse(status=204)
+
+
 @rol_requerido('Administrador')
 def admin_busquedas(request):
     """Vista para que Admin vea, filtre y exporte búsquedas realizadas por despachantes."""
@@ -1669,7 +1628,7 @@ def solicitar_ayuda_documento(request, referencia_id):
 
 
     mensaje = f"Solicitud de ayuda para documento {ref.id} (partida {ref.partida.codigo}) por usuario {request.user.username}"
-    HistoriaActividad.objects.create(usuario=request.user, accion=mensaje)
+    registrar_actividad(request.user, mensaje)
     messages.success(request, 'Se ha solicitado ayuda. El equipo de soporte recibirá la solicitud.')
     return redirect('detalle_partida', partida_id=ref.partida.id)
 
@@ -1742,6 +1701,58 @@ def api_stats_by_chapter(request):
         return JsonResponse({'success': False, 'error': str(e)})
 
 
+@login_required
+@rol_requerido('Administrador')
+def api_usuarios_distintos(request):
+    """API AJAX con usuarios distintos (estimados con HyperLogLog) y búsquedas por capítulo.
+    GET params: desde, hasta (AAAA-MM-DD; por defecto el mes en curso), capitulos (coma-separados)
+    """
+    from django.utils import timezone
+    from .estadisticas import usuarios_distintos
+
+    hoy = timezone.localdate()
+    try:
+        desde = datetime.strptime(request.GET['desde'], '%Y-%m-%d').date() if request.GET.get('desde') else hoy.replace(day=1)
+        hasta = datetime.strptime(request.GET['hasta'], '%Y-%m-%d').date() if request.GET.get('hasta') else hoy
+    except ValueError:
+        return JsonResponse({'success': False, 'error': 'Fecha inválida, use AAAA-MM-DD'}, status=400)
+    capitulos = [c.strip() for c in request.GET.get('capitulos', '').split(',') if c.strip()]
+
+    por_capitulo, total = usuarios_distintos(desde, hasta, capitulos)
+    data = [
+        {'capitulo': cap, 'usuarios': usuarios, 'busquedas': busquedas}
+        for cap, (usuarios, busquedas) in sorted(por_capitulo.items(), key=lambda item: (-item[1][0], item[0]))
+    ]
+    return JsonResponse({
+        'success': True, 'desde': desde.isoformat(), 'hasta': hasta.isoformat(),
+        'usuarios_distintos': total, 'data': data, 'count': len(data),
+    })
+
+
+@login_required
+@rol_requerido('Administrador')
+def api_serie_busquedas(request):
+    """API AJAX con la serie de tiempo del volumen de búsquedas (para gráficos).
+    GET params: desde, hasta (AAAA-MM-DD; por defecto los últimos 30 días), intervalo (hora, dia, semana),
+    capitulos (coma-separados; una serie por capítulo), puntos (máximo de puntos por serie)
+    """
+    from django.utils import timezone
+    from .series import serie_busquedas
+
+    hoy = timezone.localdate()
+    try:
+        desde = datetime.strptime(request.GET['desde'], '%Y-%m-%d').date() if request.GET.get('desde') else hoy - timedelta(days=29)
+        hasta = datetime.strptime(request.GET['hasta'], '%Y-%m-%d').date() if request.GET.get('hasta') else hoy
+        puntos = int(request.GET['puntos']) if request.GET.get('puntos') else None
+        if puntos is not None and puntos < 1:
+            raise ValueError('puntos debe ser positivo')
+        capitulos = [c.strip() for c in request.GET.get('capitulos', '').split(',') if c.strip()]
+        data = serie_busquedas(request.GET.get('intervalo', 'dia'), desde, hasta, capitulos, puntos)
+    except ValueError as e:
+        return JsonResponse({'success': False, 'error': str(e)}, status=400)
+    return JsonResponse({'success': True, 'desde': desde.isoformat(), 'hasta': hasta.isoformat(), **data})
+
+
 @login_required
 @rol_requerido('Administrador')
 def api_autocomplete_entidades(request):
@@ -29,6 +29,14 @@ ALLOWED_HOSTS = [
 SECRET_KEY = os.getenv('SECRET_KEY', 'django-insecure-CAMBIAR-EN-PRODUCCION')
 
 
+# las estadísticas de búsqueda pendientes las guarda un hilo de fondo en cada worker
+SEARCH_STATS_BACKGROUND_FLUSH = True
+
+# lo mismo para la bitácora de búsquedas, chat y actividad; el spool debe estar en un disco persistente
+BITACORA_BACKGROUND_FLUSH = True
+BITACORA_SPOOL_DIR = os.environ.get('BITACORA_SPOOL_DIR', str(BASE_DIR / 'var' / 'bitacora'))
+
+
 DATABASE_URL = os.getenv('DATABASE_URL', '')
 
 if DATABASE_URL:
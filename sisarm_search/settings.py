@@ -68,6 +68,13 @@ DATABASES = {
 
 AUTH_USER_MODEL = 'partidas.Usuario'
 
+# carga el rol junto con el usuario de la sesión (ver partidas/principal.py); ModelBackend queda una
+# versión más para las sesiones abiertas antes del cambio, que guardan su ruta en la sesión
+AUTHENTICATION_BACKENDS = [
+    'partidas.auth.UsuarioBackend',
+    'django.contrib.auth.backends.ModelBackend',
+]
+
 
 AUTH_PASSWORD_VALIDATORS = [
     {
@@ -106,6 +113,101 @@ SUPPORT_WHATSAPP_NUMBER = '59177682918'
 SUPPORT_WHATSAPP_TEXT = 'Hola, tengo una consulta sobre Sisarm.'
 
 
+# Backend de búsqueda de partidas: IndiceMemoriaBackend, SQLiteFTS5Backend o PostgresFTSBackend
+SEARCH_BACKEND = os.getenv('SEARCH_BACKEND', 'partidas.search_backends.IndiceMemoriaBackend')
+
+# Segundos que un proceso reutiliza su índice de búsqueda en memoria antes de reconstruirlo
+SEARCH_INDEX_TTL = int(os.getenv('SEARCH_INDEX_TTL', 300))
+
+# Pesos por campo del ranking BM25
+SEARCH_FIELD_BOOSTS = {'codigo': 3.0, 'descripcion': 1.0, 'capitulo': 0.3}
+
+# Segundos que cada proceso reutiliza la generación del catálogo leída de la base de datos
+CATALOG_GENERATION_TTL = 5
+
+# Segundos que se guardan en cache los catálogos de los filtros del buscador (se invalidan al cambiar partidas)
+SEARCH_FACETS_TTL = 3600
+
+# Similitud mínima (Jaccard de trigramas, 0-1) para aceptar una palabra parecida cuando no hay coincidencias exactas
+SEARCH_FUZZY_THRESHOLD = 0.3
+
+# Cache de resultados de búsqueda por proceso: ids guardados como máximo y segundos de vida de cada entrada
+SEARCH_RESULT_CACHE_MAX_IDS = int(os.getenv('SEARCH_RESULT_CACHE_MAX_IDS', 2_000_000))
+SEARCH_RESULT_CACHE_TTL = int(os.getenv('SEARCH_RESULT_CACHE_TTL', 600))
+
+# Estadísticas de búsqueda con escritura diferida: cada cuántos segundos se guardan, cuántas búsquedas
+# pendientes se acumulan como máximo y si las guarda un hilo de fondo (si no, al terminar las peticiones)
+SEARCH_STATS_FLUSH_INTERVAL = 5
+SEARCH_STATS_BUFFER_MAX = 1000
+SEARCH_STATS_BACKGROUND_FLUSH = False
+
+# Ranking aproximado de productos/capítulos más buscados: error relativo máximo (define cuántos
+# contadores se guardan, 1/error) y cada cuántos segundos se guarda en la base de datos
+SEARCH_TOPK_ERROR = 0.001
+SEARCH_TOPK_PERSIST_INTERVAL = 60
+
+# Usuarios distintos por capítulo y día con HyperLogLog: 2^p registros por sketch (error ~1.04/sqrt(2^p))
+SEARCH_HLL_PRECISION = 10
+
+# Series de tiempo de búsquedas: máximo de intervalos por consulta, puntos por serie por defecto y
+# segundos tras el fin de un intervalo para darlo por cerrado (y cachearlo sin vencimiento)
+SEARCH_STATS_SERIES_MAX_BUCKETS = 5000
+SEARCH_STATS_SERIES_POINTS = 200
+SEARCH_STATS_SERIES_MARGIN = 300
+# los intervalos cerrados van a su propio cache, con lugar para muchos rangos, para que no desplacen (ni los
+# desplacen) las demás claves del cache por defecto, que guarda 300 entradas
+SEARCH_STATS_SERIES_CACHE = 'series'
+
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    },
+    SEARCH_STATS_SERIES_CACHE: {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'series',
+        'TIMEOUT': None,
+        'OPTIONS': {'MAX_ENTRIES': 100000},
+    },
+}
+
+# Cantidad de partidas (las primeras del ranking) guardadas en la instantánea de cada Busqueda
+SEARCH_SNAPSHOT_TOP = 15
+
+# Registros de búsquedas, chat y actividad con escritura diferida (partidas/bitacora.py): directorio del
+# spool en disco, cada cuántos segundos se guardan, máximo en memoria, hilo de fondo y fsync por registro
+BITACORA_SPOOL_DIR = BASE_DIR / 'var' / 'bitacora'
+BITACORA_FLUSH_INTERVAL = 2
+BITACORA_BUFFER_MAX = 500
+BITACORA_BACKGROUND_FLUSH = False
+BITACORA_FSYNC = False
+
+# Retención en días de las tablas de registro y directorio de los archivos (manage.py archivar_registros)
+RETENCION_REGISTROS = {
+    'busqueda': 365,
+    'clicklog': 180,
+    'chatmessage': 365,
+    'historiaactividad': 730,
+    'notificationlog': 365,
+}
+ARCHIVO_REGISTROS_DIR = BASE_DIR / 'var' / 'archivo'
+
+# Días (contando el de vencimiento) con que se avisa por correo que una licencia vence (manage.py revisar_licencias)
+LICENCIA_AVISO_DIAS = 3
+
+# Bandeja de salida de correos (manage.py enviar_correos): correos por conexión SMTP, intentos antes de
+# marcarlos con error, espera entre reintentos (se duplica en cada intento, hasta el máximo) y margen de la
+# reserva de un lote tomado por un worker, en segundos (se suma al timeout SMTP por cada correo del lote)
+CORREO_LOTE = 50
+CORREO_MAX_INTENTOS = 5
+CORREO_REINTENTO_BASE = 60
+CORREO_REINTENTO_MAX = 3600
+CORREO_RESERVA = 300
+
+# Resultados por página en la búsqueda (?por_pagina= no puede superar el máximo)
+SEARCH_PAGE_SIZE = 25
+SEARCH_PAGE_SIZE_MAX = 100
+
+
 EMAIL_BACKEND = os.getenv('EMAIL_BACKEND', 'django.core.mail.backends.smtp.EmailBackend')
 EMAIL_HOST = os.getenv('EMAIL_HOST', 'smtp.gmail.com')
 EMAIL_PORT = int(os.getenv('EMAIL_PORT', 587))